@@ -1,6 +1,9 @@
 import numpy as np
+import os
 from enum import Enum
 from base import Board, Piece, Player
+from retrograde import RetrogradeTable, reachable, solve, NO_MOVE
+from zobrist import piece_key, side_key
 
 class TTTPiece(Piece, Enum):
     
@@ -29,9 +32,11 @@ def _initial_position():
 
 class TTTBoard(Board):
     
-    def __init__(self, position = _initial_position(), player_to_move = Player['W']):
+    def __init__(self, position = None, player_to_move = Player['W'], key = None):
         self.player_to_move = player_to_move
-        self.position = position
+        # a new dict for every board: push changes the position in place
+        self.position = position if position is not None else _initial_position()
+        self.key = key if key is not None else self._compute_key()
     
     def legal_moves(self):
         """
@@ -49,7 +54,27 @@ class TTTBoard(Board):
         new_pos = self.position.copy()
         new_pos[square] = piece
         new_turn = self.player_to_move.other_player()
-        return TTTBoard(new_pos, new_turn)
+        key = self.key ^ piece_key(square, piece) ^ side_key(self.player_to_move) ^ side_key(new_turn)
+        return TTTBoard(new_pos, new_turn, key)
+
+    def push(self, move):
+        """
+        Play move on this board, in place. pop() takes it back.
+        """
+        square, piece = move
+        self._undo_stack().append((square, self.key))
+        self.position[square] = piece
+        new_turn = self.player_to_move.other_player()
+        self.key ^= piece_key(square, piece) ^ side_key(self.player_to_move) ^ side_key(new_turn)
+        self.player_to_move = new_turn
+
+    def pop(self):
+        """
+        Take back the last move played with push.
+        """
+        square, self.key = self._undo_stack().pop()
+        self.position[square] = TTTPiece['E']
+        self.player_to_move = self.player_to_move.other_player()
     
     def __str__(self):
         p = self.position
@@ -64,7 +89,19 @@ class TTTBoard(Board):
         return self.winner() is not None or len(self.legal_moves()) == 0
 
     def evaluation(self):
-        pass
+        """
+        The result with perfect play, from the solved table: 1/-1 if white/black wins, 0 for a draw.
+        """
+        entry = solved_table().probe(encode_position(self.position))
+        if entry is None or entry[0] is None:
+            return 0
+        return entry[0].top_score
+
+    def solved_move(self):
+        entry = solved_table().probe(encode_position(self.position))
+        if entry is None or entry[2] == NO_MOVE:
+            return None
+        return (entry[2], TTTPiece[self.player_to_move.name])
     
     def winner(self):
         """If the position is a win returns the winner. Otherwise None."""
@@ -78,3 +115,38 @@ class TTTBoard(Board):
                         return pos[w0].owner()
         return None
 
+
+
+# The table of perfect play is keyed by the position in base 3, square i being digit i (E 0, W 1, B 2).
+# Whose move it is follows from the number of pieces, so isn't part of the key.
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tables', 'ttt.npy')
+DIGITS = {'E': 0, 'W': 1, 'B': 2}
+POWERS = [3 ** i for i in range(9)]
+_table = None
+
+
+def encode_position(position):
+    return sum(DIGITS[position[square].name] * power for square, power in enumerate(POWERS))
+
+
+def _encode(board):
+    return encode_position(board.position)
+
+
+def solve_table():
+    """Solves every reachable position by retrograde analysis. Moves are stored as the square played."""
+    boards = reachable(TTTBoard(position=_initial_position()), _encode)
+    return solve(boards.keys(), boards.__getitem__, _encode, 3 ** 9, encode_move=lambda move: move[0])
+
+
+def solved_table(path=TABLE_PATH):
+    """The table of perfect play, loaded from path, or solved and saved there the first time it is needed."""
+    global _table
+    if _table is None:
+        if os.path.exists(path):
+            _table = RetrogradeTable.load(path)
+        else:
+            _table = solve_table()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _table.save(path)
+    return _table
@@ -0,0 +1,108 @@
+from compact import PackedBoard, unpack, packed_size, validate
+from evaluation import evaluator_for
+from minimax import iterative_deepening, result_score, SearchStats
+from transposition import TranspositionTable
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import itertools
+import os
+
+# positions are sent to the workers in chunks of this many, to spread the cost of sending them between processes
+CHUNK_SIZE = 16
+ANALYSIS_TT_SIZE_MB = 16
+
+# each worker process keeps a transposition table and evaluators between chunks; the table is cleared before each
+# position, so that a position's result doesn't depend on which positions the worker happened to search before it
+_tt = None
+_evaluators = {}
+
+
+def _evaluator(board):
+    board_type = type(board)
+    if board_type not in _evaluators:
+        try:
+            _evaluators[board_type] = evaluator_for(board)
+        except ValueError:
+            _evaluators[board_type] = None
+    return _evaluators[board_type]
+
+
+def analyse_board(board, max_depth=4, time_ms=None, tt=None):
+    """
+    Returns (move, score, nodes) for board: the best move (None if the game is over), its score (positive/negative
+    if white/black is better) and the number of nodes searched.
+    The search is iterative deepening to at most max_depth, stopping after time_ms milliseconds if that is given.
+    """
+    winner = board.winner()
+    if winner is not None:
+        return None, result_score(winner), 0
+    if not board.legal_moves():
+        return None, result_score(board.no_moves_winner()), 0
+
+    stats = SearchStats()
+    evaluator = _evaluator(board)
+    move, score = iterative_deepening(board, time_ms, max_depth=max_depth, stats=stats, tt=tt, evaluator=evaluator)
+    return move, float(score), stats.nodes
+
+
+def _analyse_chunk(chunk, max_depth, time_ms):
+    global _tt
+    if _tt is None:
+        _tt = TranspositionTable(ANALYSIS_TT_SIZE_MB)
+    results = []
+    for index, board in chunk:
+        if isinstance(board, PackedBoard):
+            board = unpack(board)
+        _tt.clear()
+        results.append((index, *analyse_board(board, max_depth, time_ms, _tt)))
+    return results
+
+
+def analyse(boards, max_depth=4, time_ms=None, workers=None, executor=None, chunk_size=CHUNK_SIZE):
+    """
+    Analyses many boards (or PackedBoards) in a pool of workers processes (default the number of CPUs; executor can
+    be a ProcessPoolExecutor to use instead, but not a thread pool, whose threads would share one table).
+    Yields (index, move, score, nodes) for each board, where index is its position in boards, as soon as it is
+    done, so results come back in the order they finish. boards can be any iterable, e.g. a generator reading a
+    file: only a few chunks per worker are read ahead.
+    """
+    own_executor = executor is None
+    if own_executor:
+        workers = workers or os.cpu_count()
+        executor = ProcessPoolExecutor(max_workers=workers)
+    max_in_flight = 4 * (workers or os.cpu_count())
+
+    numbered = enumerate(boards)
+    pending = set()
+    try:
+        while True:
+            chunk = list(itertools.islice(numbered, chunk_size))
+            if not chunk:
+                break
+            pending.add(executor.submit(_analyse_chunk, chunk, max_depth, time_ms))
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+    finally:
+        for future in pending:
+            future.cancel()
+        if own_executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def read_packed(board_type, data):
+    """
+    The PackedBoards in data: packed positions of board_type, one after another.
+    Raises ValueError if data isn't made of positions that can be unpacked.
+    """
+    size = packed_size(board_type)
+    if len(data) % size:
+        raise ValueError(f"{len(data)} bytes is not a whole number of {size} byte positions")
+    for start in range(0, len(data), size):
+        packed = PackedBoard(board_type, bytes(data[start:start + size]))
+        validate(packed)
+        yield packed
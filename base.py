@@ -1,6 +1,7 @@
 from abc import ABC
 from enum import Enum
 import json
+import zobrist
 
 
 class Piece:
@@ -12,6 +13,15 @@ class Board(ABC):
     instreams = None
     position = None
     player_to_move = None
+    previous_move = "none"
+    key = None
+    # sum of piece values, positive/negative for white/black, and the number of pieces each player has.
+    # Piece-square scores are not kept here: they belong to the evaluator (see evaluation.py), whose tables vary with
+    # its settings, and it scores them from the position at the leaves, many boards at once.
+    material = None
+    piece_counts = None
+    # if True a player who can capture must do so
+    captures_are_forced = False
 
     def winner(self):
         raise NotImplementedError
@@ -22,9 +32,111 @@ class Board(ABC):
     def make_move(self, move):
         raise NotImplementedError
 
+    def _candidate_moves(self):
+        """
+        Returns (moves, legal): a list that includes every legal move, and a function that tells whether one of them
+        is legal. Boards where testing legality is expensive override this to put off the test until it's needed.
+        """
+        return self.legal_moves(), lambda move: True
+
+    def iter_moves(self, hint=None):
+        """
+        Yields the legal moves in stages: hint first (if it is legal), then captures, then the other moves.
+        Legality is tested as each move is reached, so a search that stops early (a cutoff) doesn't pay for testing
+        the rest. Moves are generated from the board as it is when iteration starts; the board may be changed
+        between moves if it is changed back, as the search does with push and pop.
+        """
+        moves, legal = self._candidate_moves()
+        if hint is not None and hint in moves and legal(hint):
+            yield hint
+        quiets = []
+        for move in moves:
+            if move == hint:
+                continue
+            if self.captured_piece(move) is None:
+                quiets.append(move)
+            elif legal(move):
+                yield move
+        for move in quiets:
+            if legal(move):
+                yield move
+
     def evaluation(self):
         raise NotImplementedError
 
+    def __getstate__(self):
+        """Boards are pickled to send them to other processes (and copied); the undo stack isn't needed there."""
+        state = self.__dict__.copy()
+        state.pop('_undo', None)
+        return state
+
+    def _undo_stack(self):
+        stack = self.__dict__.get('_undo')
+        if stack is None:
+            stack = self._undo = []
+        return stack
+
+    def push(self, move):
+        """
+        Play move on this board, in place. pop() takes it back.
+        This version works for any board by copying the state of make_move's new board; subclasses override it to
+        avoid building a new board at all.
+        """
+        new_board = self.make_move(move)
+        stack = self._undo_stack()
+        stack.append(self.__dict__.copy())
+        self.__dict__.update(new_board.__dict__)
+        self._undo = stack
+
+    def pop(self):
+        """
+        Take back the last move played with push.
+        """
+        state = self._undo_stack().pop()
+        self.__dict__.clear()
+        self.__dict__.update(state)
+
+    def piece_at(self, square):
+        return self.position[square]
+
+    def no_moves_winner(self):
+        """The winner when the player to move has no legal moves, or None if that is a draw."""
+        return None
+
+    def solved_move(self):
+        """A perfect move looked up in a precomputed table (see retrograde.py), or None if there isn't one."""
+        return None
+
+    def captured_piece(self, move):
+        """The piece captured by move, or None if it isn't a capture. Used to order moves in the search."""
+        return None
+
+    def _compute_material(self):
+        """Returns (material, piece_counts) computed from scratch. make_move should update them incrementally."""
+        material = 0
+        piece_counts = {Player['W']: 0, Player['B']: 0}
+        for piece in self.position.values():
+            if piece.owner is not None:
+                material += piece.owner.top_score * piece.gvalue
+                piece_counts[piece.owner] += 1
+        return material, piece_counts
+
+    def _update_material(self, moving_piece, landing_piece, captured_piece):
+        """Returns (material, piece_counts) after moving_piece lands as landing_piece, capturing captured_piece."""
+        material = self.material
+        piece_counts = self.piece_counts
+        if captured_piece is not None and captured_piece.owner is not None:
+            material -= captured_piece.owner.top_score * captured_piece.gvalue
+            piece_counts = piece_counts.copy()
+            piece_counts[captured_piece.owner] -= 1
+        if landing_piece != moving_piece:
+            material += moving_piece.owner.top_score * (landing_piece.gvalue - moving_piece.gvalue)
+        return material, piece_counts
+
+    def _compute_key(self):
+        """Zobrist key of the board computed from scratch. make_move should update the key incrementally."""
+        return zobrist.position_key(self.position, self.player_to_move)
+
     @classmethod
     def from_dict(cls, values):
         r = {name: value for name, value in values.items() if name in cls.instreams}
@@ -33,7 +145,7 @@ class Board(ABC):
     def to_json(self):
         winner = self.winner()
 
-        ret = self.__dict__.copy()
+        ret = {name: getattr(self, name) for name in self.instreams}
         ret['player_to_move'] = ret['player_to_move'].name
         ret['position'] = {f"S{square[0]}{square[1]}": piece.name for square, piece in ret['position'].items()}
         lm = ret['previous_move']
@@ -0,0 +1,374 @@
+from base import Player
+from chess import ChessBoard, ChessPiece, _initial_position
+from zobrist import piece_key, side_key, flag_key
+
+# Square (row, col) is bit row*8 + col of a bitboard.
+SQUARES = [(i // 8, i % 8) for i in range(64)]
+FULL = (1 << 64) - 1
+
+PIECES = [ChessPiece[name] for name in ['WK', 'WQ', 'WB', 'WN', 'WR', 'WP', 'BK', 'BQ', 'BB', 'BN', 'BR', 'BP']]
+PIECE_INDEX = {piece: i for i, piece in enumerate(PIECES)}
+# offset of each player's pieces in PIECES, K Q B N R P follow in that order
+OFFSET = {Player['W']: 0, Player['B']: 6}
+K, Q, B, N, R, P = range(6)
+
+DIAGONALS = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+STRAIGHTS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+KNIGHT_JUMPS = [(2, 1), (2, -1), (-2, 1), (-2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2)]
+PAWN_DIRECTION = {Player['W']: 1, Player['B']: -1}
+PAWN_START_ROW = {Player['W']: 1, Player['B']: 6}
+
+
+def _on_board(row, col):
+    return 0 <= row < 8 and 0 <= col < 8
+
+
+def _step_table(steps):
+    """For each square, the bitboard of squares one step away in any of steps."""
+    table = []
+    for row, col in SQUARES:
+        bb = 0
+        for dr, dc in steps:
+            if _on_board(row + dr, col + dc):
+                bb |= 1 << ((row + dr) * 8 + col + dc)
+        table.append(bb)
+    return table
+
+
+def _ray_table(direction):
+    """For each square, the bitboard of squares on the ray from (but excluding) that square."""
+    table = []
+    dr, dc = direction
+    for row, col in SQUARES:
+        bb = 0
+        r, c = row + dr, col + dc
+        while _on_board(r, c):
+            bb |= 1 << (r * 8 + c)
+            r, c = r + dr, c + dc
+        table.append(bb)
+    return table
+
+
+KNIGHT_ATTACKS = _step_table(KNIGHT_JUMPS)
+KING_ATTACKS = _step_table(DIAGONALS + STRAIGHTS)
+# squares attacked by a pawn of the given player
+PAWN_ATTACKS = {player: _step_table([(d, 1), (d, -1)]) for player, d in PAWN_DIRECTION.items()}
+# rays in the direction of increasing/decreasing square index
+POSITIVE_RAYS = {d: _ray_table(d) for d in DIAGONALS + STRAIGHTS if d[0] * 8 + d[1] > 0}
+NEGATIVE_RAYS = {d: _ray_table(d) for d in DIAGONALS + STRAIGHTS if d[0] * 8 + d[1] < 0}
+
+
+def _slider_attacks(square, occupied, directions):
+    """
+    Squares attacked along directions from square, stopping at (and including) the first blocker.
+    Classical ray lookup: the ray beyond the nearest blocker is removed from the full ray.
+    """
+    attacks = 0
+    for d in directions:
+        ray = POSITIVE_RAYS.get(d)
+        if ray is not None:
+            bb = ray[square]
+            blockers = bb & occupied
+            if blockers:
+                bb ^= ray[(blockers & -blockers).bit_length() - 1]
+        else:
+            ray = NEGATIVE_RAYS[d]
+            bb = ray[square]
+            blockers = bb & occupied
+            if blockers:
+                bb ^= ray[blockers.bit_length() - 1]
+        attacks |= bb
+    return attacks
+
+
+def bishop_attacks(square, occupied):
+    return _slider_attacks(square, occupied, DIAGONALS)
+
+
+def rook_attacks(square, occupied):
+    return _slider_attacks(square, occupied, STRAIGHTS)
+
+
+def _bits(bb):
+    """Yields the index of each set bit of bb."""
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def _position_to_bitboards(position):
+    bitboards = [0] * 12
+    for square, piece in position.items():
+        if piece != ChessPiece['E']:
+            bitboards[PIECE_INDEX[piece]] |= 1 << (square[0] * 8 + square[1])
+    return bitboards
+
+
+def _attacked(bitboards, square, player):
+    """Is square attacked by any piece of player?"""
+    o = OFFSET[player]
+    occupied = 0
+    for bb in bitboards:
+        occupied |= bb
+    if KNIGHT_ATTACKS[square] & bitboards[o+N]:
+        return True
+    if KING_ATTACKS[square] & bitboards[o+K]:
+        return True
+    # a pawn of player attacks square if a pawn of the other player on square would attack it
+    if PAWN_ATTACKS[player.other_player()][square] & bitboards[o+P]:
+        return True
+    if bishop_attacks(square, occupied) & (bitboards[o+B] | bitboards[o+Q]):
+        return True
+    if rook_attacks(square, occupied) & (bitboards[o+R] | bitboards[o+Q]):
+        return True
+    return False
+
+
+# castling: (right, king from, king to, rook from, rook to, squares that must be empty)
+CASTLES = {
+    Player['W']: [('WKS', 4, 6, 7, 5, [5, 6]), ('WQS', 4, 2, 0, 3, [1, 2, 3])],
+    Player['B']: [('BKS', 60, 62, 63, 61, [61, 62]), ('BQS', 60, 58, 56, 59, [57, 58, 59])],
+}
+
+
+class BitboardChessBoard(ChessBoard):
+    """
+    ChessBoard backed by twelve bitboards (one python int per piece type) instead of a dict of squares.
+    Moves have the same ((row, col), (row, col)) format and the same rules as ChessBoard.
+    The position dict is built on demand, e.g. for to_json.
+    """
+
+    def __init__(self, **kwargs):
+        if kwargs == {}:
+            kwargs = _initial_position()
+
+        position = kwargs.pop('position', None)
+        bitboards = kwargs.pop('bitboards', None)
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+        self.bitboards = bitboards if bitboards is not None else _position_to_bitboards(position)
+
+        if self.key is None:
+            self.key = self._compute_key()
+        if self.material is None:
+            self.material, self.piece_counts = self._compute_material()
+
+    @property
+    def position(self):
+        pos = {square: ChessPiece['E'] for square in SQUARES}
+        for piece, bb in zip(PIECES, self.bitboards):
+            for sq in _bits(bb):
+                pos[SQUARES[sq]] = piece
+        return pos
+
+    def piece_at(self, square):
+        bit = 1 << (square[0] * 8 + square[1])
+        for piece, bb in zip(PIECES, self.bitboards):
+            if bb & bit:
+                return piece
+        return ChessPiece['E']
+
+    def _moves(self, player_to_move):
+        bitboards = self.bitboards
+        o = OFFSET[player_to_move]
+        mine = 0
+        theirs = 0
+        for i in range(6):
+            mine |= bitboards[o+i]
+            theirs |= bitboards[6-o+i]
+        occupied = mine | theirs
+        empty = FULL ^ occupied
+        not_mine = FULL ^ mine
+
+        moves = []
+
+        def add(from_sq, targets):
+            from_square = SQUARES[from_sq]
+            for to_sq in _bits(targets):
+                moves.append((from_square, SQUARES[to_sq]))
+
+        direction = PAWN_DIRECTION[player_to_move] * 8
+        start_row = PAWN_START_ROW[player_to_move]
+        for sq in _bits(bitboards[o+P]):
+            targets = PAWN_ATTACKS[player_to_move][sq] & theirs
+            one = sq + direction
+            if 0 <= one < 64 and empty >> one & 1:
+                targets |= 1 << one
+                two = one + direction
+                if sq // 8 == start_row and empty >> two & 1:
+                    targets |= 1 << two
+            add(sq, targets)
+
+        for sq in _bits(bitboards[o+N]):
+            add(sq, KNIGHT_ATTACKS[sq] & not_mine)
+
+        for sq in _bits(bitboards[o+B] | bitboards[o+Q]):
+            add(sq, bishop_attacks(sq, occupied) & not_mine)
+
+        for sq in _bits(bitboards[o+R] | bitboards[o+Q]):
+            add(sq, rook_attacks(sq, occupied) & not_mine)
+
+        for sq in _bits(bitboards[o+K]):
+            add(sq, KING_ATTACKS[sq] & not_mine)
+            for right, king_from, king_to, rook_from, _, between in CASTLES[player_to_move]:
+                if sq != king_from or not self.can_castle[right]:
+                    continue
+                if not bitboards[o+R] >> rook_from & 1:
+                    continue
+                if all(empty >> s & 1 for s in between):
+                    moves.append((SQUARES[king_from], SQUARES[king_to]))
+
+        return moves
+
+    def _apply(self, move):
+        """
+        Returns (bitboards, key, can_castle, pieces) after move, without checking legality.
+        pieces is (moving piece, landing piece, captured piece or None), for updating the material.
+        """
+        player_to_move = self.player_to_move
+        other_player = player_to_move.other_player()
+        from_square, to_square = move
+        from_sq = from_square[0] * 8 + from_square[1]
+        to_sq = to_square[0] * 8 + to_square[1]
+        from_bit = 1 << from_sq
+        to_bit = 1 << to_sq
+        o = OFFSET[player_to_move]
+
+        bitboards = self.bitboards.copy()
+        key = self.key ^ side_key(player_to_move) ^ side_key(other_player)
+
+        for i in range(o, o+6):
+            if bitboards[i] & from_bit:
+                moving = i
+                break
+        else:
+            raise AssertionError(f"no {player_to_move.name} piece on {from_square}")
+
+        captured_piece = None
+        for i in range(6-o, 12-o):
+            if bitboards[i] & to_bit:
+                bitboards[i] ^= to_bit
+                captured_piece = PIECES[i]
+                key ^= piece_key(to_square, captured_piece)
+                break
+
+        moving_piece = PIECES[moving]
+        landing = moving
+        if to_square[0] == moving_piece.promotion_rank:
+            landing = PIECE_INDEX[moving_piece.promotes_to()]
+
+        bitboards[moving] ^= from_bit
+        bitboards[landing] |= to_bit
+        key ^= piece_key(from_square, moving_piece) ^ piece_key(to_square, PIECES[landing])
+
+        can_castle = self.can_castle
+        if moving == o+K:
+            for _, king_from, king_to, rook_from, rook_to, _ in CASTLES[player_to_move]:
+                if from_sq == king_from and to_sq == king_to:
+                    bitboards[o+R] ^= (1 << rook_from) | (1 << rook_to)
+                    rook = PIECES[o+R]
+                    key ^= piece_key(SQUARES[rook_from], rook) ^ piece_key(SQUARES[rook_to], rook)
+
+            can_castle = can_castle.copy()
+            for right, *_ in CASTLES[player_to_move]:
+                if can_castle[right]:
+                    can_castle[right] = False
+                    key ^= flag_key(right)
+
+        return bitboards, key, can_castle, (moving_piece, PIECES[landing], captured_piece)
+
+    def square_attacked_by(self, square, player):
+        """Is square attacked by any of player's pieces?"""
+        return _attacked(self.bitboards, square[0] * 8 + square[1], player)
+
+    def _legal_move_test(self):
+        """
+        A function that tells whether a move from _moves is legal.
+        Only moves that could possibly expose the king are played out and tested: king moves, moves made while in
+        check and moves of pieces that can see the king along a line (the possibly pinned pieces).
+        """
+        player_to_move = self.player_to_move
+        other_player = player_to_move.other_player()
+        bitboards = self.bitboards
+        king = OFFSET[player_to_move] + K
+
+        king_sq = bitboards[king].bit_length() - 1
+        king_square = SQUARES[king_sq]
+        in_check = _attacked(bitboards, king_sq, other_player)
+
+        occupied = 0
+        for bb in bitboards:
+            occupied |= bb
+        maybe_pinned = bishop_attacks(king_sq, occupied) | rook_attacks(king_sq, occupied)
+
+        def legal(move):
+            from_square, to_square = move
+            from_sq = from_square[0] * 8 + from_square[1]
+            if not in_check and from_square != king_square and not maybe_pinned >> from_sq & 1:
+                return True
+            if from_square == king_square and abs(to_square[1] - from_square[1]) == 2:
+                # castling: not out of, through or into check
+                passing_sq = king_sq + (to_square[1] - from_square[1]) // 2
+                if in_check or _attacked(bitboards, passing_sq, other_player):
+                    return False
+            new_bitboards = self._apply(move)[0]
+            new_king_sq = new_bitboards[king].bit_length() - 1
+            return not _attacked(new_bitboards, new_king_sq, other_player)
+
+        return legal
+
+    def _num_pieces(self):
+        counts = {piece: bb.bit_count() for piece, bb in zip(PIECES, self.bitboards)}
+        counts[ChessPiece['E']] = 64 - sum(counts.values())
+        return counts
+
+    def evaluation(self):
+        """
+        Returns a float representing the evaluation of the board position.
+        Positive/negative if white/black has an advantage.
+        """
+        return self.material
+
+    def _compute_material(self):
+        material = 0
+        piece_counts = {Player['W']: 0, Player['B']: 0}
+        for piece, bb in zip(PIECES, self.bitboards):
+            material += piece.owner.top_score * piece.gvalue * bb.bit_count()
+            piece_counts[piece.owner] += bb.bit_count()
+        return material, piece_counts
+
+    def make_move(self, move):
+        """
+        Return a new board with the move played.
+        """
+        bitboards, key, can_castle, pieces = self._apply(move)
+        material, piece_counts = self._update_material(*pieces)
+        new_turn = self.player_to_move.other_player()
+        return BitboardChessBoard(bitboards=bitboards, player_to_move=new_turn, can_castle=can_castle,
+                                  previous_move=move, key=key, material=material, piece_counts=piece_counts)
+
+    def push(self, move):
+        """
+        Play move on this board, in place. pop() takes it back.
+        """
+        bitboards, key, can_castle, pieces = self._apply(move)
+        material, piece_counts = self._update_material(*pieces)
+        self._undo_stack().append((self.bitboards, self.key, self.can_castle, self.previous_move, self.material,
+                                   self.piece_counts))
+        self.material = material
+        self.piece_counts = piece_counts
+        self.bitboards = bitboards
+        self.key = key
+        self.can_castle = can_castle
+        self.previous_move = move
+        self.player_to_move = self.player_to_move.other_player()
+
+    def pop(self):
+        """
+        Take back the last move played with push.
+        """
+        self.bitboards, self.key, self.can_castle, self.previous_move, self.material, self.piece_counts = \
+            self._undo_stack().pop()
+        self.player_to_move = self.player_to_move.other_player()
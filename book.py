@@ -0,0 +1,138 @@
+from collections import Counter
+import argparse
+import json
+import mmap
+import os
+import numpy as np
+
+BOOK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'books')
+
+# A book file is an array of these entries sorted by key: the Zobrist key of a position, a move from it as the
+# row*8 + col indices of its squares, and how many times the move was played.
+ENTRY = np.dtype([('key', '<u8'), ('from', 'u1'), ('to', 'u1'), ('weight', '<u4')])
+
+
+def _square_index(square):
+    return square[0] * 8 + square[1]
+
+
+def _move(game_move):
+    """A move read from JSON (lists) as the ((row, col), (row, col)) tuples the boards use."""
+    return tuple(tuple(square) for square in game_move)
+
+
+def read_games(path):
+    """
+    Reads game records from a JSON lines file. Each line is a game: either a list of moves or an object with a
+    "moves" list (as written by self-play), where a move is [[row, col], [row, col]].
+    Chess games can also be read from a PGN file (ending in .pgn).
+    """
+    if str(path).endswith('.pgn'):
+        from notation import pgn_games
+        for tags, moves in pgn_games(path):
+            # games from a set up position don't start from the book's root
+            if 'FEN' not in tags:
+                yield moves
+        return
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            moves = record['moves'] if isinstance(record, dict) else record
+            yield [_move(move) for move in moves]
+
+
+def build_book(games, board_type, path, max_ply=20, min_weight=1):
+    """
+    Builds a book file at path from games (lists of moves from board_type()), counting each move played in the
+    first max_ply plies of a game. Moves played fewer than min_weight times are left out.
+    Returns the number of entries written.
+    """
+    counts = Counter()
+    for moves in games:
+        board = board_type()
+        for move in moves[:max_ply]:
+            if move not in board.legal_moves():
+                break
+            counts[(board.key, _square_index(move[0]), _square_index(move[1]))] += 1
+            board = board.make_move(move)
+
+    entries = np.array([(key, from_sq, to_sq, weight) for (key, from_sq, to_sq), weight in counts.items()
+                        if weight >= min_weight], dtype=ENTRY)
+    entries.sort(order=['key', 'from', 'to'])
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(entries.tobytes())
+    return len(entries)
+
+
+class OpeningBook:
+    """
+    Looks up moves in a book file without reading it: the file is memory mapped and binary searched in place.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                self._mmap = None
+                self.entries = np.zeros(0, dtype=ENTRY)
+            else:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self.entries = np.frombuffer(self._mmap, dtype=ENTRY)
+        self.keys = self.entries['key']
+
+    @classmethod
+    def open(cls, path):
+        """The book at path, or None if there isn't one."""
+        return cls(path) if os.path.exists(path) else None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def moves(self, board):
+        """The book moves from board with their weights, as a list of (move, weight)."""
+        key = np.uint64(board.key)
+        start = np.searchsorted(self.keys, key, 'left')
+        end = np.searchsorted(self.keys, key, 'right')
+        legal_moves = board.legal_moves()
+        moves = []
+        for entry in self.entries[start:end]:
+            move = (divmod(int(entry['from']), 8), divmod(int(entry['to']), 8))
+            # a different position with the same key could in theory have put an illegal move here
+            if move in legal_moves:
+                moves.append((move, int(entry['weight'])))
+        return moves
+
+    def move(self, board, rng=None):
+        """
+        A book move from board, or None if it isn't in the book.
+        Without rng the most played move is returned; with a random.Random moves are picked in proportion to how
+        often they were played.
+        """
+        moves = self.moves(board)
+        if not moves:
+            return None
+        if rng is None:
+            return max(moves, key=lambda mw: mw[1])[0]
+        return rng.choices([move for move, _ in moves], weights=[weight for _, weight in moves])[0]
+
+
+if __name__ == "__main__":
+    from chess import ChessBoard
+    from draughts import DraughtsBoard
+    board_types = {'chess': ChessBoard, 'draughts': DraughtsBoard}
+
+    parser = argparse.ArgumentParser(description="Build an opening book from game records.")
+    parser.add_argument('game', choices=board_types)
+    parser.add_argument('games', help="JSON lines file of games, or a PGN file of chess games")
+    parser.add_argument('--out', default=None, help="book file to write (default books/<game>.book)")
+    parser.add_argument('--max-ply', type=int, default=20, help="how many plies of each game to use")
+    parser.add_argument('--min-weight', type=int, default=1, help="leave out moves played fewer times")
+    args = parser.parse_args()
+
+    out = args.out or os.path.join(BOOK_DIR, args.game + '.book')
+    num_entries = build_book(read_games(args.games), board_types[args.game], out, args.max_ply, args.min_weight)
+    print(f"wrote {num_entries} entries to {out}")
@@ -0,0 +1,85 @@
+from collections import OrderedDict
+import json
+import sqlite3
+import threading
+
+
+class ResultCache:
+    """
+    Least recently used cache of search results, bounded by number of entries and (optionally) bytes.
+    Keys are tuples of strings and ints, such as (game, Zobrist key, depth); values anything that can be JSON encoded.
+    If path is given, results are also written to an SQLite database there, so they survive restarts: entries
+    evicted from memory, or from before a restart, are read back from it.
+    Safe to use from several threads.
+    """
+
+    def __init__(self, max_entries=10000, max_bytes=None, path=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        self.db = None
+        if path is not None:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT)")
+            self.db.commit()
+
+    def get(self, key):
+        """The value stored for key, or None."""
+        key = json.dumps(key)
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return json.loads(value)
+            if self.db is not None:
+                row = self.db.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self.disk_hits += 1
+                    self._add(key, row[0])
+                    return json.loads(row[0])
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        key = json.dumps(key)
+        value = json.dumps(value)
+        with self.lock:
+            self._add(key, value)
+            if self.db is not None:
+                self.db.execute("INSERT OR REPLACE INTO results VALUES (?, ?)", (key, value))
+                self.db.commit()
+
+    def _add(self, key, value):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.bytes -= len(key) + len(old)
+        self.entries[key] = value
+        self.bytes += len(key) + len(value)
+        while len(self.entries) > self.max_entries or (self.max_bytes is not None and self.bytes > self.max_bytes):
+            old_key, old_value = self.entries.popitem(last=False)
+            self.bytes -= len(old_key) + len(old_value)
+            self.evictions += 1
+
+    def clear(self):
+        """Empties the cache in memory (not on disk) and resets the counters."""
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+            self.hits = self.disk_hits = self.misses = self.evictions = 0
+
+    def hit_rate(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return (self.hits + self.disk_hits) / lookups if lookups else 0.0
+
+    def stats(self):
+        """Counters for monitoring, as a dict."""
+        return {'entries': len(self.entries), 'bytes': self.bytes, 'hits': self.hits, 'disk_hits': self.disk_hits,
+                'misses': self.misses, 'evictions': self.evictions, 'hit_rate': self.hit_rate(),
+                'persistent': self.db is not None}
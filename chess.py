@@ -1,6 +1,7 @@
 from base import Board, Player
 from enum import Enum
 from collections import defaultdict
+from zobrist import piece_key, side_key, flag_key
 
 
 class ChessPiece(Enum):
@@ -80,6 +81,32 @@ def _offset_square(square, offset):
     return (square[0]+offset[0], square[1]+offset[1])
 
 
+def _on_board(square):
+    return 0 <= square[0] <= 7 and 0 <= square[1] <= 7
+
+
+_diagonals = [(1, 1), (1, -1), (-1, -1), (-1, 1)]
+_straights = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+_knight_jumps = [(2, 1), (2, -1), (-2, 1), (-2, -1), (1, 2), (1, -2), (-1, -2), (-1, 2)]
+_pawn_direction = {Player['W']: 1, Player['B']: -1}
+
+
+def _sliders(direction):
+    """The piece types that move along direction."""
+    return ('Bishop', 'Queen') if direction in _diagonals else ('Rook', 'Queen')
+
+
+def _direction(from_sq, to_sq):
+    """The unit step from from_sq towards to_sq, or None if they don't share a line or diagonal."""
+    dr = to_sq[0] - from_sq[0]
+    dc = to_sq[1] - from_sq[1]
+    if dr == 0 and dc == 0:
+        return None
+    if dr != 0 and dc != 0 and abs(dr) != abs(dc):
+        return None
+    return ((dr > 0) - (dr < 0), (dc > 0) - (dc < 0))
+
+
 def _moves_for_direction(pos, start_square, max_distance, direction, include_captures=True, only_captures=False):
     end_squares = []
     piece = pos[start_square]
@@ -105,6 +132,14 @@ def _moves_for_direction(pos, start_square, max_distance, direction, include_cap
     return [(start_square, end_square) for end_square in end_squares]
 
 
+# FEN letters of the pieces (upper case for white) and castling rights
+FEN_PIECES = {'K': 'WK', 'Q': 'WQ', 'B': 'WB', 'N': 'WN', 'R': 'WR', 'P': 'WP',
+              'k': 'BK', 'q': 'BQ', 'b': 'BB', 'n': 'BN', 'r': 'BR', 'p': 'BP'}
+FEN_LETTERS = {name: letter for letter, name in FEN_PIECES.items()}
+FEN_CASTLES = {'K': 'WKS', 'Q': 'WQS', 'k': 'BKS', 'q': 'BQS'}
+INITIAL_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+
+
 class ChessBoard(Board):
 
     instreams = ['player_to_move', 'position', 'can_castle', 'previous_move']
@@ -121,6 +156,17 @@ class ChessBoard(Board):
         for name, value in kwargs.items():
             setattr(self, name, value)
 
+        if self.key is None:
+            self.key = self._compute_key()
+        if self.material is None:
+            self.material, self.piece_counts = self._compute_material()
+
+    def _compute_key(self):
+        key = super()._compute_key()
+        for side, value in self.can_castle.items():
+            key ^= flag_key(side, value)
+        return key
+
     def _moves(self, player_to_move):
 
         pos = self.position
@@ -156,7 +202,7 @@ class ChessBoard(Board):
                 moves += _moves_for_direction(pos, from_sq, 1, (1, 0), include_captures=False)
                 moves += _moves_for_direction(pos, from_sq, 1, (1, 1), only_captures=True)
                 moves += _moves_for_direction(pos, from_sq, 1, (1, -1), only_captures=True)
-                if from_sq[0] == 1:
+                if from_sq[0] == 1 and pos[_offset_square(from_sq, (1, 0))] == E:
                     moves += _moves_for_direction(pos, from_sq, 1, (2, 0), include_captures=False)
                 continue
 
@@ -164,7 +210,7 @@ class ChessBoard(Board):
                 moves += _moves_for_direction(pos, from_sq, 1, (-1, 0), include_captures=False)
                 moves += _moves_for_direction(pos, from_sq, 1, (-1, 1), only_captures=True)
                 moves += _moves_for_direction(pos, from_sq, 1, (-1, -1), only_captures=True)
-                if from_sq[0] == 6:
+                if from_sq[0] == 6 and pos[_offset_square(from_sq, (-1, 0))] == E:
                     moves += _moves_for_direction(pos, from_sq, 1, (-2, 0), include_captures=False)
                 continue
 
@@ -230,19 +276,135 @@ class ChessBoard(Board):
 
         return len(king_captures) > 0
 
+    def _attackers(self, square, player, ignore=None):
+        """
+        List of the squares of player's pieces that attack square.
+        Looks outward from square, treating the square ignore as empty.
+        """
+        pos = self.position
+        E = ChessPiece['E']
+        attackers = []
+
+        for offset in _knight_jumps:
+            sq = _offset_square(square, offset)
+            piece = pos.get(sq, E)
+            if piece.owner == player and piece.type == 'Knight':
+                attackers.append(sq)
+
+        pawn_row = square[0] - _pawn_direction[player]
+        for sq in [(pawn_row, square[1]-1), (pawn_row, square[1]+1)]:
+            piece = pos.get(sq, E)
+            if piece.owner == player and piece.type == 'Pawn':
+                attackers.append(sq)
+
+        for direction in _diagonals + _straights:
+            sliders = _sliders(direction)
+            sq = _offset_square(square, direction)
+            distance = 1
+            while _on_board(sq):
+                piece = pos[sq]
+                if piece != E and sq != ignore:
+                    if piece.owner == player and (piece.type in sliders or (piece.type == 'King' and distance == 1)):
+                        attackers.append(sq)
+                    break
+                sq = _offset_square(sq, direction)
+                distance += 1
+
+        return attackers
+
+    def square_attacked_by(self, square, player):
+        """Is square attacked by any of player's pieces?"""
+        return len(self._attackers(square, player)) > 0
+
+    def _pins(self, king_sq, player):
+        """
+        Returns a dict mapping each of player's pinned pieces to the direction from the king to the pinning piece.
+        """
+        pos = self.position
+        E = ChessPiece['E']
+        pins = {}
+        for direction in _diagonals + _straights:
+            sliders = _sliders(direction)
+            candidate = None
+            sq = _offset_square(king_sq, direction)
+            while _on_board(sq):
+                piece = pos[sq]
+                if piece != E:
+                    if piece.owner == player and candidate is None:
+                        candidate = sq
+                    else:
+                        if piece.owner != player and piece.type in sliders and candidate is not None:
+                            pins[candidate] = direction
+                        break
+                sq = _offset_square(sq, direction)
+        return pins
+
     def legal_moves(self):
         """
         List of legal moves.
         A move is a pair of squares (from,to).
         """
+        legal = self._legal_move_test()
+        return [move for move in self._moves(self.player_to_move) if legal(move)]
 
-        # first list all the moves our pieces can make
-        player_to_move = self.player_to_move
-        moves = self._moves(player_to_move)
+    def _candidate_moves(self):
+        return self._moves(self.player_to_move), self._legal_move_test()
 
-        legal_moves = [m for m in moves if not self._puts_me_in_check(m)]
+    def _legal_move_test(self):
+        """
+        A function that tells whether a move from _moves is legal.
+        Rather than playing each move and looking for a reply that captures the king, legality is decided by
+        looking outward from the king: which pieces give check and which of our pieces are pinned. These are worked
+        out once, when the function is made.
+        """
+        player_to_move = self.player_to_move
+        other_player = player_to_move.other_player()
+        pos = self.position
 
-        return legal_moves
+        my_king = ChessPiece[player_to_move.name + 'K']
+        king_sq = [sq for sq, piece in pos.items() if piece == my_king]
+        assert(len(king_sq) == 1)
+        king_sq = king_sq[0]
+
+        checkers = self._attackers(king_sq, other_player)
+        pins = self._pins(king_sq, player_to_move)
+
+        # squares a non-king move must land on to get out of check
+        evasions = None
+        if len(checkers) == 1:
+            checker = checkers[0]
+            evasions = {checker}
+            if pos[checker].type in ('Bishop', 'Rook', 'Queen'):
+                direction = _direction(king_sq, checker)
+                sq = _offset_square(king_sq, direction)
+                while sq != checker:
+                    evasions.add(sq)
+                    sq = _offset_square(sq, direction)
+
+        def legal(move):
+            from_sq, to_sq = move
+            if from_sq == king_sq:
+                if abs(to_sq[1] - from_sq[1]) == 2:
+                    # castling: not out of, through or into check
+                    passing_sq = (from_sq[0], (from_sq[1] + to_sq[1]) // 2)
+                    if checkers or self.square_attacked_by(passing_sq, other_player):
+                        return False
+                return not self._attackers(to_sq, other_player, ignore=king_sq)
+
+            if len(checkers) > 1:
+                return False
+            if evasions is not None and to_sq not in evasions:
+                return False
+            pin = pins.get(from_sq)
+            if pin is not None and _direction(king_sq, to_sq) not in (pin, (-pin[0], -pin[1])):
+                return False
+            return True
+
+        return legal
+
+    def captured_piece(self, move):
+        piece = self.piece_at(move[1])
+        return None if piece == ChessPiece['E'] else piece
 
     def _num_pieces(self):
         """Returns pos, a dict mapping each piece to the counts of that piece on the board"""
@@ -258,72 +420,197 @@ class ChessBoard(Board):
         """
         return None
 
+    def solved_move(self):
+        """The tablebase move, in endings that have a table (see tablebase.py)."""
+        from tablebase import default_tablebases, MAX_PIECES
+        if sum(self.piece_counts.values()) > MAX_PIECES:
+            return None
+        entry = default_tablebases().probe(self)
+        return entry[2] if entry is not None else None
+
+    def no_moves_winner(self):
+        """Without legal moves, a player in check is checkmated. Otherwise it is stalemate."""
+        my_king = ChessPiece[self.player_to_move.name + 'K']
+        king_sq = [sq for sq, piece in self.position.items() if piece == my_king][0]
+        other_player = self.player_to_move.other_player()
+        return other_player if self.square_attacked_by(king_sq, other_player) else None
+
     def evaluation(self):
         """
         Returns a float representing the evaluation of the board position.
         Positive/negative if white/black has an advantage.
+        The material balance is kept up to date by make_move, so this doesn't need to look at the board.
         """
-        counts = self._num_pieces()
-        del counts[ChessPiece['E']]
-        sums = defaultdict(int)
-
-        for piece, count in counts.items():
-            sums[piece.owner] += count * piece.gvalue
-        W = sums[Player['W']]
-        B = sums[Player['B']]
-
-        piece_value = (W-B)
-
-        return piece_value
+        return self.material
 
-    def make_move(self, move):
+    def _play(self, pos, move):
         """
-        Return a new board with the move played.
+        Play move on the position dict pos (a copy of self.position, or self.position itself).
+        Returns the new key, castling rights, material and piece counts, and what is needed to undo the move.
         """
         player_to_move = self.player_to_move
         from_square, to_square = move
 
-        new_pos = self.position.copy()
-
-        moving_piece = new_pos[from_square]
+        moving_piece = pos[from_square]
         assert(moving_piece.owner == player_to_move)
+        captured_piece = pos[to_square]
 
         is_promotion = (to_square[0] == moving_piece.promotion_rank)
 
         landing_piece = moving_piece if not is_promotion else moving_piece.promotes_to()
 
-        new_pos[to_square] = landing_piece
-        new_pos[from_square] = ChessPiece['E']
+        material, piece_counts = self._update_material(moving_piece, landing_piece, captured_piece)
+
+        key = self.key ^ side_key(player_to_move) ^ side_key(player_to_move.other_player())
+        key ^= piece_key(from_square, moving_piece) ^ piece_key(to_square, captured_piece)
+        key ^= piece_key(to_square, landing_piece)
+
+        pos[to_square] = landing_piece
+        pos[from_square] = ChessPiece['E']
+
+        rook_move = None
 
         if moving_piece == ChessPiece['WK'] and to_square == (0, 6) and from_square == (0, 4):
-            new_pos[(0, 7)] = ChessPiece['E']
-            new_pos[(0, 5)] = ChessPiece['WR']
+            rook_move = ((0, 7), (0, 5))
 
         if moving_piece == ChessPiece['WK'] and to_square == (0, 2) and from_square == (0, 4):
-            new_pos[(0, 0)] = ChessPiece['E']
-            new_pos[(0, 3)] = ChessPiece['WR']
+            rook_move = ((0, 0), (0, 3))
 
         if moving_piece == ChessPiece['BK'] and to_square == (7, 6) and from_square == (7, 4):
-            new_pos[(7, 7)] = ChessPiece['E']
-            new_pos[(7, 5)] = ChessPiece['BR']
+            rook_move = ((7, 7), (7, 5))
 
         if moving_piece == ChessPiece['BK'] and to_square == (7, 2) and from_square == (7, 4):
-            new_pos[(7, 0)] = ChessPiece['E']
-            new_pos[(7, 3)] = ChessPiece['BR']
+            rook_move = ((7, 0), (7, 3))
 
-        can_castle = self.can_castle.copy()
+        if rook_move is not None:
+            rook_from, rook_to = rook_move
+            rook = pos[rook_from]
+            pos[rook_from] = ChessPiece['E']
+            pos[rook_to] = rook
+            key ^= piece_key(rook_from, rook) ^ piece_key(rook_to, rook)
 
-        if moving_piece == ChessPiece['WK']:
-            can_castle['WKS'] = False
-            can_castle['WQS'] = False
+        can_castle = self.can_castle
 
-        if moving_piece == ChessPiece['BK']:
-            can_castle['BKS'] = False
-            can_castle['BQS'] = False
+        if moving_piece.type == 'King':
+            can_castle = can_castle.copy()
+            for side in ['KS', 'QS']:
+                side = player_to_move.name + side
+                if can_castle[side]:
+                    can_castle[side] = False
+                    key ^= flag_key(side)
 
-        new_turn = player_to_move.other_player()
+        return key, can_castle, material, piece_counts, (moving_piece, captured_piece, rook_move)
 
-        return ChessBoard(position=new_pos, player_to_move=new_turn, can_castle=can_castle, previous_move=move)
+    def make_move(self, move):
+        """
+        Return a new board with the move played.
+        """
+        new_pos = self.position.copy()
+        key, can_castle, material, piece_counts, _ = self._play(new_pos, move)
+        new_turn = self.player_to_move.other_player()
+
+        return ChessBoard(position=new_pos, player_to_move=new_turn, can_castle=can_castle, previous_move=move, key=key,
+                          material=material, piece_counts=piece_counts)
+
+    def push(self, move):
+        """
+        Play move on this board, in place. pop() takes it back.
+        """
+        key, can_castle, material, piece_counts, undo = self._play(self.position, move)
+        self._undo_stack().append((move, undo, self.key, self.can_castle, self.previous_move, self.material,
+                                   self.piece_counts))
+        self.key = key
+        self.can_castle = can_castle
+        self.material = material
+        self.piece_counts = piece_counts
+        self.previous_move = move
+        self.player_to_move = self.player_to_move.other_player()
+
+    def pop(self):
+        """
+        Take back the last move played with push.
+        """
+        move, undo, self.key, self.can_castle, self.previous_move, self.material, self.piece_counts = \
+            self._undo_stack().pop()
+        from_square, to_square = move
+        moving_piece, captured_piece, rook_move = undo
+        pos = self.position
+
+        pos[from_square] = moving_piece
+        pos[to_square] = captured_piece
+        if rook_move is not None:
+            rook_from, rook_to = rook_move
+            pos[rook_from] = pos[rook_to]
+            pos[rook_to] = ChessPiece['E']
+        self.player_to_move = self.player_to_move.other_player()
+
+    @classmethod
+    def from_fen(cls, fen):
+        """
+        The board described by a FEN string. Only the first four fields are needed (as in EPD).
+        En passant isn't implemented so the en passant square is ignored, as are the move counters.
+        Raises ValueError if fen can't be read, hasn't one king of each colour, or has the side not to move in check.
+        """
+        fields = fen.split()
+        if len(fields) < 4:
+            raise ValueError(f"FEN needs at least 4 fields: {fen!r}")
+        placement, side, castling = fields[:3]
+
+        ranks = placement.split('/')
+        if len(ranks) != 8:
+            raise ValueError(f"FEN placement needs 8 ranks: {placement!r}")
+        pos = blank_board()
+        for row, rank in zip(range(7, -1, -1), ranks):
+            col = 0
+            for char in rank:
+                if char.isdigit():
+                    col += int(char)
+                elif char in FEN_PIECES and col < 8:
+                    pos[(row, col)] = ChessPiece[FEN_PIECES[char]]
+                    col += 1
+                else:
+                    raise ValueError(f"bad FEN rank {rank!r}")
+            if col != 8:
+                raise ValueError(f"FEN rank {rank!r} isn't 8 squares")
+        pieces = list(pos.values())
+        if pieces.count(ChessPiece['WK']) != 1 or pieces.count(ChessPiece['BK']) != 1:
+            raise ValueError(f"FEN placement needs one king of each colour: {placement!r}")
+
+        if side not in ('w', 'b'):
+            raise ValueError(f"bad FEN side to move {side!r}")
+        if castling != '-' and not set(castling) <= set(FEN_CASTLES):
+            raise ValueError(f"bad FEN castling rights {castling!r}")
+        can_castle = {name: letter in castling for letter, name in FEN_CASTLES.items()}
+
+        board = cls(position=pos, player_to_move=Player['W'] if side == 'w' else Player['B'],
+                    can_castle=can_castle, previous_move="none")
+        # the side to move could capture the other king
+        other_king = ChessPiece['BK'] if side == 'w' else ChessPiece['WK']
+        king_square = next(square for square, piece in pos.items() if piece == other_king)
+        if board.square_attacked_by(king_square, board.player_to_move):
+            raise ValueError(f"the side not to move is in check: {fen!r}")
+        return board
+
+    def to_fen(self, halfmove=0, fullmove=1):
+        """The FEN string of the board. The board doesn't count moves, so the counters are given."""
+        pos = self.position
+        ranks = []
+        for row in range(7, -1, -1):
+            rank = ''
+            empty = 0
+            for col in range(8):
+                piece = pos[(row, col)]
+                if piece == ChessPiece['E']:
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += FEN_LETTERS[piece.name]
+            ranks.append(rank + (str(empty) if empty else ''))
+        castling = ''.join(letter for letter, name in FEN_CASTLES.items() if self.can_castle[name]) or '-'
+        side = 'w' if self.player_to_move == Player['W'] else 'b'
+        return f"{'/'.join(ranks)} {side} {castling} - {halfmove} {fullmove}"
 
     def __str__(self):
         """Return a string representation of the board"""
@@ -0,0 +1,130 @@
+from base import Player
+
+# Packed positions are one bytes object: a byte per square (the index of the piece in its Enum), then a trailer.
+# Square i is the i-th key of the board's position dict, which for 8x8 boards is (row, col) = divmod(i, 8).
+NO_SQUARE = 255
+CASTLES = ['WQS', 'BQS', 'WKS', 'BKS']
+PLAYERS = [Player['W'], Player['B']]
+
+_layouts = {}
+
+
+def square_index(square):
+    """Integer index 0-63 of the (row, col) square of an 8x8 board."""
+    return square[0] * 8 + square[1]
+
+
+def square_tuple(index):
+    """The (row, col) square with integer index 0-63."""
+    return divmod(index, 8)
+
+
+class _Layout:
+    """The squares and pieces of one type of board, in the order they are packed."""
+
+    __slots__ = ('squares', 'square_indices', 'pieces', 'piece_codes', 'instreams')
+
+    def __init__(self, board_type):
+        position = board_type().position
+        self.squares = list(position)
+        self.square_indices = {square: i for i, square in enumerate(self.squares)}
+        self.pieces = list(type(next(iter(position.values()))))
+        self.piece_codes = {piece: i for i, piece in enumerate(self.pieces)}
+        self.instreams = board_type.instreams or ['player_to_move', 'position']
+
+
+def _layout(board_type):
+    if board_type not in _layouts:
+        _layouts[board_type] = _Layout(board_type)
+    return _layouts[board_type]
+
+
+def packed_size(board_type):
+    """The number of bytes in the PackedBoard of a board_type board."""
+    return len(_layout(board_type).squares) + 4
+
+
+class PackedBoard:
+    """
+    A position in len(position) + 4 bytes (68 for chess and draughts), for storing many positions: game histories,
+    caches, or anything else that keeps boards around. It is immutable and hashable, so can be a dict key.
+    pack turns a board into one and unpack turns it back into a board that can be played on.
+    """
+
+    __slots__ = ('board_type', 'data')
+
+    def __init__(self, board_type, data):
+        self.board_type = board_type
+        self.data = data
+
+    @property
+    def player_to_move(self):
+        return PLAYERS[self.data[-4]]
+
+    def piece_at(self, index):
+        """The piece on the square with integer index."""
+        return _layout(self.board_type).pieces[self.data[index]]
+
+    def __eq__(self, other):
+        return isinstance(other, PackedBoard) and self.board_type is other.board_type and self.data == other.data
+
+    def __hash__(self):
+        return hash(self.data)
+
+    def __repr__(self):
+        return f"PackedBoard({self.board_type.__name__}, {self.data.hex()})"
+
+
+def pack(board):
+    """The PackedBoard of board."""
+    layout = _layout(type(board))
+    codes = layout.piece_codes
+    data = bytearray(codes[board.position[square]] for square in layout.squares)
+
+    can_castle = getattr(board, 'can_castle', None) or {}
+    castles = sum(1 << i for i, name in enumerate(CASTLES) if can_castle.get(name))
+
+    previous_move = getattr(board, 'previous_move', "none")
+    if previous_move == "none" or previous_move is None:
+        previous = (NO_SQUARE, NO_SQUARE)
+    else:
+        previous = (layout.square_indices[previous_move[0]], layout.square_indices[previous_move[1]])
+
+    data += bytes([PLAYERS.index(board.player_to_move), castles, *previous])
+    return PackedBoard(type(board), bytes(data))
+
+
+def validate(packed):
+    """Raises ValueError if packed isn't a position unpack can read, e.g. because it came from outside."""
+    layout = _layout(packed.board_type)
+    data = packed.data
+    num_squares = len(layout.squares)
+    if len(data) != num_squares + 4:
+        raise ValueError(f"a packed {packed.board_type.__name__} is {num_squares + 4} bytes, not {len(data)}")
+    if max(data[:num_squares]) >= len(layout.pieces):
+        raise ValueError(f"bad piece code {max(data[:num_squares])}")
+    player, castles, previous_from, previous_to = data[num_squares:]
+    if player >= len(PLAYERS):
+        raise ValueError(f"bad player to move {player}")
+    if castles >> len(CASTLES):
+        raise ValueError(f"bad castling rights {castles}")
+    if previous_from != NO_SQUARE and (previous_from >= num_squares or previous_to >= num_squares):
+        raise ValueError(f"bad previous move {previous_from}, {previous_to}")
+
+
+def unpack(packed):
+    """A new board, of the type that was packed, with the packed position."""
+    layout = _layout(packed.board_type)
+    data = packed.data
+    pieces = layout.pieces
+    num_squares = len(layout.squares)
+    player, castles, previous_from, previous_to = data[num_squares:]
+
+    state = {
+        'position': {square: pieces[code] for square, code in zip(layout.squares, data)},
+        'player_to_move': PLAYERS[player],
+        'can_castle': {name: bool(castles >> i & 1) for i, name in enumerate(CASTLES)},
+        'previous_move': "none" if previous_from == NO_SQUARE else
+                         (layout.squares[previous_from], layout.squares[previous_to]),
+    }
+    return packed.board_type(**{name: state[name] for name in layout.instreams})
@@ -1,20 +1,22 @@
 from base import Board, Player
 from enum import Enum
 from collections import defaultdict
+from zobrist import piece_key, side_key, flag_key
 
 
 class DraughtsPiece(Enum):
 
-    B = (Player['B'], 'BK', 0)
-    W = (Player['W'], 'WK', 7)
-    BK = (Player['B'], None, None)
-    WK = (Player['W'], None, None)
-    E = (None, None, None)
+    B = (Player['B'], 'BK', 0, 1)
+    W = (Player['W'], 'WK', 7, 1)
+    BK = (Player['B'], None, None, 2)
+    WK = (Player['W'], None, None, 2)
+    E = (None, None, None, None)
 
-    def __init__(self, owner, promotes_to_name, promotion_rank):
+    def __init__(self, owner, promotes_to_name, promotion_rank, gvalue):
         self.owner = owner
         self.promotes_to_name = promotes_to_name
         self.promotion_rank = promotion_rank
+        self.gvalue = gvalue
 
     def promotes_to(self):
         """What does this piece promote to when it hits the back rank"""
@@ -42,16 +44,20 @@ def _initial_position():
 
 def _captures_available(position, player_to_move, from_sq):
     "Are there captures available by the piece at from_sq"
-    board = DraughtsBoard(position, player_to_move)
-    legal_moves = board.legal_moves()
-
-    captures = [move for move in legal_moves if move[0] == from_sq and abs(move[0][0]-move[1][0]) == 2]
-    return len(captures) > 0
+    piece = position[from_sq]
+    other_player = player_to_move.other_player()
+    for (xm, ym) in DraughtsBoard._moves[piece]:
+        over = position.get((from_sq[0] + xm, from_sq[1] + ym))
+        beyond = position.get((from_sq[0] + 2*xm, from_sq[1] + 2*ym))
+        if over is not None and over.owner == other_player and beyond == DraughtsPiece['E']:
+            return True
+    return False
 
 
 class DraughtsBoard(Board):
 
     instreams = ['player_to_move', 'position', 'previous_move']
+    captures_are_forced = True
     _moves = {
             DraughtsPiece['W']: [(1, 1), (1, -1)],
             DraughtsPiece['B']: [(-1, -1), (-1, 1)],
@@ -59,10 +65,36 @@ class DraughtsBoard(Board):
             DraughtsPiece['BK']: [(1, 1), (1, -1), (-1, 1), (-1, -1)],
     }
 
-    def __init__(self, position=_initial_position(), player_to_move=Player['W'], previous_move="none"):
+    def __init__(self, position=None, player_to_move=Player['W'], previous_move="none", key=None,
+                 material=None, piece_counts=None):
         self.player_to_move = player_to_move
-        self.position = position
+        # a new dict for every board: push changes the position in place
+        self.position = position if position is not None else _initial_position()
         self.previous_move = previous_move
+        self.key = key if key is not None else self._compute_key()
+        if material is None:
+            material, piece_counts = self._compute_material()
+        self.material = material
+        self.piece_counts = piece_counts
+
+    def _compute_key(self):
+        key = super()._compute_key()
+        capturing_piece = self._capturing_piece()
+        if capturing_piece is not None:
+            key ^= flag_key(('capturing', capturing_piece))
+        return key
+
+    def _capturing_piece(self):
+        """
+        If we are in the middle of a multicapture returns the square of the capturing piece, otherwise None.
+        """
+        prev_move = self.previous_move
+        if prev_move != "none":
+            prev_player = self.position[prev_move[1]].owner
+            was_capture = self._move_is_capture(prev_move)
+            if prev_player == self.player_to_move and was_capture:
+                return prev_move[1]
+        return None
 
     def legal_moves(self):
         """
@@ -75,14 +107,8 @@ class DraughtsBoard(Board):
         regular_moves = []
         captures = []
         empty = DraughtsPiece['E']
-        valid_piece = None
-        prev_move = self.previous_move
         # check if we are in the middle of a multicapture. If so, we can only move the capturing piece.
-        if prev_move != "none":
-            prev_player = pos[prev_move[1]].owner
-            was_capture = self._move_is_capture(prev_move)
-            if prev_player == player_to_move and was_capture:
-                valid_piece = prev_move[1]
+        valid_piece = self._capturing_piece()
 
         for from_sq, Piece in pos.items():
             if valid_piece and valid_piece != from_sq:
@@ -116,9 +142,8 @@ class DraughtsBoard(Board):
         """
         There is a winner if one side has no pieces.
         """
-        counts = self.num_pieces()
-        nwhite = counts[DraughtsPiece['W']] + counts[DraughtsPiece['WK']]
-        nblack = counts[DraughtsPiece['B']] + counts[DraughtsPiece['BK']]
+        nwhite = self.piece_counts[Player['W']]
+        nblack = self.piece_counts[Player['B']]
 
         if nwhite == 0 and nblack != 0:
             return Player['B']
@@ -131,12 +156,9 @@ class DraughtsBoard(Board):
         """
         Returns a float representing the evaluation of the board position.
         Positive/negative if white/black has an advantage.
+        Men are worth 1 and kings 2; the total is kept up to date by make_move.
         """
-        counts = self.num_pieces()
-        W = counts[DraughtsPiece['W']] + 2*counts[DraughtsPiece['WK']]
-        B = counts[DraughtsPiece['B']] + 2*counts[DraughtsPiece['BK']]
-
-        return W-B
+        return self.material
 
     def game_over(self):
         """
@@ -144,38 +166,93 @@ class DraughtsBoard(Board):
         """
         return self.winner() is not None
 
-    def make_move(self, move):
+    def _play(self, pos, move):
         """
-        Return a new board with the move played.
+        Play move on the position dict pos (a copy of self.position, or self.position itself).
+        Returns the new player to move, key, material and piece counts, and what is needed to undo the move.
         """
         player_to_move = self.player_to_move
         from_square, to_square = move
 
-        new_pos = self.position.copy()
-
-        moving_piece = new_pos[from_square]
+        moving_piece = pos[from_square]
         assert(moving_piece.owner == player_to_move)
+        capturing_piece = self._capturing_piece()
 
         is_promotion = (to_square[0] == moving_piece.promotion_rank)
 
         landing_piece = moving_piece if not is_promotion else moving_piece.promotes_to()
 
-        new_pos[to_square] = landing_piece
-        new_pos[from_square] = DraughtsPiece['E']
+        pos[to_square] = landing_piece
+        pos[from_square] = DraughtsPiece['E']
+
+        key = self.key ^ piece_key(from_square, moving_piece) ^ piece_key(to_square, landing_piece)
+        if capturing_piece is not None:
+            key ^= flag_key(('capturing', capturing_piece))
 
+        empty_square = None
+        captured_piece = None
         is_capture = self._move_is_capture(move)
         if is_capture:
-            empty_square = ((to_square[0] + from_square[0])/2, (to_square[1] + from_square[1])/2)
-            assert(new_pos[empty_square].owner == player_to_move.other_player())
-            new_pos[empty_square] = DraughtsPiece['E']
+            empty_square = ((to_square[0] + from_square[0])//2, (to_square[1] + from_square[1])//2)
+            captured_piece = pos[empty_square]
+            assert(captured_piece.owner == player_to_move.other_player())
+            key ^= piece_key(empty_square, captured_piece)
+            pos[empty_square] = DraughtsPiece['E']
 
-        new_player_to_move = player_to_move.other_player()
+        material, piece_counts = self._update_material(moving_piece, landing_piece, captured_piece)
 
         # if there are more captures available with the same piece, then don't flip player_to_move
-        is_multi_capture = is_capture and _captures_available(new_pos, player_to_move, to_square)
+        is_multi_capture = is_capture and _captures_available(pos, player_to_move, to_square)
         new_player_to_move = player_to_move if is_multi_capture else player_to_move.other_player()
 
-        return DraughtsBoard(new_pos, new_player_to_move, move)
+        key ^= side_key(player_to_move) ^ side_key(new_player_to_move)
+        if is_multi_capture:
+            key ^= flag_key(('capturing', to_square))
+
+        return new_player_to_move, key, material, piece_counts, (moving_piece, empty_square, captured_piece)
+
+    def make_move(self, move):
+        """
+        Return a new board with the move played.
+        """
+        new_pos = self.position.copy()
+        new_player_to_move, key, material, piece_counts, _ = self._play(new_pos, move)
+
+        return DraughtsBoard(new_pos, new_player_to_move, move, key, material, piece_counts)
+
+    def push(self, move):
+        """
+        Play move on this board, in place. pop() takes it back.
+        """
+        new_player_to_move, key, material, piece_counts, undo = self._play(self.position, move)
+        self._undo_stack().append((move, undo, self.player_to_move, self.key, self.previous_move, self.material,
+                                   self.piece_counts))
+        self.player_to_move = new_player_to_move
+        self.key = key
+        self.material = material
+        self.piece_counts = piece_counts
+        self.previous_move = move
+
+    def pop(self):
+        """
+        Take back the last move played with push.
+        """
+        move, undo, self.player_to_move, self.key, self.previous_move, self.material, self.piece_counts = \
+            self._undo_stack().pop()
+        from_square, to_square = move
+        moving_piece, empty_square, captured_piece = undo
+        pos = self.position
+
+        pos[from_square] = moving_piece
+        pos[to_square] = DraughtsPiece['E']
+        if empty_square is not None:
+            pos[empty_square] = captured_piece
+
+    def captured_piece(self, move):
+        if not self._move_is_capture(move):
+            return None
+        from_square, to_square = move
+        return self.position[((to_square[0] + from_square[0])//2, (to_square[1] + from_square[1])//2)]
 
     def _move_is_capture(self, move):
         from_square, to_square = move
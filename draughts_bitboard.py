@@ -0,0 +1,293 @@
+from base import Player
+from draughts import DraughtsBoard, DraughtsPiece, _initial_position
+from zobrist import piece_key, side_key, flag_key
+
+# Only the 32 dark squares are used. Dark square (row, col) is bit row*4 + col//2 of a bitboard, so on even rows
+# bit 4k is column 2k+1 and on odd rows it is column 2k.
+SQUARES = [(i // 4, 2 * (i % 4) + (i // 4 + 1) % 2) for i in range(32)]
+INDEX = {square: i for i, square in enumerate(SQUARES)}
+FULL = (1 << 32) - 1
+
+EVEN_ROWS = sum(0xF << (4 * row) for row in range(0, 8, 2))
+ODD_ROWS = FULL ^ EVEN_ROWS
+# squares with nothing to their right / left: column 7 of even rows, column 0 of odd rows
+RIGHT_EDGE = sum(1 << (4 * row + 3) for row in range(0, 8, 2))
+LEFT_EDGE = sum(1 << (4 * row) for row in range(1, 8, 2))
+
+UP_RIGHT, UP_LEFT, DOWN_RIGHT, DOWN_LEFT = (1, 1), (1, -1), (-1, 1), (-1, -1)
+FORWARD = {Player['W']: [UP_RIGHT, UP_LEFT], Player['B']: [DOWN_LEFT, DOWN_RIGHT]}
+ALL_DIRECTIONS = [UP_RIGHT, UP_LEFT, DOWN_RIGHT, DOWN_LEFT]
+
+
+def _shift(bb, direction):
+    """The squares one diagonal step in direction from the squares of bb (steps off the board are dropped)."""
+    if direction == UP_RIGHT:
+        return ((bb & EVEN_ROWS & ~RIGHT_EDGE) << 5 | (bb & ODD_ROWS) << 4) & FULL
+    if direction == UP_LEFT:
+        return ((bb & EVEN_ROWS) << 4 | (bb & ODD_ROWS & ~LEFT_EDGE) << 3) & FULL
+    if direction == DOWN_RIGHT:
+        return (bb & EVEN_ROWS & ~RIGHT_EDGE) >> 3 | (bb & ODD_ROWS) >> 4
+    return (bb & EVEN_ROWS) >> 4 | (bb & ODD_ROWS & ~LEFT_EDGE) >> 5
+
+
+def _step_table(direction):
+    """For each square, the square one step in direction, or None."""
+    table = []
+    for row, col in SQUARES:
+        table.append(INDEX.get((row + direction[0], col + direction[1])))
+    return table
+
+
+STEP = {direction: _step_table(direction) for direction in ALL_DIRECTIONS}
+BACK = {direction: STEP[(-direction[0], -direction[1])] for direction in ALL_DIRECTIONS}
+
+
+def _bits(bb):
+    """Yields the index of each set bit of bb."""
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def _position_to_bitboards(position):
+    white = black = kings = 0
+    for square, piece in position.items():
+        if piece.owner is None:
+            continue
+        bit = 1 << INDEX[square]
+        if piece.owner == Player['W']:
+            white |= bit
+        else:
+            black |= bit
+        if piece.promotes_to_name is None:
+            kings |= bit
+    return white, black, kings
+
+
+def _hops(white, black, kings, player, pieces=None):
+    """
+    The one-hop moves of player as (from, to) bit indices: the captures if there are any, otherwise the simple moves.
+    pieces restricts the moves to those squares. Returns (moves, are_captures).
+    """
+    mine, theirs = (white, black) if player == Player['W'] else (black, white)
+    if pieces is not None:
+        mine &= pieces
+    empty = FULL ^ (white | black)
+    my_kings = mine & kings
+    men = mine ^ my_kings
+    forward = FORWARD[player]
+
+    captures = []
+    for direction in ALL_DIRECTIONS:
+        movers = my_kings | men if direction in forward else my_kings
+        back = BACK[direction]
+        for to in _bits(_shift(_shift(movers, direction) & theirs, direction) & empty):
+            captures.append((back[back[to]], to))
+    if captures:
+        return captures, True
+
+    moves = []
+    for direction in ALL_DIRECTIONS:
+        movers = my_kings | men if direction in forward else my_kings
+        back = BACK[direction]
+        for to in _bits(_shift(movers, direction) & empty):
+            moves.append((back[to], to))
+    return moves, False
+
+
+class BitboardDraughtsBoard(DraughtsBoard):
+    """
+    DraughtsBoard backed by three 32-bit bitboards (white pieces, black pieces, kings) of the dark squares, with moves
+    generated by shifting and masking whole bitboards.
+    By default a move is a single hop ((row, col), (row, col)) with the same rules as DraughtsBoard, as the web
+    client expects. With multi_jump=True, legal_moves instead returns whole capture sequences as single moves: a
+    tuple of every square the piece lands on, starting from the one it leaves. push and make_move accept either.
+    """
+
+    def __init__(self, position=None, player_to_move=Player['W'], previous_move="none", key=None, material=None,
+                 piece_counts=None, bitboards=None, capturing=None, multi_jump=False):
+        from_position = bitboards is None
+        if from_position:
+            bitboards = _position_to_bitboards(position if position is not None else _initial_position())
+        self.white, self.black, self.kings = bitboards
+        self.player_to_move = player_to_move
+        self.previous_move = previous_move
+        self.multi_jump = multi_jump
+        if from_position:
+            # e.g. from the web client, in which case previous_move is a single hop
+            square = DraughtsBoard._capturing_piece(self)
+            capturing = INDEX[square] if square is not None else None
+        self.capturing = capturing
+        self.key = key if key is not None else self._compute_key()
+        if material is None:
+            material, piece_counts = self._compute_material()
+        self.material = material
+        self.piece_counts = piece_counts
+
+    def _piece(self, sq):
+        bit = 1 << sq
+        if (self.white | self.black) & bit == 0:
+            return DraughtsPiece['E']
+        name = 'W' if self.white & bit else 'B'
+        return DraughtsPiece[name + 'K' if self.kings & bit else name]
+
+    @property
+    def position(self):
+        pos = {(i, j): DraughtsPiece['E'] for i in range(8) for j in range(8)}
+        for sq in _bits(self.white | self.black):
+            pos[SQUARES[sq]] = self._piece(sq)
+        return pos
+
+    def piece_at(self, square):
+        sq = INDEX.get(square)
+        return self._piece(sq) if sq is not None else DraughtsPiece['E']
+
+    def _capturing_piece(self):
+        return SQUARES[self.capturing] if self.capturing is not None else None
+
+    def _compute_material(self):
+        white_kings = (self.white & self.kings).bit_count()
+        black_kings = (self.black & self.kings).bit_count()
+        piece_counts = {Player['W']: self.white.bit_count(), Player['B']: self.black.bit_count()}
+        material = piece_counts[Player['W']] + white_kings - piece_counts[Player['B']] - black_kings
+        return material, piece_counts
+
+    def legal_moves(self):
+        pieces = 1 << self.capturing if self.capturing is not None else None
+        hops, are_captures = _hops(self.white, self.black, self.kings, self.player_to_move, pieces)
+        if self.multi_jump and are_captures:
+            return [tuple(SQUARES[sq] for sq in path) for path in self._jump_sequences(hops)]
+        return [(SQUARES[from_sq], SQUARES[to_sq]) for from_sq, to_sq in hops]
+
+    def _jump_sequences(self, hops):
+        """Every complete capture sequence (as bit indices) starting with one of the capture hops."""
+        player = self.player_to_move
+        sequences = []
+
+        def extend(path, white, black, kings):
+            (white, black, kings), _, _, _ = self._hop(white, black, kings, path[-2], path[-1])
+            more, are_captures = _hops(white, black, kings, player, 1 << path[-1])
+            if not are_captures:
+                sequences.append(tuple(path))
+                return
+            for _, to in more:
+                extend(path + [to], white, black, kings)
+
+        for from_sq, to_sq in hops:
+            extend([from_sq, to_sq], self.white, self.black, self.kings)
+        return sequences
+
+    def _hop(self, white, black, kings, from_sq, to_sq):
+        """
+        Plays one hop on the bitboards.
+        Returns the new bitboards, the moving piece, the piece it lands as and the captured (square, piece) or None.
+        """
+        from_bit = 1 << from_sq
+        to_bit = 1 << to_sq
+        is_white = white & from_bit != 0
+        is_king = kings & from_bit != 0
+        moving_piece = DraughtsPiece[('W' if is_white else 'B') + ('K' if is_king else '')]
+
+        if is_white:
+            white ^= from_bit | to_bit
+        else:
+            black ^= from_bit | to_bit
+        if is_king:
+            kings ^= from_bit | to_bit
+
+        landing_piece = moving_piece
+        if not is_king and SQUARES[to_sq][0] == moving_piece.promotion_rank:
+            landing_piece = moving_piece.promotes_to()
+            kings |= to_bit
+
+        captured = None
+        from_row, from_col = SQUARES[from_sq]
+        to_row, to_col = SQUARES[to_sq]
+        if abs(to_row - from_row) == 2:
+            over = INDEX[((from_row + to_row)//2, (from_col + to_col)//2)]
+            over_bit = 1 << over
+            captured_piece = DraughtsPiece[('B' if is_white else 'W') + ('K' if kings & over_bit else '')]
+            captured = (over, captured_piece)
+            white &= ~over_bit
+            black &= ~over_bit
+            kings &= ~over_bit
+
+        return (white, black, kings), moving_piece, landing_piece, captured
+
+    def _play(self, move):
+        """
+        Plays move, a path of squares, on the bitboards.
+        Returns the new bitboards, player to move, capturing square, key, material and piece counts.
+        """
+        player_to_move = self.player_to_move
+        white, black, kings = self.white, self.black, self.kings
+        key = self.key
+        material = self.material
+        piece_counts = self.piece_counts
+        if self.capturing is not None:
+            key ^= flag_key(('capturing', SQUARES[self.capturing]))
+
+        path = [INDEX[square] for square in move]
+        captured = None
+        for from_sq, to_sq in zip(path, path[1:]):
+            (white, black, kings), moving_piece, landing_piece, captured = self._hop(white, black, kings, from_sq,
+                                                                                     to_sq)
+            key ^= piece_key(SQUARES[from_sq], moving_piece) ^ piece_key(SQUARES[to_sq], landing_piece)
+            material += player_to_move.top_score * (landing_piece.gvalue - moving_piece.gvalue)
+            if captured is not None:
+                over, captured_piece = captured
+                key ^= piece_key(SQUARES[over], captured_piece)
+                material -= captured_piece.owner.top_score * captured_piece.gvalue
+                piece_counts = piece_counts.copy()
+                piece_counts[captured_piece.owner] -= 1
+
+        # if there are more captures available with the same piece, then don't flip player_to_move
+        capturing = None
+        if captured is not None and _hops(white, black, kings, player_to_move, 1 << path[-1])[1]:
+            capturing = path[-1]
+        new_player_to_move = player_to_move if capturing is not None else player_to_move.other_player()
+
+        key ^= side_key(player_to_move) ^ side_key(new_player_to_move)
+        if capturing is not None:
+            key ^= flag_key(('capturing', SQUARES[capturing]))
+
+        return (white, black, kings), new_player_to_move, capturing, key, material, piece_counts
+
+    def make_move(self, move):
+        """
+        Return a new board with the move played.
+        """
+        bitboards, player_to_move, capturing, key, material, piece_counts = self._play(move)
+        return BitboardDraughtsBoard(player_to_move=player_to_move, previous_move=move, key=key, material=material,
+                                     piece_counts=piece_counts, bitboards=bitboards, capturing=capturing,
+                                     multi_jump=self.multi_jump)
+
+    def push(self, move):
+        """
+        Play move on this board, in place. pop() takes it back.
+        """
+        bitboards, player_to_move, capturing, key, material, piece_counts = self._play(move)
+        self._undo_stack().append((self.white, self.black, self.kings, self.player_to_move, self.capturing, self.key,
+                                   self.previous_move, self.material, self.piece_counts))
+        self.white, self.black, self.kings = bitboards
+        self.player_to_move = player_to_move
+        self.capturing = capturing
+        self.key = key
+        self.previous_move = move
+        self.material = material
+        self.piece_counts = piece_counts
+
+    def pop(self):
+        """
+        Take back the last move played with push.
+        """
+        (self.white, self.black, self.kings, self.player_to_move, self.capturing, self.key, self.previous_move,
+         self.material, self.piece_counts) = self._undo_stack().pop()
+
+    def captured_piece(self, move):
+        """The first piece captured by move, or None."""
+        if not self._move_is_capture(move[:2]):
+            return None
+        (from_row, from_col), (to_row, to_col) = move[:2]
+        return self.piece_at(((from_row + to_row)//2, (from_col + to_col)//2))
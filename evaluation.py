@@ -0,0 +1,228 @@
+from base import Player
+from chess import ChessBoard, ChessPiece
+from draughts import DraughtsBoard, DraughtsPiece
+import numpy as np
+
+# Positions are encoded as 64 int8 codes, square (row, col) at index row*8 + col.
+# Empty squares are 0, white pieces positive and black pieces negative.
+CHESS_CODES = {'E': 0, 'WP': 1, 'WN': 2, 'WB': 3, 'WR': 4, 'WQ': 5, 'WK': 6,
+               'BP': -1, 'BN': -2, 'BB': -3, 'BR': -4, 'BQ': -5, 'BK': -6}
+DRAUGHTS_CODES = {'E': 0, 'W': 1, 'WK': 2, 'B': -1, 'BK': -2}
+
+SQUARES = np.arange(64)
+# the (row, col) square of each table column, row * 8 + col
+SQUARE_TUPLES = [divmod(i, 8) for i in SQUARES.tolist()]
+
+# Piece-square tables in pawns, from white's point of view with row 0 (rank 1) first.
+# Black uses the same tables mirrored top to bottom.
+CHESS_PST = {
+    'P': [[0, 0, 0, 0, 0, 0, 0, 0],
+          [.05, .1, .1, -.2, -.2, .1, .1, .05],
+          [.05, -.05, -.1, 0, 0, -.1, -.05, .05],
+          [0, 0, 0, .2, .2, 0, 0, 0],
+          [.05, .05, .1, .25, .25, .1, .05, .05],
+          [.1, .1, .2, .3, .3, .2, .1, .1],
+          [.5, .5, .5, .5, .5, .5, .5, .5],
+          [0, 0, 0, 0, 0, 0, 0, 0]],
+    'N': [[-.5, -.4, -.3, -.3, -.3, -.3, -.4, -.5],
+          [-.4, -.2, 0, .05, .05, 0, -.2, -.4],
+          [-.3, .05, .1, .15, .15, .1, .05, -.3],
+          [-.3, 0, .15, .2, .2, .15, 0, -.3],
+          [-.3, .05, .15, .2, .2, .15, .05, -.3],
+          [-.3, 0, .1, .15, .15, .1, 0, -.3],
+          [-.4, -.2, 0, 0, 0, 0, -.2, -.4],
+          [-.5, -.4, -.3, -.3, -.3, -.3, -.4, -.5]],
+    'B': [[-.2, -.1, -.1, -.1, -.1, -.1, -.1, -.2],
+          [-.1, .05, 0, 0, 0, 0, .05, -.1],
+          [-.1, .1, .1, .1, .1, .1, .1, -.1],
+          [-.1, 0, .1, .1, .1, .1, 0, -.1],
+          [-.1, .05, .05, .1, .1, .05, .05, -.1],
+          [-.1, 0, .05, .1, .1, .05, 0, -.1],
+          [-.1, 0, 0, 0, 0, 0, 0, -.1],
+          [-.2, -.1, -.1, -.1, -.1, -.1, -.1, -.2]],
+    'R': [[0, 0, 0, .05, .05, 0, 0, 0],
+          [-.05, 0, 0, 0, 0, 0, 0, -.05],
+          [-.05, 0, 0, 0, 0, 0, 0, -.05],
+          [-.05, 0, 0, 0, 0, 0, 0, -.05],
+          [-.05, 0, 0, 0, 0, 0, 0, -.05],
+          [-.05, 0, 0, 0, 0, 0, 0, -.05],
+          [.05, .1, .1, .1, .1, .1, .1, .05],
+          [0, 0, 0, 0, 0, 0, 0, 0]],
+    'Q': [[-.2, -.1, -.1, -.05, -.05, -.1, -.1, -.2],
+          [-.1, 0, .05, 0, 0, 0, 0, -.1],
+          [-.1, .05, .05, .05, .05, .05, 0, -.1],
+          [0, 0, .05, .05, .05, .05, 0, -.05],
+          [-.05, 0, .05, .05, .05, .05, 0, -.05],
+          [-.1, 0, .05, .05, .05, .05, 0, -.1],
+          [-.1, 0, 0, 0, 0, 0, 0, -.1],
+          [-.2, -.1, -.1, -.05, -.05, -.1, -.1, -.2]],
+    'K': [[.2, .3, .1, 0, 0, .1, .3, .2],
+          [.2, .2, 0, 0, 0, 0, .2, .2],
+          [-.1, -.2, -.2, -.2, -.2, -.2, -.2, -.1],
+          [-.2, -.3, -.3, -.4, -.4, -.3, -.3, -.2],
+          [-.3, -.4, -.4, -.5, -.5, -.4, -.4, -.3],
+          [-.3, -.4, -.4, -.5, -.5, -.4, -.4, -.3],
+          [-.3, -.4, -.4, -.5, -.5, -.4, -.4, -.3],
+          [-.3, -.4, -.4, -.5, -.5, -.4, -.4, -.3]],
+}
+
+# Draughts men are worth more the further they have advanced, and a man left on the back row guards against kings.
+DRAUGHTS_PST = {
+    'W': [[.1] * 8, [0] * 8, [.02] * 8, [.05] * 8, [.1] * 8, [.15] * 8, [.25] * 8, [0] * 8],
+    'WK': [[-.1, -.05, -.05, -.05, -.05, -.05, -.05, -.1],
+           [-.05, 0, 0, 0, 0, 0, 0, -.05],
+           [-.05, 0, .05, .05, .05, .05, 0, -.05],
+           [-.05, 0, .05, .1, .1, .05, 0, -.05],
+           [-.05, 0, .05, .1, .1, .05, 0, -.05],
+           [-.05, 0, .05, .05, .05, .05, 0, -.05],
+           [-.05, 0, 0, 0, 0, 0, 0, -.05],
+           [-.1, -.05, -.05, -.05, -.05, -.05, -.05, -.1]],
+}
+
+
+def _table(codes, values, pst, scale=1.0):
+    """
+    Builds the (2*max_code+1, 64) array of the value of each piece code on each square, which includes the piece's
+    material value. pst maps a white piece's name (without the colour for chess) to its 8x8 table.
+    """
+    max_code = max(codes.values())
+    table = np.zeros((2 * max_code + 1, 64))
+    for name, code in codes.items():
+        if code <= 0:
+            continue
+        key = name if name in pst else name[1:]
+        white = np.array(pst.get(key, np.zeros((8, 8))), dtype=float).reshape(64)
+        black = np.array(pst.get(key, np.zeros((8, 8))), dtype=float)[::-1].reshape(64)
+        table[max_code + code] = values[name] + scale * white
+        table[max_code - code] = -(values[name] + scale * black)
+    return table
+
+
+def _shield_masks(direction):
+    """For each king square, the three squares in front of it (towards the opponent) where pawns protect it."""
+    masks = np.zeros((64, 64), dtype=bool)
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        if 0 <= row + direction < 8:
+            for c in (col - 1, col, col + 1):
+                if 0 <= c < 8:
+                    masks[sq, (row + direction) * 8 + c] = True
+    return masks
+
+
+class Evaluator:
+    """
+    Evaluation from a table of piece values on each square, scored for many positions at once with numpy.
+    Scores are positive/negative if white/black has an advantage, like Board.evaluation.
+    """
+
+    codes = None
+
+    def __init__(self, table):
+        self.table = table
+        self.offset = max(self.codes.values())
+
+    def encode(self, board):
+        """The position as 64 int8 piece codes, in the order of the tables' squares (not of the position dict)."""
+        codes = self.codes
+        position = board.position
+        return np.fromiter((codes[position[square].name] for square in SQUARE_TUPLES), dtype=np.int8, count=64)
+
+    def encode_batch(self, boards):
+        """The positions as an (N, 64) int8 array."""
+        encoded = np.empty((len(boards), 64), dtype=np.int8)
+        for i, board in enumerate(boards):
+            encoded[i] = self.encode(board)
+        return encoded
+
+    def score_encoded(self, encoded):
+        """Vectorized scores of an (N, 64) array of encoded positions."""
+        return self.table[encoded.astype(np.intp) + self.offset, SQUARES].sum(axis=1)
+
+    def extra(self, board):
+        """Terms that need more than the encoded position. They aren't vectorized, so subclasses only use them if tuned to."""
+        return 0.0
+
+    def evaluate_batch(self, boards):
+        """Scores a list of boards in one vectorized pass."""
+        scores = self.score_encoded(self.encode_batch(boards))
+        for i, board in enumerate(boards):
+            scores[i] += self.extra(board)
+        return scores
+
+    def evaluate(self, board):
+        return self.evaluate_batch([board])[0]
+
+
+class ChessEvaluator(Evaluator):
+    """
+    Material (ChessPiece.gvalue), piece-square tables, pawns sheltering the king and (optionally) mobility.
+    pst_scale, shield_weight and mobility_weight are in pawns and can be tuned.
+    """
+
+    codes = CHESS_CODES
+
+    def __init__(self, pst_scale=1.0, shield_weight=0.1, mobility_weight=0.0):
+        values = {piece.name: piece.gvalue for piece in ChessPiece if piece.name != 'E'}
+        super().__init__(_table(CHESS_CODES, values, CHESS_PST, pst_scale))
+        self.shield_weight = shield_weight
+        self.mobility_weight = mobility_weight
+        self.shields = {Player['W']: _shield_masks(1), Player['B']: _shield_masks(-1)}
+
+    def encode(self, board):
+        bitboards = getattr(board, 'bitboards', None)
+        if bitboards is None:
+            return super().encode(board)
+        # BitboardChessBoard: no need to build the position dict
+        from bitboard import PIECES, _bits
+        encoded = np.zeros(64, dtype=np.int8)
+        for piece, bb in zip(PIECES, bitboards):
+            if bb:
+                encoded[list(_bits(bb))] = CHESS_CODES[piece.name]
+        return encoded
+
+    def score_encoded(self, encoded):
+        scores = super().score_encoded(encoded)
+        if self.shield_weight:
+            for player, king, pawn in [(Player['W'], 6, 1), (Player['B'], -6, -1)]:
+                king_squares = (encoded == king).argmax(axis=1)
+                shield = self.shields[player][king_squares] & (encoded == pawn)
+                scores += player.top_score * self.shield_weight * shield.sum(axis=1)
+        return scores
+
+    def extra(self, board):
+        if not self.mobility_weight:
+            return 0.0
+        mobility = len(board._moves(Player['W'])) - len(board._moves(Player['B']))
+        return self.mobility_weight * mobility
+
+
+class DraughtsEvaluator(Evaluator):
+    """Material (men 1, kings 2) and advancement of men / centralisation of kings. pst_scale can be tuned."""
+
+    codes = DRAUGHTS_CODES
+
+    def __init__(self, pst_scale=1.0):
+        values = {piece.name: piece.gvalue for piece in DraughtsPiece if piece.name != 'E'}
+        pst = dict(DRAUGHTS_PST)
+        pst['B'] = pst['W']
+        pst['BK'] = pst['WK']
+        super().__init__(_table(DRAUGHTS_CODES, values, pst, pst_scale))
+
+
+def evaluator_for(board):
+    """The default evaluator for the type of board."""
+    if isinstance(board, ChessBoard):
+        return ChessEvaluator()
+    if isinstance(board, DraughtsBoard):
+        return DraughtsEvaluator()
+    raise ValueError(f"no evaluator for {type(board).__name__}")
+
+
+def evaluate_batch(boards, evaluator=None):
+    """Scores boards (all of the same game) in one vectorized pass."""
+    if len(boards) == 0:
+        return np.zeros(0)
+    if evaluator is None:
+        evaluator = evaluator_for(boards[0])
+    return evaluator.evaluate_batch(boards)
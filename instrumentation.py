@@ -0,0 +1,134 @@
+from collections import defaultdict
+import threading
+import time
+
+
+class SearchProfile:
+    """
+    Detailed counters for searches, collected only when asked for with SearchStats(profile=True), so searches
+    without it don't pay for the timing.
+    Times are in seconds and include everything the timed function calls. Move generation (legal_moves_seconds)
+    includes iter_moves, of which only the moves the search took were generated. make_move counts the moves played
+    in place by the search (push, and the pop that takes them back).
+    """
+
+    def __init__(self):
+        self.searches = 0
+        self.search_seconds = 0.0
+        self.nodes = 0
+        self.movegen_calls = 0
+        self.moves_generated = 0
+        self.legal_moves_seconds = 0.0
+        self.make_move_calls = 0
+        self.make_move_seconds = 0.0
+        self.leaf_evaluations = 0
+        self.evaluation_seconds = 0.0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        # set while iter_moves is producing a move, so the legal_moves it calls isn't counted again
+        self.generating = False
+        # nodes that had moves, and how many of their moves were searched (up to a cutoff), by ply from the root
+        self.ply_nodes = defaultdict(int)
+        self.ply_moves = defaultdict(int)
+        self.lock = threading.Lock()
+
+    def expanded(self, ply, num_moves):
+        self.ply_nodes[ply] += 1
+        self.ply_moves[ply] += num_moves
+
+    def branching(self):
+        """
+        The average number of moves searched at the nodes of each ply, as a dict. Cutoffs make this lower than the
+        number of legal moves: it's the effective branching factor.
+        """
+        return {ply: self.ply_moves[ply] / nodes for ply, nodes in sorted(self.ply_nodes.items())}
+
+    def tt_hit_rate(self):
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+
+    def merge(self, other):
+        """Adds the counts of another profile to this one, e.g. to total the searches made by a server."""
+        with self.lock:
+            for name, value in vars(other).items():
+                if type(value) in (int, float):
+                    setattr(self, name, getattr(self, name) + value)
+            for ply, nodes in other.ply_nodes.items():
+                self.ply_nodes[ply] += nodes
+                self.ply_moves[ply] += other.ply_moves[ply]
+
+    def to_dict(self):
+        ret = {name: value for name, value in vars(self).items() if type(value) in (int, float)}
+        ret['tt_hit_rate'] = self.tt_hit_rate()
+        ret['branching'] = self.branching()
+        return ret
+
+
+def profiled_board(board, profile):
+    """
+    Makes board record the calls to its legal_moves, push and pop in profile. The search calls this on its own copy
+    of the board, by changing its class to a subclass with timed methods.
+    """
+    board_type = type(board)
+
+    class Profiled(board_type):
+
+        def legal_moves(self):
+            if profile.generating:
+                return board_type.legal_moves(self)
+            start = time.perf_counter()
+            moves = board_type.legal_moves(self)
+            profile.legal_moves_seconds += time.perf_counter() - start
+            profile.movegen_calls += 1
+            profile.moves_generated += len(moves)
+            return moves
+
+        def iter_moves(self, hint=None):
+            # only the time spent producing each move is counted, not the search between them
+            moves = board_type.iter_moves(self, hint)
+            profile.movegen_calls += 1
+            while True:
+                start = time.perf_counter()
+                profile.generating = True
+                try:
+                    move = next(moves, None)
+                finally:
+                    profile.generating = False
+                    profile.legal_moves_seconds += time.perf_counter() - start
+                if move is None:
+                    return
+                profile.moves_generated += 1
+                yield move
+
+        def push(self, move):
+            start = time.perf_counter()
+            board_type.push(self, move)
+            profile.make_move_seconds += time.perf_counter() - start
+            profile.make_move_calls += 1
+
+        def pop(self):
+            start = time.perf_counter()
+            board_type.pop(self)
+            profile.make_move_seconds += time.perf_counter() - start
+
+    Profiled.__name__ = board_type.__name__
+    board.__class__ = Profiled
+    return board
+
+
+def prometheus_text(metrics):
+    """
+    Formats metrics in the Prometheus text exposition format.
+    metrics is a list of (name, type, help, value), where value is a number, or a dict from labels (a tuple of
+    (label, value) pairs) to numbers.
+    """
+    lines = []
+    for name, metric_type, help_text, value in metrics:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        if isinstance(value, dict):
+            for labels, number in value.items():
+                label_text = ','.join(f'{key}="{label}"' for key, label in labels)
+                lines.append(f"{name}{{{label_text}}} {number}")
+        else:
+            lines.append(f"{name} {value}")
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,138 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import threading
+import time
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+CANCELLED = 'cancelled'
+FAILED = 'failed'
+
+
+class JobQueueFull(Exception):
+    """Raised by JobQueue.submit when as many jobs as it allows are already queued or running."""
+
+
+class Job:
+    """
+    A task run by a JobQueue. task is called with a threading.Event that is set when the job is cancelled or its
+    time limit passes, and the job's time limit in milliseconds; it should return early when the event is set.
+    """
+
+    def __init__(self, job_id, task, time_ms):
+        self.id = job_id
+        self.task = task
+        self.time_ms = time_ms
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.stop = threading.Event()
+        self.done = threading.Event()
+
+    def wait(self, timeout=None):
+        """Waits until the job is finished (or timeout seconds pass) and returns whether it is."""
+        return self.done.wait(timeout)
+
+    def to_dict(self):
+        return {'id': self.id, 'status': self.status, 'result': self.result, 'error': self.error,
+                'submitted': self.submitted, 'started': self.started, 'finished': self.finished}
+
+
+class JobQueue:
+    """
+    Runs jobs on a fixed number of worker threads, so slow jobs don't hold up whoever submitted them.
+    At most max_pending jobs can be queued or running at once; submitting more raises JobQueueFull, so a busy
+    server turns requests away instead of building an ever longer queue. Every job has a time limit of at most
+    max_time_ms. The last max_finished finished jobs are kept so their results can be collected.
+    """
+
+    def __init__(self, workers=2, max_pending=32, max_time_ms=10000, max_finished=1000):
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.max_pending = max_pending
+        self.max_time_ms = max_time_ms
+        self.max_finished = max_finished
+        self.jobs = OrderedDict()
+        self.pending = 0
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def submit(self, task, time_ms=None):
+        """Queues task (see Job) with a time limit of time_ms (max_time_ms at most). Returns the Job."""
+        time_ms = self.max_time_ms if time_ms is None else min(time_ms, self.max_time_ms)
+        with self.lock:
+            if self.pending >= self.max_pending:
+                raise JobQueueFull(f"{self.pending} jobs are already waiting")
+            job = Job(str(next(self._ids)), task, time_ms)
+            self.jobs[job.id] = job
+            self.pending += 1
+        self.executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id):
+        """The Job with job_id, or None if there isn't one (any more)."""
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """
+        Cancels a job. A queued job won't be run; a running one is asked to stop, and its result is discarded.
+        Returns the job, or None if there isn't one.
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is not None and job.status in (QUEUED, RUNNING):
+                job.status = CANCELLED
+                job.stop.set()
+        return job
+
+    def _run(self, job):
+        try:
+            # the status is only changed under the lock, so a job cancelled meanwhile stays cancelled
+            with self.lock:
+                if job.status == CANCELLED:
+                    return
+                job.status = RUNNING
+                job.started = time.time()
+            # the task should notice the time limit itself; the timer makes sure stop is set anyway
+            timer = threading.Timer(job.time_ms / 1000, job.stop.set)
+            timer.start()
+            try:
+                result = job.task(job.stop, job.time_ms)
+            finally:
+                timer.cancel()
+            with self.lock:
+                if job.status != CANCELLED:
+                    job.result = result
+                    job.status = DONE
+        except Exception as e:
+            with self.lock:
+                job.error = repr(e)
+                job.status = FAILED
+        finally:
+            job.finished = time.time()
+            job.done.set()
+            self._finish()
+
+    def _finish(self):
+        with self.lock:
+            self.pending -= 1
+            finished = [job_id for job_id, job in self.jobs.items() if job.done.is_set()]
+            for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+                del self.jobs[job_id]
+
+    def stats(self):
+        with self.lock:
+            counts = {status: 0 for status in (QUEUED, RUNNING, DONE, CANCELLED, FAILED)}
+            for job in self.jobs.values():
+                counts[job.status] += 1
+            return {'pending': self.pending, 'max_pending': self.max_pending, 'jobs': counts}
+
+    def shutdown(self):
+        for job in list(self.jobs.values()):
+            job.stop.set()
+        self.executor.shutdown(wait=True)
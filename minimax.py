@@ -1,5 +1,51 @@
 from base import Player
+import copy
+from transposition import TranspositionTable, EXACT, LOWER, UPPER
+from ordering import MoveOrderer
+from instrumentation import SearchProfile, profiled_board
+from concurrent.futures import ProcessPoolExecutor
+import atexit
 import numpy as np
+import os
+import time
+
+
+# Score of a won game. It is bigger than any evaluation, so winning is always worth more than material.
+WIN_SCORE = 1000
+
+
+def result_score(winner):
+    """Score of a finished game: WIN_SCORE if white won, -WIN_SCORE if black won, 0 for a draw."""
+    return 0 if winner is None else winner.top_score * WIN_SCORE
+
+
+class SearchStats:
+    """
+    Counters collected while searching.
+    With profile=True, profile is a SearchProfile that also times move generation, moves and evaluation.
+    """
+
+    def __init__(self, profile=False):
+        self.nodes = 0
+        # deepest completed iteration of iterative_deepening
+        self.depth = None
+        # beta cutoffs, and how many of them came from the first move searched
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        # nodes searched by the quiescence search (also counted in nodes)
+        self.quiescence_nodes = 0
+        self.profile = SearchProfile() if profile else None
+
+    def first_move_cutoff_rate(self):
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def __str__(self):
+        return (f"nodes: {self.nodes} depth: {self.depth} "
+                f"first move cutoffs: {self.first_move_cutoff_rate():.1%} of {self.cutoffs}")
+
+
+class SearchAborted(Exception):
+    """Raised inside a search when its time or node budget runs out, or it is stopped."""
 
 
 def minimax(board, move, max_depth=None):
@@ -12,7 +58,7 @@ def minimax(board, move, max_depth=None):
 
     if winner is not None:
         assert(player_to_move == winner)
-        return winner.top_score
+        return result_score(winner)
 
     if max_depth == 0:
         return new_board.evaluation()
@@ -20,7 +66,7 @@ def minimax(board, move, max_depth=None):
     legal_moves = new_board.legal_moves()
 
     if len(legal_moves) == 0:
-        return(0)
+        return result_score(new_board.no_moves_winner())
 
     if max_depth:
         max_depth -= 1
@@ -35,17 +81,485 @@ def minimax(board, move, max_depth=None):
     return(ret)
 
 
-def best_move(board, max_depth=None):
+class AlphaBeta:
+    """
+    Negamax alpha-beta search.
+    If a TranspositionTable is given it is used for cutoffs and to try the best move from earlier searches first.
+    If a MoveOrderer is given moves are searched in its order, otherwise in the order legal_moves returns them.
+    If an Evaluator (see evaluation.py) is given it is used instead of board.evaluation(), and the children of nodes
+    one move from the depth limit are all scored at once with its vectorized evaluate.
+    If Tablebases (see tablebase.py) are given, positions with few enough pieces are looked up instead of searched.
+    """
+
+    # how many nodes are searched between checks of the clock and the stop event
+    check_interval = 64
+
+    # in delta pruning, captures that can't bring the score to within this margin of alpha are skipped
+    delta_margin = 2
+
+    def __init__(self, tt=None, stats=None, deadline=None, max_nodes=None, stop=None, orderer=None,
+                 quiescence=False, evaluator=None, tablebases=None):
+        """
+        deadline is a time.perf_counter() value, max_nodes a node count and stop a threading.Event.
+        When any of them is reached the search raises SearchAborted.
+        If quiescence is True, positions at the depth limit are searched further until there are no captures left,
+        instead of being evaluated in the middle of an exchange.
+        """
+        self.tt = tt
+        self.stats = stats if stats is not None else SearchStats()
+        self.deadline = deadline
+        self.max_nodes = max_nodes
+        self.stop = stop
+        self.orderer = orderer
+        self.quiescence = quiescence
+        self.evaluator = evaluator
+        self.tablebases = tablebases
+        self.limited = deadline is not None or max_nodes is not None or stop is not None
+        self.profile = self.stats.profile
+        if self.profile is not None:
+            self._evaluate = self._timed_evaluation(self._evaluate, lambda board: 1)
+            self._leaf_scores = self._timed_evaluation(self._leaf_scores, lambda board, moves: len(moves))
+
+    def _timed_evaluation(self, evaluate, count):
+        profile = self.profile
+
+        def timed(*args):
+            start = time.perf_counter()
+            ret = evaluate(*args)
+            profile.evaluation_seconds += time.perf_counter() - start
+            profile.leaf_evaluations += count(*args)
+            return ret
+        return timed
+
+    def _check_budget(self):
+        if self.max_nodes is not None and self.stats.nodes >= self.max_nodes:
+            raise SearchAborted("node budget exhausted")
+        if self.deadline is not None and time.perf_counter() >= self.deadline:
+            raise SearchAborted("time budget exhausted")
+        if self.stop is not None and self.stop.is_set():
+            raise SearchAborted("stopped")
+
+    def _evaluate(self, board):
+        if self.evaluator is None:
+            return board.evaluation()
+        return self.evaluator.evaluate(board)
+
+    def _probe(self, board):
+        """
+        The tablebase score of board from white's point of view, or None if it isn't in a tablebase.
+        Wins score less the longer the mate takes, so the search heads for the quickest one.
+        """
+        if self.tablebases is None or sum(board.piece_counts.values()) > self.tablebases.max_pieces:
+            return None
+        entry = self.tablebases.probe(board)
+        if entry is None:
+            return None
+        winner, distance, _ = entry
+        if winner is None:
+            return 0
+        return winner.top_score * (WIN_SCORE - distance)
+
+    def _leaf_scores(self, board, moves):
+        """
+        Scores of moves from the point of view of board.player_to_move, when the positions after them are at the depth
+        limit. The positions are encoded as they are played and then evaluated in one vectorized pass.
+        """
+        evaluator = self.evaluator
+        encoded = np.zeros((len(moves), 64), dtype=np.int8)
+        extra = np.zeros(len(moves))
+        winners = {}
+        for i, move in enumerate(moves):
+            board.push(move)
+            winner = board.winner()
+            score = self._probe(board) if winner is None else result_score(winner)
+            if score is not None:
+                winners[i] = score
+            else:
+                encoded[i] = evaluator.encode(board)
+                extra[i] = evaluator.extra(board)
+            board.pop()
+
+        scores = evaluator.score_encoded(encoded) + extra
+        for i, score in winners.items():
+            scores[i] = score
+
+        self.stats.nodes += len(moves)
+        if self.limited:
+            self._check_budget()
+        # the scores are the same whichever side is to move after the move, so there's no negamax sign flip
+        return scores * board.player_to_move.top_score
+
+    def _score_move(self, board, move, max_depth, alpha, beta, ply):
+        """
+        Score of move from the point of view of board.player_to_move. The move is pushed and popped in place.
+        In draughts the same player can move twice in a row (multi-captures), in which case the score is not negated.
+        """
+        player_to_move = board.player_to_move
+        board.push(move)
+        if board.player_to_move == player_to_move:
+            score = self.negamax(board, max_depth, alpha, beta, ply + 1)
+        else:
+            score = -self.negamax(board, max_depth, -beta, -alpha, ply + 1)
+        board.pop()
+        return score
+
+    def negamax(self, board, max_depth, alpha, beta, ply=0):
+        """
+        Alpha-beta search of board, which is ply moves from the root.
+        Returns a score from the point of view of board.player_to_move.
+        max_depth has the same meaning as in minimax: None searches to the end of the game.
+        """
+        if max_depth == 0 and self.quiescence:
+            return self.quiesce(board, alpha, beta, ply)
+
+        self.stats.nodes += 1
+        if self.limited and self.stats.nodes % self.check_interval == 0:
+            self._check_budget()
+        side = board.player_to_move.top_score
+
+        winner = board.winner()
+        if winner is not None:
+            return result_score(winner) * side
+
+        score = self._probe(board)
+        if score is not None:
+            return score * side
+
+        if max_depth == 0:
+            return self._evaluate(board) * side
+
+        tt = self.tt
+        depth = np.inf if max_depth is None else max_depth
+        hint = None
+        if tt is not None:
+            entry = tt.probe(board.key)
+            if entry is not None:
+                tt_depth, tt_score, flag, hint = entry
+                if tt_depth >= depth:
+                    if flag == EXACT:
+                        return tt_score
+                    if flag == LOWER and tt_score > alpha:
+                        alpha = tt_score
+                    if flag == UPPER and tt_score < beta:
+                        beta = tt_score
+                    if alpha >= beta:
+                        return tt_score
+
+        if max_depth:
+            max_depth -= 1
+
+        leaf_scores = None
+        if max_depth == 0 and self.evaluator is not None and not self.quiescence:
+            # every move is scored at once, so they are all generated up front
+            moves = board.legal_moves()
+            if self.orderer is not None:
+                moves = self.orderer.order(board, moves, ply, hint)
+            elif hint in moves:
+                moves.remove(hint)
+                moves.insert(0, hint)
+            leaf_scores = self._leaf_scores(board, moves)
+        else:
+            # moves are generated in stages as they are searched, so a cutoff saves generating the rest
+            moves = board.iter_moves(hint)
+            if self.orderer is not None:
+                moves = self.orderer.order_stages(board, moves, ply, hint)
+
+        alpha_orig = alpha
+        best = -np.inf
+        best_move = None
+        searched = 0
+        for i, move in enumerate(moves):
+            searched += 1
+            if leaf_scores is not None:
+                score = leaf_scores[i]
+            else:
+                score = self._score_move(board, move, max_depth, alpha, beta, ply)
+            if score > best:
+                best = score
+                best_move = move
+            if best > alpha:
+                alpha = best
+            if alpha >= beta:
+                self.stats.cutoffs += 1
+                if i == 0:
+                    self.stats.first_move_cutoffs += 1
+                if self.orderer is not None:
+                    self.orderer.cutoff(board, move, ply, 1 if depth == np.inf else depth)
+                break
+
+        if searched == 0:
+            return result_score(board.no_moves_winner()) * side
+        if self.profile is not None:
+            self.profile.expanded(ply, searched)
+
+        if tt is not None:
+            if best <= alpha_orig:
+                flag = UPPER
+            elif best >= beta:
+                flag = LOWER
+            else:
+                flag = EXACT
+            tt.store(board.key, depth, best, flag, best_move)
+
+        return best
+
+    def _quiesce_move(self, board, move, alpha, beta, ply):
+        player_to_move = board.player_to_move
+        board.push(move)
+        if board.player_to_move == player_to_move:
+            score = self.quiesce(board, alpha, beta, ply + 1)
+        else:
+            score = -self.quiesce(board, -beta, -alpha, ply + 1)
+        board.pop()
+        return score
+
+    def quiesce(self, board, alpha, beta, ply):
+        """
+        Searches only captures, so that positions are evaluated when they are quiet.
+        Returns a score from the point of view of board.player_to_move.
+        Normally the player to move can decline to capture, so the evaluation is a lower bound (stand pat), and
+        captures that can't raise the score to alpha even after winning the captured piece are skipped (delta
+        pruning). Where captures are forced (draughts) all of them are searched and there is no stand pat.
+        """
+        self.stats.nodes += 1
+        self.stats.quiescence_nodes += 1
+        if self.limited and self.stats.nodes % self.check_interval == 0:
+            self._check_budget()
+        side = board.player_to_move.top_score
+
+        winner = board.winner()
+        if winner is not None:
+            return result_score(winner) * side
+
+        score = self._probe(board)
+        if score is not None:
+            return score * side
+
+        # captures come first, so only one other move has to be generated to know there is one
+        captures = []
+        has_moves = False
+        for move in board.iter_moves():
+            has_moves = True
+            if board.captured_piece(move) is None:
+                break
+            captures.append(move)
+        if not has_moves:
+            return result_score(board.no_moves_winner()) * side
+
+        forced = board.captures_are_forced and len(captures) > 0
+
+        if forced:
+            best = -np.inf
+        else:
+            best = self._evaluate(board) * side
+            if best >= beta:
+                return best
+            if best > alpha:
+                alpha = best
+
+        if self.orderer is not None:
+            captures = self.orderer.order(board, captures, ply)
+
+        stand_pat = best
+        for move in captures:
+            if not forced and stand_pat + board.captured_piece(move).gvalue + self.delta_margin <= alpha:
+                continue
+            score = self._quiesce_move(board, move, alpha, beta, ply)
+            if score > best:
+                best = score
+            if best > alpha:
+                alpha = best
+            if alpha >= beta:
+                break
+
+        return best
+
+    def search(self, board, max_depth=None, first_move=None):
+        """
+        Returns (move, score) for the best move on the board, where score is positive/negative if white/black is
+        better.
+        Gives the same result as scoring every move with minimax, but prunes branches that cannot change it.
+        If first_move is given it is searched first, which only changes the result when moves have equal scores.
+        """
+        if self.tt is not None:
+            self.tt.new_search()
+
+        # the search plays moves in place, so work on a copy of the caller's board
+        board = copy.deepcopy(board)
+        if self.profile is None:
+            return self._search(board, max_depth, first_move)
+
+        profile = self.profile
+        board = profiled_board(board, profile)
+        start = time.perf_counter()
+        nodes = self.stats.nodes
+        tt_probes, tt_hits = (self.tt.probes, self.tt.hits) if self.tt is not None else (0, 0)
+        try:
+            return self._search(board, max_depth, first_move)
+        finally:
+            profile.search_seconds += time.perf_counter() - start
+            profile.nodes += self.stats.nodes - nodes
+            if self.tt is not None:
+                profile.tt_probes += self.tt.probes - tt_probes
+                profile.tt_hits += self.tt.hits - tt_hits
+
+    def _search(self, board, max_depth, first_move):
+        side = board.player_to_move.top_score
+        alpha = -np.inf
+        beta = np.inf
+        best = None
+
+        legal_moves = board.legal_moves()
+        if self.profile is not None:
+            self.profile.expanded(0, len(legal_moves))
+        if self.orderer is not None:
+            legal_moves = self.orderer.order(board, legal_moves, 0, first_move)
+        elif first_move in legal_moves:
+            legal_moves.remove(first_move)
+            legal_moves.insert(0, first_move)
+
+        for move in legal_moves:
+            score = self._score_move(board, move, max_depth, alpha, beta, 0)
+            # strict inequality keeps the first of equally good moves, as argmax does
+            if best is None or score > alpha:
+                best = move
+                alpha = score
+
+        return best, alpha * side
+
+
+def alphabeta(board, max_depth=None, stats=None, tt=None, orderer=None, quiescence=False, evaluator=None,
+              tablebases=None):
+    """
+    Returns (move, score) for the best move on the board, where score is positive/negative if white/black is better.
+    Without an orderer, quiescence search or evaluator, the result is exactly that of scoring every move with minimax.
+    """
+    if stats is not None and stats.profile is not None:
+        stats.profile.searches += 1
+    return AlphaBeta(tt, stats, orderer=orderer, quiescence=quiescence, evaluator=evaluator,
+                     tablebases=tablebases).search(board, max_depth)
+
+
+def best_move(board, max_depth=None, stats=None, tt=None, orderer=None, workers=None, book=None, time_ms=None,
+              stop=None, evaluator=None, tablebases=None):
     """
     Returns the best move on the board.
+    If workers is given the root moves are searched in that many processes (see parallel_search).
+    If time_ms or the threading.Event stop is given, the search is iterative_deepening, which returns the best move
+    found so far when the time runs out or stop is set; max_depth then defaults to 20.
+    Positions in the OpeningBook book, or solved by a precomputed table, are looked up instead of searched.
     """
+    move = book.move(board) if book is not None else None
+    if move is None:
+        move = board.solved_move()
+    if move is not None:
+        return move
+    if workers is not None:
+        move, _ = parallel_search(board, max_depth, workers, stats)
+    elif time_ms is not None or stop is not None:
+        move, _ = iterative_deepening(board, time_ms, max_depth=max_depth if max_depth is not None else 20,
+                                      stats=stats, tt=tt, stop=stop, orderer=orderer, evaluator=evaluator,
+                                      tablebases=tablebases)
+    else:
+        move, _ = alphabeta(board, max_depth, stats, tt, orderer, evaluator=evaluator, tablebases=tablebases)
+    return move
+
+
+# Each worker process keeps its own transposition table between calls.
+PARALLEL_TT_SIZE_MB = 16
+_worker_tt = None
+_pools = {}
+
+
+def _score_root_move(board, move, max_depth):
+    """
+    Runs in a worker process: the exact score of move from the point of view of board.player_to_move, and the
+    number of nodes searched.
+    """
+    global _worker_tt
+    if _worker_tt is None:
+        _worker_tt = TranspositionTable(PARALLEL_TT_SIZE_MB)
+    # cleared for every move, so that its node count doesn't depend on what the worker searched before
+    _worker_tt.clear()
+    search = AlphaBeta(_worker_tt, orderer=MoveOrderer())
+    score = search._score_move(board, move, max_depth, -np.inf, np.inf, 0)
+    return score, search.stats.nodes
+
+
+def _pool(workers):
+    """A process pool with the given number of workers, started on first use and then reused."""
+    if workers not in _pools:
+        _pools[workers] = ProcessPoolExecutor(max_workers=workers)
+    return _pools[workers]
+
+
+@atexit.register
+def _shutdown_pools():
+    for pool in _pools.values():
+        pool.shutdown(cancel_futures=True)
+
+
+def parallel_search(board, max_depth=None, workers=None, stats=None, executor=None):
+    """
+    Returns (move, score) like alphabeta, scoring each root move in a separate process.
+    Every root move gets an exact score (there is no alpha to share between processes) and the best is picked in
+    legal_moves order, so the result doesn't depend on which worker finishes first and matches alphabeta.
+    workers defaults to the number of CPUs; executor can be a ProcessPoolExecutor to use instead. (Not a thread
+    pool: each worker process has a transposition table of its own, which threads would share.)
+    """
+    if stats is None:
+        stats = SearchStats()
+    if executor is None:
+        executor = _pool(workers or os.cpu_count())
 
     legal_moves = board.legal_moves()
+    futures = [executor.submit(_score_root_move, board, move, max_depth) for move in legal_moves]
 
-    scores = np.array([minimax(board, move, max_depth) for move in legal_moves])
-    if board.player_to_move == Player['W']:
-        index = scores.argmax()
-    else:
-        index = scores.argmin()
+    best = None
+    best_score = -np.inf
+    for move, future in zip(legal_moves, futures):
+        score, nodes = future.result()
+        stats.nodes += nodes
+        if best is None or score > best_score:
+            best = move
+            best_score = score
+
+    return best, best_score * board.player_to_move.top_score
+
+
+def iterative_deepening(board, time_ms=None, max_nodes=None, max_depth=20, stats=None, tt=None, stop=None,
+                        orderer=None, quiescence=True, evaluator=None, tablebases=None):
+    """
+    Searches to depth 0, 1, 2, ... until the time budget (milliseconds), node budget or max_depth is reached, or the
+    threading.Event stop is set.
+    Returns (move, score) from the last iteration that completed; stats.depth records which depth that was.
+    The depth 0 iteration always completes so that there is a move to return.
+    Each iteration starts with the previous best move, and the transposition table (if given) carries the rest of
+    the previous iteration's results forward, as do the killer moves and history of the MoveOrderer.
+    evaluator and tablebases are passed on to AlphaBeta.
+    """
+    if stats is None:
+        stats = SearchStats()
+    if orderer is None:
+        orderer = MoveOrderer()
+    # a search is counted once however many iterations it takes
+    if stats.profile is not None:
+        stats.profile.searches += 1
+
+    start = time.perf_counter()
+    deadline = start + time_ms / 1000 if time_ms is not None else None
+
+    move, score = AlphaBeta(tt, stats, orderer=orderer, quiescence=quiescence, evaluator=evaluator,
+                            tablebases=tablebases).search(board, 0)
+    stats.depth = 0
+
+    search = AlphaBeta(tt, stats, deadline, max_nodes, stop, orderer, quiescence, evaluator, tablebases)
+    for depth in range(1, max_depth + 1):
+        try:
+            search._check_budget()
+            move, score = search.search(board, depth, first_move=move)
+        except SearchAborted:
+            break
+        stats.depth = depth
 
-    return legal_moves[index]
+    return move, score
@@ -0,0 +1,149 @@
+from base import Player
+from chess import ChessBoard
+import re
+
+# PGN movetext tokens: comments, variations, NAGs, results, move numbers, and moves
+_TOKENS = re.compile(r'\{[^}]*\}|;[^\n]*|\(|\)|\$\d+|1-0|0-1|1/2-1/2|\*|\d+\.+|[^\s(){};]+')
+_TAG = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+RESULTS = {'1-0', '0-1', '1/2-1/2', '*'}
+_SAN = re.compile(r'^([KQRBN])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([QRBN]))?$')
+
+
+def _square(name):
+    """The (row, col) square of a square name such as e4."""
+    return int(name[1]) - 1, ord(name[0]) - ord('a')
+
+
+def parse_san(board, san):
+    """
+    The move on board written san in standard algebraic notation, e.g. Nf3, exd5, O-O or e8=Q.
+    Raises ValueError if san isn't a legal move, or is one the boards don't implement (under-promotion).
+    """
+    text = san.rstrip('+#!?')
+    back_rank = 0 if board.player_to_move == Player['W'] else 7
+    if text in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        move = ((back_rank, 4), (back_rank, 6 if len(text) == 3 else 2))
+        if move not in board.legal_moves():
+            raise ValueError(f"illegal move {san}")
+        return move
+
+    match = _SAN.match(text)
+    if match is None:
+        raise ValueError(f"can't read move {san!r}")
+    piece, file, rank, to_name, promotion = match.groups()
+    if promotion is not None and promotion != 'Q':
+        raise ValueError(f"under-promotion isn't implemented: {san}")
+    piece = piece or 'P'
+    to_square = _square(to_name)
+
+    candidates = [move for move in board.legal_moves() if move[1] == to_square
+                  and board.piece_at(move[0]).name[1] == piece
+                  and (file is None or move[0][1] == ord(file) - ord('a'))
+                  and (rank is None or move[0][0] == int(rank) - 1)]
+    if len(candidates) != 1:
+        raise ValueError(f"{'ambiguous' if candidates else 'illegal'} move {san}")
+    return candidates[0]
+
+
+def read_epd(path, board_type=ChessBoard):
+    """
+    Reads an EPD file line by line, yielding (board, operations) for each position, where operations is a dict of
+    opcode to operand string, e.g. {'bm': 'Nf3', 'id': '"WAC.001"'} or {'D1': '20', 'D2': '400'} for perft suites.
+    A FEN with its move counters is also accepted as the start of a line.
+    """
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            fields = line.split(';')
+            head = fields[0].split()
+            operations = {}
+            extra = head[4:]
+            if len(extra) >= 2 and extra[0].isdigit() and extra[1].isdigit():
+                extra = extra[2:]
+            if extra:
+                operations[extra[0]] = ' '.join(extra[1:])
+            for field in fields[1:]:
+                parts = field.split(None, 1)
+                if parts:
+                    operations[parts[0]] = parts[1].strip() if len(parts) > 1 else ''
+            yield board_type.from_fen(' '.join(head[:4])), operations
+
+
+def read_pgn(path):
+    """
+    Reads a PGN file one game at a time, yielding (tags, moves): the tag pairs as a dict and the moves of the main
+    line in standard algebraic notation. Comments, variations and annotations are skipped.
+    """
+    with open(path) as f:
+        tags = {}
+        movetext = []
+        # a line starting with [ inside a { } comment is part of the comment, not a tag
+        open_comments = 0
+        for line in f:
+            stripped = line.strip()
+            if stripped.startswith('[') and open_comments == 0:
+                if movetext:
+                    yield tags, _moves('\n'.join(movetext))
+                    tags = {}
+                    movetext = []
+                match = _TAG.match(stripped)
+                if match:
+                    tags[match.group(1)] = match.group(2).replace('\\"', '"').replace('\\\\', '\\')
+            elif stripped and not stripped.startswith('%'):
+                movetext.append(stripped)
+                open_comments += stripped.count('{') - stripped.count('}')
+        if tags or movetext:
+            yield tags, _moves('\n'.join(movetext))
+
+
+def _moves(movetext):
+    moves = []
+    depth = 0
+    for token in _TOKENS.findall(movetext):
+        if token == '(':
+            depth += 1
+        elif token == ')':
+            depth -= 1
+        elif depth == 0 and token[0] not in '{;$' and token not in RESULTS and not token[0].isdigit():
+            moves.append(token)
+    return moves
+
+
+def _start(tags, board_type):
+    return board_type.from_fen(tags['FEN']) if 'FEN' in tags else board_type()
+
+
+def pgn_games(path, board_type=ChessBoard):
+    """
+    Reads a PGN file one game at a time, yielding (tags, moves) with the moves as ((row, col), (row, col)) pairs
+    that the boards play. A game that reaches a move the boards can't play (en passant, under-promotion) stops
+    there, with 'Truncated' set in its tags. Games starting from a FEN tag are set up from it.
+    """
+    for tags, sans in read_pgn(path):
+        board = _start(tags, board_type)
+        moves = []
+        for san in sans:
+            try:
+                move = parse_san(board, san)
+            except ValueError:
+                tags['Truncated'] = san
+                break
+            moves.append(move)
+            board = board.make_move(move)
+        yield tags, moves
+
+
+def pgn_positions(path, board_type=ChessBoard):
+    """Yields every position of every game in a PGN file, starting positions included, as the file is read."""
+    for tags, sans in read_pgn(path):
+        board = _start(tags, board_type)
+        yield board
+        for san in sans:
+            try:
+                move = parse_san(board, san)
+            except ValueError:
+                break
+            board = board.make_move(move)
+            yield board
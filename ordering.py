@@ -0,0 +1,73 @@
+from collections import defaultdict
+
+# move categories, searched in this order
+HINT = 3
+CAPTURE = 2
+KILLER = 1
+QUIET = 0
+
+
+class MoveOrderer:
+    """
+    Orders moves so that the ones most likely to cause a cutoff are searched first:
+    the transposition table / principal variation move, then captures by MVV-LVA (most valuable victim, least
+    valuable attacker, using the pieces' gvalue), then killer moves that caused a cutoff at the same ply elsewhere in
+    the tree, then the remaining quiet moves by their history score.
+    Works for any board that implements captured_piece and piece_at.
+    """
+
+    def __init__(self, num_killers=2):
+        self.num_killers = num_killers
+        self.killers = defaultdict(list)
+        self.history = defaultdict(int)
+
+    def _sort_key(self, board, move, ply, hint):
+        if move == hint:
+            return (HINT, 0)
+        victim = board.captured_piece(move)
+        if victim is not None:
+            attacker = board.piece_at(move[0])
+            return (CAPTURE, victim.gvalue * 1000 - attacker.gvalue)
+        killers = self.killers[ply]
+        if move in killers:
+            return (KILLER, -killers.index(move))
+        return (QUIET, self.history[(board.player_to_move, move)])
+
+    def order(self, board, moves, ply, hint=None):
+        """Returns moves sorted best first. Moves that compare equal keep their original order."""
+        return sorted(moves, key=lambda move: self._sort_key(board, move, ply, hint), reverse=True)
+
+    def order_stages(self, board, moves, ply, hint=None):
+        """
+        Orders the moves yielded by board.iter_moves(hint) one stage at a time: the hint, then the captures by
+        MVV-LVA, then the quiet moves by killers and history. A stage is only generated when the search reaches it.
+        """
+        captures = []
+        quiets = None
+        for move in moves:
+            if move == hint:
+                yield move
+            elif quiets is not None:
+                quiets.append(move)
+            elif board.captured_piece(move) is not None:
+                captures.append(move)
+            else:
+                yield from self.order(board, captures, ply)
+                quiets = [move]
+        if quiets is None:
+            yield from self.order(board, captures, ply)
+        else:
+            yield from self.order(board, quiets, ply)
+
+    def cutoff(self, board, move, ply, depth):
+        """
+        Record that move caused a beta cutoff at ply, with depth plies left to search.
+        Captures are already ordered first, so only quiet moves are remembered.
+        """
+        if board.captured_piece(move) is not None:
+            return
+        killers = self.killers[ply]
+        if move not in killers:
+            killers.insert(0, move)
+            del killers[self.num_killers:]
+        self.history[(board.player_to_move, move)] += depth * depth
@@ -0,0 +1,110 @@
+from chess import ChessBoard
+from bitboard import BitboardChessBoard
+from draughts import DraughtsBoard
+from draughts_bitboard import BitboardDraughtsBoard
+from notation import read_epd
+import argparse
+import json
+import time
+
+
+def perft(board, depth):
+    """
+    Number of move sequences of length depth from board.
+    A draughts multi-capture counts as a single move, so the counts can be compared with published checkers numbers.
+    The board is played on in place with push/pop and is unchanged afterwards.
+    """
+    if depth == 0:
+        return 1
+
+    player_to_move = board.player_to_move
+    nodes = 0
+    for move in board.legal_moves():
+        board.push(move)
+        nodes += perft(board, depth if board.player_to_move == player_to_move else depth - 1)
+        board.pop()
+    return nodes
+
+
+def divide(board, depth):
+    """
+    Returns a dict mapping each legal move to perft of the position after it.
+    Comparing this with another move generator narrows down where they disagree.
+    """
+    player_to_move = board.player_to_move
+    counts = {}
+    for move in board.legal_moves():
+        board.push(move)
+        counts[move] = perft(board, depth if board.player_to_move == player_to_move else depth - 1)
+        board.pop()
+    return counts
+
+
+# Position 3 of the chessprogramming wiki perft page
+POSITION_3_FEN = "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - -"
+
+
+# (name, board constructor, {depth: nodes}).
+# Only depths where en passant and under-promotion, which aren't implemented, can't happen are listed.
+REFERENCE_POSITIONS = [
+    ('chess initial', ChessBoard, {1: 20, 2: 400, 3: 8902, 4: 197281}),
+    ('chess position 3', lambda: ChessBoard.from_fen(POSITION_3_FEN), {1: 14, 2: 191}),
+    ('bitboard initial', BitboardChessBoard, {1: 20, 2: 400, 3: 8902, 4: 197281}),
+    ('bitboard position 3', lambda: BitboardChessBoard.from_fen(POSITION_3_FEN), {1: 14, 2: 191}),
+    ('draughts initial', DraughtsBoard, {1: 7, 2: 49, 3: 302, 4: 1469, 5: 7361, 6: 36768, 7: 179740}),
+    ('bitboard draughts', BitboardDraughtsBoard, {1: 7, 2: 49, 3: 302, 4: 1469, 5: 7361, 6: 36768, 7: 179740}),
+    ('multi-jump draughts', lambda: BitboardDraughtsBoard(multi_jump=True),
+     {1: 7, 2: 49, 3: 302, 4: 1469, 5: 7361, 6: 36768, 7: 179740}),
+]
+
+
+def epd_positions(path, board_type=BitboardChessBoard):
+    """
+    Reads a perft suite in EPD, where each position has its counts as operations "D1 20; D2 400", and yields
+    positions in the same form as REFERENCE_POSITIONS.
+    """
+    for board, operations in read_epd(path, board_type):
+        counts = {int(opcode[1:]): int(operand) for opcode, operand in operations.items()
+                  if opcode[0] == 'D' and opcode[1:].isdigit()}
+        name = operations.get('id', board.to_fen()).strip('"')
+        yield name, lambda board=board: board, counts
+
+
+def benchmark(max_depth=None, positions=REFERENCE_POSITIONS):
+    """
+    Runs perft on every position (by default the reference positions) up to max_depth, or the deepest known count.
+    Returns a list of dicts with the node count, whether it is correct, and the speed.
+    """
+    results = []
+    for name, board_type, counts in positions:
+        for depth, expected in sorted(counts.items()):
+            if max_depth is not None and depth > max_depth:
+                break
+            board = board_type()
+            start = time.perf_counter()
+            nodes = perft(board, depth)
+            seconds = time.perf_counter() - start
+            results.append({'position': name, 'depth': depth, 'nodes': nodes, 'expected': expected,
+                            'correct': nodes == expected, 'seconds': seconds,
+                            'nodes_per_second': nodes / seconds if seconds else 0.0})
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check move generators against known perft counts and time them.")
+    parser.add_argument('--depth', type=int, default=None, help="maximum depth to run")
+    parser.add_argument('--json', default=None, help="append the results to this JSON lines file")
+    parser.add_argument('--epd', default=None, help="run the chess positions of this EPD perft suite instead")
+    args = parser.parse_args()
+
+    positions = epd_positions(args.epd) if args.epd else REFERENCE_POSITIONS
+    results = benchmark(args.depth, positions)
+    for r in results:
+        status = 'ok' if r['correct'] else f"WRONG (expected {r['expected']})"
+        print(f"{r['position']:20} depth {r['depth']}: {r['nodes']:8} nodes {r['seconds']:8.3f}s "
+              f"{r['nodes_per_second']:10.0f} nodes/s {status}")
+
+    if args.json:
+        with open(args.json, 'a') as f:
+            for r in results:
+                f.write(json.dumps(r) + "\n")
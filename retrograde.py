@@ -0,0 +1,186 @@
+from base import Player
+from array import array
+import heapq
+import itertools
+import numpy as np
+
+# results as stored in a table
+DRAW = 0
+WHITE_WINS = 1
+BLACK_WINS = -1
+UNKNOWN = 2
+
+NO_MOVE = -1
+
+
+def _result(winner):
+    return DRAW if winner is None else winner.top_score
+
+
+def _winner(result):
+    return {WHITE_WINS: Player['W'], BLACK_WINS: Player['B']}.get(result)
+
+
+ENTRY = np.dtype([('result', np.int8), ('distance', np.int16), ('best', np.int32)])
+
+
+class RetrogradeTable:
+    """
+    The solution of every position of a small game or endgame, indexed by an integer code of the position:
+    the result with perfect play (a winner or a draw), how many plies it takes to get there (for wins; 0 for draws and
+    positions where the game is over), and a move that achieves it, as an integer move code.
+    Positions that weren't solved have result UNKNOWN.
+    """
+
+    def __init__(self, size=0, entries=None):
+        if entries is None:
+            entries = np.zeros(size, dtype=ENTRY)
+            entries['result'] = UNKNOWN
+            entries['best'] = NO_MOVE
+        self.entries = entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def num_solved(self):
+        return int((self.entries['result'] != UNKNOWN).sum())
+
+    def probe(self, code):
+        """Returns (winner, distance, move code) for the position with code, or None if it wasn't solved."""
+        result, distance, best = self.entries[code]
+        if result == UNKNOWN:
+            return None
+        return _winner(result), int(distance), int(best)
+
+    def save(self, path):
+        np.save(path, self.entries)
+
+    @classmethod
+    def load(cls, path, mmap=False):
+        """Loads a saved table. With mmap the file is memory mapped rather than read, so only probed pages are loaded."""
+        return cls(entries=np.load(path, mmap_mode='r' if mmap else None))
+
+
+def reachable(root, encode):
+    """All positions reachable from root, as a dict mapping position codes to boards."""
+    boards = {encode(root): root}
+    stack = [root]
+    while stack:
+        board = stack.pop()
+        if board.winner() is not None:
+            continue
+        for move in board.legal_moves():
+            child = board.make_move(move)
+            code = encode(child)
+            if code not in boards:
+                boards[code] = child
+                stack.append(child)
+    return boards
+
+
+def solve(codes, decode, encode, size, encode_move=None, outside=None):
+    """
+    Retrograde analysis: solves every position with a code in codes, working backwards from the positions where the
+    game is over.
+    decode maps a code to a new board and encode maps a board to its code, which must be less than size, or None for
+    a board that isn't covered by the codes.
+    (For a game small enough to keep every board in memory, use reachable and pass its keys and __getitem__.)
+    encode_move maps a move to the integer stored in the table; by default it is the move's index in legal_moves().
+    Moves can lead to positions outside codes (e.g. a capture that leaves a chess endgame); outside(board) must then
+    return the (winner, distance) of the position reached, or None if it is a draw.
+    Positions without legal moves are decided by board.no_moves_winner().
+    Moves after which the same player moves again (draughts multi-captures) are allowed.
+    Returns a RetrogradeTable.
+    """
+    codes = np.fromiter(codes, dtype=np.int64)
+    table = RetrogradeTable(size)
+    entries = table.entries
+    in_table = np.zeros(size, dtype=bool)
+    in_table[codes] = True
+
+    mover = np.zeros(size, dtype=np.int8)
+    # number of moves of each undecided position that haven't been shown to lose
+    unresolved = np.zeros(size, dtype=np.int32)
+    # the moves between positions in the table, and the winning moves out of it
+    children, parents, move_codes = array('q'), array('q'), array('q')
+    exits = []
+    # decided positions, as (distance, tie break, result, code), shortest first
+    queue = []
+    tie_break = itertools.count()
+
+    for code in codes:
+        board = decode(code)
+        mover[code] = board.player_to_move.top_score
+        winner = board.winner()
+        moves = board.legal_moves() if winner is None else []
+        if winner is None and len(moves) == 0:
+            winner = board.no_moves_winner()
+        if winner is not None:
+            entries[code] = (_result(winner), 0, NO_MOVE)
+            heapq.heappush(queue, (0, next(tie_break), _result(winner), code))
+            continue
+        unresolved[code] = len(moves)
+        for i, move in enumerate(moves):
+            move_code = encode_move(move) if encode_move is not None else i
+            child = board.make_move(move)
+            child_code = encode(child)
+            if child_code is not None and in_table[child_code]:
+                children.append(child_code)
+                parents.append(code)
+                move_codes.append(move_code)
+                continue
+            value = outside(child)
+            if value is not None:
+                winner, distance = value
+                exits.append((code, move_code))
+                heapq.heappush(queue, (distance, next(tie_break), _result(winner), size + len(exits) - 1))
+            # a draw outside the table is never counted off, so the parent can't be lost
+
+    # the moves into each position, grouped by the position they lead to
+    children = np.array(children, dtype=np.int64)
+    order = np.argsort(children, kind='stable')
+    parents = np.array(parents, dtype=np.int64)[order]
+    move_codes = np.array(move_codes, dtype=np.int64)[order]
+    starts = np.searchsorted(children[order], np.arange(size + 1))
+
+    while queue:
+        distance, _, result, child_code = heapq.heappop(queue)
+        if child_code >= size:
+            links = [exits[child_code - size]]
+        else:
+            links = zip(parents[starts[child_code]:starts[child_code + 1]],
+                        move_codes[starts[child_code]:starts[child_code + 1]])
+        for code, move_code in links:
+            if entries['result'][code] != UNKNOWN:
+                continue
+            if result == mover[code]:
+                # the player to move wins with this move, and no faster win was found before it
+                entries[code] = (result, distance + 1, move_code)
+                heapq.heappush(queue, (distance + 1, next(tie_break), result, code))
+            else:
+                # this move loses; if every move loses the position is lost, by the longest way
+                unresolved[code] -= 1
+                if unresolved[code] == 0:
+                    entries[code] = (result, distance + 1, move_code)
+                    heapq.heappush(queue, (distance + 1, next(tie_break), result, code))
+
+    # neither side can force a win from whatever is left
+    for code in codes[entries['result'][codes] == UNKNOWN]:
+        entries[code] = (DRAW, 0, _drawing_move(entries, decode(code), encode, encode_move, in_table, outside))
+
+    return table
+
+
+def _drawing_move(entries, board, encode, encode_move, in_table, outside):
+    """A move from a drawn position that keeps the draw, or NO_MOVE if there are no moves."""
+    for i, move in enumerate(board.legal_moves()):
+        child = board.make_move(move)
+        child_code = encode(child)
+        # positions still UNKNOWN once the queue is empty are draws
+        if child_code is not None and in_table[child_code]:
+            keeps_draw = entries['result'][child_code] in (DRAW, UNKNOWN)
+        else:
+            keeps_draw = outside(child) is None
+        if keeps_draw:
+            return encode_move(move) if encode_move is not None else i
+    return NO_MOVE
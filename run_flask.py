@@ -1,14 +1,69 @@
-from flask import Flask
+from flask import Flask, Response, request
 from flask_cors import CORS, cross_origin
-from draughts import DraughtsBoard, DraughtsPiece
-from chess import ChessBoard, ChessPiece
-from minimax import best_move
+from draughts import DraughtsPiece
+from draughts_bitboard import BitboardDraughtsBoard
+from chess import ChessPiece
+from bitboard import BitboardChessBoard
+from minimax import iterative_deepening, best_move, SearchStats
+from transposition import TranspositionTable
+from evaluation import ChessEvaluator, DraughtsEvaluator
+from tablebase import default_tablebases
+from book import OpeningBook, BOOK_DIR
+from cache import ResultCache
+from jobs import JobQueue, JobQueueFull
+from sessions import SessionStore, IllegalMove, move_name
+from analysis import analyse, read_packed
+from concurrent.futures import ProcessPoolExecutor
+from instrumentation import SearchProfile, prometheus_text
 from base import Player
 import json
+import os
 
-board_types = {'draughts': DraughtsBoard, 'chess': ChessBoard}
+board_types = {'draughts': BitboardDraughtsBoard, 'chess': BitboardChessBoard}
 piece_types = {'draughts': DraughtsPiece, 'chess': ChessPiece}
 
+# one table per game, shared by all requests, so memory stays bounded however many games are being played
+TT_SIZE_MB = 32
+transposition_tables = {game: TranspositionTable(TT_SIZE_MB) for game in board_types}
+evaluators = {'draughts': DraughtsEvaluator(), 'chess': ChessEvaluator()}
+tablebases = {'draughts': None, 'chess': default_tablebases()}
+# opening books built with book.py, if there are any
+books = {game: OpeningBook.open(os.path.join(BOOK_DIR, game + '.book')) for game in board_types}
+
+# the engine searches deeper and deeper until this budget is spent, so response times are predictable
+SEARCH_TIME_MS = 1000
+SEARCH_MAX_DEPTH = 10
+
+# moves already chosen, by game, position key and depth; set RESULT_CACHE_PATH to an SQLite file to keep them
+RESULT_CACHE_ENTRIES = 100000
+RESULT_CACHE_BYTES = 64 * 1024 * 1024
+RESULT_CACHE_PATH = None
+result_cache = ResultCache(RESULT_CACHE_ENTRIES, RESULT_CACHE_BYTES, RESULT_CACHE_PATH)
+
+# searches submitted to the job API run on these threads; when MAX_PENDING_JOBS are waiting new ones are refused.
+# Jobs share the transposition tables: entries are replaced whole and checked against the key, so this is safe.
+JOB_WORKERS = 2
+MAX_PENDING_JOBS = 16
+MAX_JOB_TIME_MS = 30000
+MAX_POLL_WAIT_S = 30
+job_queue = JobQueue(JOB_WORKERS, MAX_PENDING_JOBS, MAX_JOB_TIME_MS)
+
+# games kept on the server, so clients send just their moves; each has its own transposition table
+MAX_SESSIONS = 200
+SESSION_IDLE_S = 3600
+SESSION_TT_SIZE_MB = 8
+sessions = SessionStore(MAX_SESSIONS, SESSION_IDLE_S, SESSION_TT_SIZE_MB)
+
+# with INSTRUMENT_SEARCH every search is profiled (see instrumentation.py); totals of all searches are on /metrics
+INSTRUMENT_SEARCH = False
+search_totals = SearchProfile()
+
+# batches of positions posted to /<game>/analyse are searched in a pool of processes, started on first use
+ANALYSIS_WORKERS = os.cpu_count()
+ANALYSIS_DEPTH = 4
+MAX_BATCH_POSITIONS = 10000
+analysis_pool = None
+
 app = Flask(__name__)
 cors = CORS(app)
 app.config['CORS_HEADERS'] = 'Content-Type'
@@ -45,21 +100,237 @@ def initial_position(game):
     return b.to_json()
 
 
+def parse_move(move):
+    """A move in the format S13_S34."""
+    return ((int(move[1]), int(move[2])), (int(move[5]), int(move[6])))
+
+
+def new_stats():
+    return SearchStats(profile=INSTRUMENT_SEARCH)
+
+
+def record_stats(stats):
+    """Adds a search's counts to the totals on /metrics."""
+    if stats.profile is not None:
+        search_totals.merge(stats.profile)
+    else:
+        with search_totals.lock:
+            search_totals.searches += 1
+            search_totals.nodes += stats.nodes
+
+
+def stats_dict(stats):
+    ret = {'nodes': stats.nodes, 'depth': stats.depth, 'first_move_cutoff_rate': stats.first_move_cutoff_rate()}
+    if stats.profile is not None:
+        ret['profile'] = stats.profile.to_dict()
+    return ret
+
+
+def choose_move(game, board, tt=None, orderer=None, time_ms=None, stats=None):
+    """
+    The engine's move: from the result cache, the opening book or a tablebase if possible, otherwise searched.
+    tt defaults to the game's shared transposition table, and time_ms to SEARCH_TIME_MS.
+    A search's counts are collected in stats, if given, and added to the totals.
+    """
+    cache_key = [game, board.key, SEARCH_MAX_DEPTH]
+    cached = result_cache.get(cache_key)
+    if cached is not None:
+        move = tuple(tuple(square) for square in cached)
+        if move in board.legal_moves():
+            return move
+
+    move = books[game].move(board) if books[game] is not None else None
+    if move is None:
+        move = board.solved_move()
+    if move is None:
+        if stats is None:
+            stats = new_stats()
+        move, _ = iterative_deepening(board, time_ms=time_ms or SEARCH_TIME_MS, max_depth=SEARCH_MAX_DEPTH,
+                                      stats=stats, tt=tt or transposition_tables[game], orderer=orderer,
+                                      evaluator=evaluators[game], tablebases=tablebases[game])
+        record_stats(stats)
+    result_cache.put(cache_key, move)
+    return move
+
+
+@app.route('/chess/fen')
+@cross_origin()
+def chess_from_fen():
+    """The board of the FEN string given as the fen argument, e.g. to start a game from a set up position."""
+    try:
+        board = board_types['chess'].from_fen(request.args.get('fen', ''))
+    except ValueError as e:
+        return json.dumps({'error': str(e)}), 400
+    return board.to_json()
+
+
+@app.route('/cache/stats')
+@cross_origin()
+def cache_stats():
+    """Hit and miss counts of the result cache."""
+    return json.dumps(result_cache.stats())
+
+
+@app.route('/metrics')
+@cross_origin()
+def metrics():
+    """Counters of the searches, caches, jobs and sessions, for Prometheus to scrape."""
+    totals = search_totals.to_dict()
+    cache = result_cache.stats()
+    jobs = job_queue.stats()
+    tt_probes = sum(tt.probes for tt in transposition_tables.values())
+    tt_hits = sum(tt.hits for tt in transposition_tables.values())
+    text = prometheus_text([
+        ('kchess_searches_total', 'counter', "Searches made", totals['searches']),
+        ('kchess_search_nodes_total', 'counter', "Nodes searched", totals['nodes']),
+        ('kchess_search_seconds_total', 'counter', "Time spent searching (profiled)", totals['search_seconds']),
+        ('kchess_movegen_calls_total', 'counter', "Calls to legal_moves (profiled)", totals['movegen_calls']),
+        ('kchess_moves_generated_total', 'counter', "Moves generated (profiled)", totals['moves_generated']),
+        ('kchess_legal_moves_seconds_total', 'counter', "Time in legal_moves (profiled)",
+         totals['legal_moves_seconds']),
+        ('kchess_make_move_seconds_total', 'counter', "Time making and taking back moves (profiled)",
+         totals['make_move_seconds']),
+        ('kchess_leaf_evaluations_total', 'counter', "Positions evaluated (profiled)", totals['leaf_evaluations']),
+        ('kchess_evaluation_seconds_total', 'counter', "Time evaluating (profiled)", totals['evaluation_seconds']),
+        ('kchess_branching_factor', 'gauge', "Average moves per node by ply (profiled)",
+         {(('ply', ply),): branching for ply, branching in totals['branching'].items()}),
+        ('kchess_tt_probes_total', 'counter', "Transposition table probes", tt_probes),
+        ('kchess_tt_hits_total', 'counter', "Transposition table hits", tt_hits),
+        ('kchess_result_cache_lookups_total', 'counter', "Result cache lookups",
+         {(('result', 'hit'),): cache['hits'], (('result', 'disk_hit'),): cache['disk_hits'],
+          (('result', 'miss'),): cache['misses']}),
+        ('kchess_result_cache_entries', 'gauge', "Results cached in memory", cache['entries']),
+        ('kchess_jobs_pending', 'gauge', "Jobs queued or running", jobs['pending']),
+        ('kchess_sessions', 'gauge', "Open game sessions", len(sessions)),
+    ])
+    return text, 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
+
+def get_analysis_pool():
+    global analysis_pool
+    if analysis_pool is None:
+        analysis_pool = ProcessPoolExecutor(max_workers=ANALYSIS_WORKERS)
+    return analysis_pool
+
+
+@app.route('/<game>/analyse', methods=['POST'])
+@cross_origin()
+def analyse_positions(game):
+    """
+    Find the best move and score of many positions. The body is either JSON lines, a position per line in the same
+    format as /pos, or (with Content-Type application/octet-stream) positions packed by compact.pack, one after
+    another. The optional depth argument sets how deep each position is searched, and time_ms how long at most
+    (default SEARCH_TIME_MS, at most MAX_JOB_TIME_MS).
+    The response streams a JSON line for each position as it is done, with its index in the request.
+    """
+    depth = min(request.args.get('depth', ANALYSIS_DEPTH, type=int), SEARCH_MAX_DEPTH)
+    time_ms = min(request.args.get('time_ms', SEARCH_TIME_MS, type=int), MAX_JOB_TIME_MS)
+    boards = []
+    try:
+        if request.mimetype == 'application/octet-stream':
+            records = read_packed(board_types[game], request.get_data())
+        else:
+            lines = request.get_data(as_text=True).splitlines()
+            records = (json_to_board(game, line) for line in lines if line.strip())
+        for board in records:
+            if len(boards) == MAX_BATCH_POSITIONS:
+                return json.dumps({'error': f"at most {MAX_BATCH_POSITIONS} positions per request"}), 413
+            boards.append(board)
+    except (ValueError, KeyError, IndexError, TypeError) as e:
+        return json.dumps({'error': f"could not read positions: {e!r}"}), 400
+
+    def results():
+        for index, move, score, nodes in analyse(boards, depth, time_ms, executor=get_analysis_pool()):
+            yield json.dumps({'index': index, 'move': move_name(move) if move is not None else None,
+                              'score': score, 'nodes': nodes}) + '\n'
+
+    return Response(results(), mimetype='application/x-ndjson')
+
+
 @app.route('/<game>/pos/<position_json>')
 @cross_origin()
 def make_move_given_position(game, position_json):
-    "Given a position, find the best move and return the new board with that move played."
+    """
+    Given a position, find the best move and return the new board with that move played.
+    With ?stats=1 the board has the search's counters under 'stats' (with a profile if INSTRUMENT_SEARCH is on).
+    """
 
     board = json_to_board(game, position_json)
-
-    move = best_move(board, 2)
+    stats = new_stats()
+    move = choose_move(game, board, stats=stats)
     new_board = board.make_move(move)
 
     ret = new_board.to_json()
+    if request.args.get('stats'):
+        ret = json.loads(ret)
+        ret['stats'] = stats_dict(stats)
+        ret = json.dumps(ret)
 
     return ret
 
 
+def search_task(game, board):
+    """A job task that finds the engine's move on board and returns the new board as JSON."""
+    def task(stop, time_ms):
+        stats = new_stats()
+        move = best_move(board, max_depth=SEARCH_MAX_DEPTH, stats=stats, tt=transposition_tables[game],
+                         book=books[game], time_ms=time_ms, stop=stop, evaluator=evaluators[game],
+                         tablebases=tablebases[game])
+        record_stats(stats)
+        return board.make_move(move).to_json()
+    return task
+
+
+@app.route('/<game>/submit/<position_json>')
+@cross_origin()
+def submit_position(game, position_json):
+    """
+    Queue a search for the best move in a position and return its job id straight away.
+    The optional time_ms argument limits the search time (default SEARCH_TIME_MS, at most MAX_JOB_TIME_MS).
+    Responds 503 if too many searches are already waiting.
+    """
+    board = json_to_board(game, position_json)
+    time_ms = request.args.get('time_ms', SEARCH_TIME_MS, type=int)
+    try:
+        job = job_queue.submit(search_task(game, board), time_ms)
+    except JobQueueFull as e:
+        return json.dumps({'error': str(e)}), 503, {'Retry-After': '1'}
+    return json.dumps({'id': job.id, 'status': job.status}), 202
+
+
+@app.route('/jobs/<job_id>')
+@cross_origin()
+def job_status(job_id):
+    """
+    The status of a job, and once it is done its result: the new board.
+    With the wait argument, waits up to that many seconds (at most MAX_POLL_WAIT_S) for the job to finish.
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        return json.dumps({'error': f"no job {job_id}"}), 404
+    wait = request.args.get('wait', 0, type=float)
+    if wait > 0:
+        job.wait(min(wait, MAX_POLL_WAIT_S))
+    return json.dumps(job.to_dict())
+
+
+@app.route('/jobs/<job_id>/cancel')
+@cross_origin()
+def cancel_job(job_id):
+    """Cancel a queued or running job."""
+    job = job_queue.cancel(job_id)
+    if job is None:
+        return json.dumps({'error': f"no job {job_id}"}), 404
+    return json.dumps(job.to_dict())
+
+
+@app.route('/jobs/stats')
+@cross_origin()
+def job_stats():
+    """Counts of pending and finished jobs."""
+    return json.dumps(job_queue.stats())
+
+
 @app.route('/<game>/move/<pos_and_move_json>')
 @cross_origin()
 def play_move(game, pos_and_move_json):
@@ -72,7 +343,7 @@ def play_move(game, pos_and_move_json):
 
     move = json.loads(pos_and_move_json)['move']
 
-    move = ((int(move[1]), int(move[2])), (int(move[5]), int(move[6])))
+    move = parse_move(move)
 
     legal_moves = board.legal_moves()
 
@@ -86,5 +357,96 @@ def play_move(game, pos_and_move_json):
     return ret
 
 
+@app.route('/<game>/session/new')
+@cross_origin()
+def new_session(game):
+    """
+    Start a game kept on the server. The optional player argument (W or B, default W) is the side the client plays.
+    Returns its id and the initial board.
+    """
+    player = request.args.get('player', 'W')
+    if player not in ('W', 'B'):
+        return json.dumps({'error': f"player must be W or B, not {player!r}"}), 400
+    session = sessions.create(game, board_types[game](), Player[player])
+    return json.dumps({'id': session.id, 'board': json.loads(session.board.to_json())})
+
+
+def session_or_404(session_id):
+    session = sessions.get(session_id)
+    if session is None:
+        return None, (json.dumps({'error': f"no session {session_id}"}), 404)
+    return session, None
+
+
+@app.route('/session/<session_id>')
+@cross_origin()
+def session_state(session_id):
+    """The full board of a session and the moves played, e.g. for a client that has lost track of it."""
+    session, error = session_or_404(session_id)
+    if error:
+        return error
+    with session.lock:
+        ret = session.to_dict()
+        ret['board'] = json.loads(session.board.to_json())
+    return json.dumps(ret)
+
+
+def session_engine_moves(session):
+    """
+    The engine plays until it is the client's turn or the game is over: more than one move if it makes a draughts
+    capture that can continue. Returns the deltas.
+    """
+    time_ms = min(request.args.get('time_ms', SEARCH_TIME_MS, type=int), MAX_JOB_TIME_MS)
+    deltas = []
+    while session.engine_to_move():
+        move = choose_move(session.game, session.board, session.tt, session.orderer, time_ms)
+        deltas.append(session.play(move, engine=True))
+    return deltas
+
+
+@app.route('/session/<session_id>/move/<move>')
+@cross_origin()
+def session_move(session_id, move):
+    """
+    Play a move (in the format S13_S34) in a session, and if that passes the turn to the engine, reply with the
+    engine's move (or moves, to complete a draughts capture). After a draughts capture that can continue it is still
+    the client's turn, and the engine doesn't reply.
+    Returns the list of deltas: what changed on the board after each move. Responds 400 if the move is illegal or
+    it isn't the client's turn.
+    The optional time_ms argument limits the engine's search time.
+    """
+    session, error = session_or_404(session_id)
+    if error:
+        return error
+    with session.lock:
+        try:
+            deltas = [session.play(parse_move(move))]
+        except IllegalMove as e:
+            return json.dumps({'error': str(e)}), 400
+        deltas += session_engine_moves(session)
+    return json.dumps(deltas)
+
+
+@app.route('/session/<session_id>/engine')
+@cross_origin()
+def session_engine(session_id):
+    """The engine plays its turn in a session, e.g. when it has the first move. Returns the list of deltas."""
+    session, error = session_or_404(session_id)
+    if error:
+        return error
+    with session.lock:
+        if session.game_over():
+            return json.dumps({'error': "the game is over"}), 400
+        if not session.engine_to_move():
+            return json.dumps({'error': "it is the player's turn"}), 400
+        return json.dumps(session_engine_moves(session))
+
+
+@app.route('/session/<session_id>/close')
+@cross_origin()
+def close_session(session_id):
+    return json.dumps({'closed': sessions.close(session_id)})
+
+
 if __name__ == "__main__":
     app.run()
@@ -0,0 +1,125 @@
+from base import Player
+from collections import OrderedDict
+from ordering import MoveOrderer
+from transposition import TranspositionTable
+import threading
+import time
+import uuid
+
+
+class IllegalMove(ValueError):
+    pass
+
+
+def square_name(square):
+    return f"S{square[0]}{square[1]}"
+
+
+def move_name(move):
+    """A move in the S13_S34 format the client sends."""
+    return f"{square_name(move[0])}_{square_name(move[1])}"
+
+
+def board_delta(old, new, move):
+    """
+    What changed from board old to board new after move: the squares whose pieces changed, who is to move, and
+    whether the game is over. Enough for a client that has old to draw new.
+    """
+    changes = {square_name(sq): piece.name for sq, piece in new.position.items() if old.position.get(sq) != piece}
+    winner = new.winner()
+    game_over = winner is not None or not new.legal_moves()
+    if winner is None and game_over:
+        winner = new.no_moves_winner()
+    return {'move': move_name(move), 'changes': changes, 'player_to_move': new.player_to_move.name,
+            'game_over': game_over, 'winner': winner.name if winner is not None else None}
+
+
+class GameSession:
+    """
+    A game kept on the server: the board, the moves played, and the engine's transposition table and move orderer,
+    which carry what was learned searching one move over to the next. player is the side the client plays; the
+    engine plays the other.
+    """
+
+    def __init__(self, session_id, game, board, tt_size_mb=8, player=Player['W']):
+        self.id = session_id
+        self.game = game
+        self.board = board
+        self.player = player
+        self.history = []
+        self.tt = TranspositionTable(tt_size_mb)
+        self.orderer = MoveOrderer()
+        self.lock = threading.Lock()
+        self.last_used = time.time()
+
+    def game_over(self):
+        return self.board.winner() is not None or not self.board.legal_moves()
+
+    def engine_to_move(self):
+        """Whether it is the engine's turn. A draughts capture that can continue leaves the same side to move."""
+        return self.board.player_to_move != self.player and not self.game_over()
+
+    def play(self, move, engine=False):
+        """
+        Plays move for the client, or with engine=True for the engine, and returns the delta (see board_delta).
+        Raises IllegalMove if it isn't legal or it isn't that side's turn.
+        """
+        side = self.player.other_player() if engine else self.player
+        if self.board.player_to_move != side:
+            raise IllegalMove(f"it is {self.board.player_to_move.name}'s turn, not {side.name}'s")
+        if move not in self.board.legal_moves():
+            raise IllegalMove(f"{move_name(move)} is not legal")
+        old = self.board
+        self.board = old.make_move(move)
+        self.history.append(move)
+        return board_delta(old, self.board, move)
+
+    def to_dict(self):
+        return {'id': self.id, 'game': self.game, 'player': self.player.name,
+                'history': [move_name(move) for move in self.history]}
+
+
+class SessionStore:
+    """
+    The open sessions by id. At most max_sessions are kept: when there are more, or a session hasn't been used for
+    max_idle_s seconds, the least recently used ones are closed.
+    """
+
+    def __init__(self, max_sessions=200, max_idle_s=3600, tt_size_mb=8):
+        self.max_sessions = max_sessions
+        self.max_idle_s = max_idle_s
+        self.tt_size_mb = tt_size_mb
+        self.sessions = OrderedDict()
+        self.lock = threading.Lock()
+
+    def create(self, game, board, player=Player['W']):
+        session = GameSession(uuid.uuid4().hex, game, board, self.tt_size_mb, player)
+        with self.lock:
+            self.sessions[session.id] = session
+            self._expire()
+        return session
+
+    def get(self, session_id):
+        """The session with session_id, or None if there isn't one (any more)."""
+        with self.lock:
+            self._expire()
+            session = self.sessions.get(session_id)
+            if session is not None:
+                session.last_used = time.time()
+                self.sessions.move_to_end(session_id)
+            return session
+
+    def close(self, session_id):
+        with self.lock:
+            return self.sessions.pop(session_id, None) is not None
+
+    def _expire(self):
+        oldest = time.time() - self.max_idle_s
+        while self.sessions:
+            session = next(iter(self.sessions.values()))
+            if len(self.sessions) <= self.max_sessions and session.last_used >= oldest:
+                break
+            self.sessions.popitem(last=False)
+
+    def __len__(self):
+        return len(self.sessions)
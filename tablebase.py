@@ -0,0 +1,217 @@
+from base import Player
+from bitboard import BitboardChessBoard, PIECES
+from chess import ChessPiece, blank_board
+from retrograde import RetrogradeTable, solve, NO_MOVE
+import argparse
+import os
+import time
+
+TABLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tables')
+
+# Each ending is a king and one piece against a lone king. Tables store the side with the piece as white;
+# positions where black has it are probed with the colours swapped and the board flipped.
+ENDINGS = {'KQK': 'Q', 'KRK': 'R', 'KPK': 'P'}
+MAX_PIECES = 3
+
+# A position is coded from the squares (row*8 + col) of the white king, black king and white piece, and the side to
+# move. Only one position of each set of symmetric positions is solved: the one with the smallest code.
+SIZE = 64 * 64 * 64 * 2
+NO_CASTLING = {'WQS': False, 'BQS': False, 'WKS': False, 'BKS': False}
+
+
+def _symmetry_table(transform):
+    return [transform(sq // 8, sq % 8)[0] * 8 + transform(sq // 8, sq % 8)[1] for sq in range(64)]
+
+
+# the 8 symmetries of the board; with a pawn only the left-right mirror keeps the rules the same
+SYMMETRIES = [_symmetry_table(t) for t in [
+    lambda r, c: (r, c), lambda r, c: (r, 7 - c), lambda r, c: (7 - r, c), lambda r, c: (7 - r, 7 - c),
+    lambda r, c: (c, r), lambda r, c: (c, 7 - r), lambda r, c: (7 - c, r), lambda r, c: (7 - c, 7 - r),
+]]
+PAWN_SYMMETRIES = SYMMETRIES[:2]
+FLIP = _symmetry_table(lambda r, c: (7 - r, c))
+
+
+def _inverse(symmetry):
+    inverse = [0] * 64
+    for sq, image in enumerate(symmetry):
+        inverse[image] = sq
+    return inverse
+
+
+def _code(white_king, black_king, piece, white_to_move):
+    return ((white_king * 64 + black_king) * 64 + piece) * 2 + (0 if white_to_move else 1)
+
+
+def _canonical(ending, white_king, black_king, piece, white_to_move):
+    """The smallest code of the symmetric positions, and the symmetry that gives it."""
+    symmetries = PAWN_SYMMETRIES if ENDINGS[ending] == 'P' else SYMMETRIES
+    return min((_code(s[white_king], s[black_king], s[piece], white_to_move), s) for s in symmetries)
+
+
+def _squares(board):
+    """
+    Returns (ending, flipped, white king, black king, piece, white to move) for a board with the material of one of
+    the endings, with colours swapped if black has the piece (flipped), or None for any other board.
+    """
+    if sum(board.piece_counts.values()) != MAX_PIECES:
+        return None
+    bitboards = getattr(board, 'bitboards', None)
+    if bitboards is not None:
+        # BitboardChessBoard: with three pieces of different types, each bitboard has at most one bit
+        pieces = [(p, bb.bit_length() - 1) for p, bb in zip(PIECES, bitboards) if bb]
+    else:
+        pieces = [(p, row * 8 + col) for (row, col), p in board.position.items() if p != ChessPiece['E']]
+    kings = {}
+    piece = None
+    for p, sq in pieces:
+        if p.name[1] == 'K':
+            kings[p.owner] = sq
+        else:
+            piece = (p, sq)
+    if piece is None or 'K' + piece[0].name[1] + 'K' not in ENDINGS:
+        return None
+
+    ending = 'K' + piece[0].name[1] + 'K'
+    white_to_move = board.player_to_move == Player['W']
+    if piece[0].owner == Player['W']:
+        return ending, False, kings[Player['W']], kings[Player['B']], piece[1], white_to_move
+    return ending, True, FLIP[kings[Player['B']]], FLIP[kings[Player['W']]], FLIP[piece[1]], not white_to_move
+
+
+def _board(ending, code):
+    """The board with code, with the piece white's, or None if the position is illegal."""
+    white_to_move = code % 2 == 0
+    code //= 2
+    white_king, black_king, piece = code // 4096, code // 64 % 64, code % 64
+    if len({white_king, black_king, piece}) < 3:
+        return None
+    if abs(white_king // 8 - black_king // 8) <= 1 and abs(white_king % 8 - black_king % 8) <= 1:
+        return None
+    if ENDINGS[ending] == 'P' and piece // 8 in (0, 7):
+        return None
+
+    position = blank_board()
+    position[divmod(white_king, 8)] = ChessPiece['WK']
+    position[divmod(black_king, 8)] = ChessPiece['BK']
+    position[divmod(piece, 8)] = ChessPiece['W' + ENDINGS[ending]]
+    player_to_move = Player['W'] if white_to_move else Player['B']
+    board = BitboardChessBoard(position=position, player_to_move=player_to_move, can_castle=NO_CASTLING,
+                               previous_move="none")
+    # the side that isn't to move can't be in check
+    other_king = divmod(black_king if white_to_move else white_king, 8)
+    if board.square_attacked_by(other_king, player_to_move):
+        return None
+    return board
+
+
+class Tablebases:
+    """
+    Distance to mate tables for the endings, stored as memory mapped RetrogradeTable files in a directory.
+    Tables are opened the first time they are probed; endings without a file aren't probed.
+    """
+
+    max_pieces = MAX_PIECES
+
+    def __init__(self, directory=TABLE_DIR):
+        self.directory = directory
+        self.tables = {}
+
+    def path(self, ending):
+        return os.path.join(self.directory, ending + '.npy')
+
+    def table(self, ending):
+        if ending not in self.tables:
+            path = self.path(ending)
+            self.tables[ending] = RetrogradeTable.load(path, mmap=True) if os.path.exists(path) else None
+        return self.tables[ending]
+
+    def probe(self, board):
+        """
+        Returns (winner, distance, move) for a board in one of the endings: the winner with perfect play (None for a
+        draw), the number of plies to mate, and a move that achieves it.
+        Returns None if the board isn't in an ending that has a table.
+        """
+        squares = _squares(board)
+        if squares is None:
+            return None
+        ending, flipped, white_king, black_king, piece, white_to_move = squares
+        table = self.table(ending)
+        if table is None:
+            return None
+        code, symmetry = _canonical(ending, white_king, black_king, piece, white_to_move)
+        entry = table.probe(code)
+        if entry is None:
+            return None
+
+        winner, distance, move_code = entry
+        move = None
+        if move_code != NO_MOVE:
+            inverse = _inverse(symmetry)
+            from_sq, to_sq = inverse[move_code // 64], inverse[move_code % 64]
+            if flipped:
+                from_sq, to_sq = FLIP[from_sq], FLIP[to_sq]
+            move = (divmod(from_sq, 8), divmod(to_sq, 8))
+        if flipped and winner is not None:
+            winner = winner.other_player()
+        return winner, distance, move
+
+    def generate(self, ending):
+        """Solves the ending and saves its table. KPK needs KQK for the positions after promotion, so makes it first."""
+        if ENDINGS[ending] == 'P' and self.table('KQK') is None:
+            self.generate('KQK')
+
+        codes = set()
+        for white_king in range(64):
+            for black_king in range(64):
+                for piece in range(64):
+                    for white_to_move in (True, False):
+                        codes.add(_canonical(ending, white_king, black_king, piece, white_to_move)[0])
+        boards = {}
+        for code in codes:
+            board = _board(ending, code)
+            if board is not None:
+                boards[code] = board
+
+        def encode(board):
+            squares = _squares(board)
+            if squares is None or squares[0] != ending:
+                return None
+            return _canonical(*squares[:1], *squares[2:])[0]
+
+        def outside(board):
+            # a capture leaves two kings, a draw; a promotion leads to KQK
+            entry = self.probe(board)
+            return entry[:2] if entry is not None and entry[0] is not None else None
+
+        table = solve(boards.keys(), boards.__getitem__, encode, SIZE,
+                      encode_move=lambda move: (move[0][0] * 8 + move[0][1]) * 64 + move[1][0] * 8 + move[1][1],
+                      outside=outside)
+        os.makedirs(self.directory, exist_ok=True)
+        table.save(self.path(ending))
+        self.tables.pop(ending, None)
+        return table
+
+
+_default = None
+
+
+def default_tablebases():
+    """The tablebases in TABLE_DIR, shared by everything that probes them."""
+    global _default
+    if _default is None:
+        _default = Tablebases()
+    return _default
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate endgame tablebases.")
+    parser.add_argument('endings', nargs='*', default=list(ENDINGS), help="endings to generate (default all)")
+    parser.add_argument('--dir', default=TABLE_DIR, help="directory to write the tables to")
+    args = parser.parse_args()
+
+    tablebases = Tablebases(args.dir)
+    for ending in args.endings:
+        start = time.perf_counter()
+        table = tablebases.generate(ending)
+        print(f"{ending}: {table.num_solved()} positions in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,60 @@
+from analysis import analyse, analyse_board, read_packed, ANALYSIS_TT_SIZE_MB
+from compact import pack
+from draughts_bitboard import BitboardDraughtsBoard
+from transposition import TranspositionTable
+import json
+import random
+
+
+def random_boards(n, plies=6, seed=0):
+    rng = random.Random(seed)
+    boards = []
+    for i in range(n):
+        board = BitboardDraughtsBoard()
+        for ply in range(plies):
+            board = board.make_move(rng.choice(board.legal_moves()))
+        boards.append(board)
+    return boards
+
+
+def test_analyse():
+    """Every board should be analysed once in the worker processes, and get the same result as analysing it here."""
+    boards = random_boards(10)
+    results = list(analyse(boards, max_depth=2, workers=2, chunk_size=3))
+    assert sorted(index for index, *_ in results) == list(range(10))
+    for index, move, score, nodes in results:
+        assert move in boards[index].legal_moves()
+        assert nodes > 0
+
+    packed = b''.join(pack(board).data for board in boards)
+    results = sorted(analyse(read_packed(BitboardDraughtsBoard, packed), max_depth=2, workers=1, chunk_size=4))
+    assert len(results) == 10
+    for index, move, score, nodes in results:
+        tt = TranspositionTable(ANALYSIS_TT_SIZE_MB)
+        assert (move, score) == analyse_board(boards[index], max_depth=2, tt=tt)[:2]
+
+
+def test_flask_batch(monkeypatch):
+    """Positions posted as JSON lines or packed bytes should each get a streamed result line."""
+    import run_flask
+    monkeypatch.setattr(run_flask, 'ANALYSIS_WORKERS', 2)
+    client = run_flask.app.test_client()
+    boards = random_boards(5, seed=1)
+
+    body = '\n'.join(board.to_json() for board in boards)
+    response = client.post('/draughts/analyse?depth=1', data=body)
+    lines = [json.loads(line) for line in response.data.decode().splitlines()]
+    assert sorted(line['index'] for line in lines) == list(range(5))
+    assert all(line['move'].startswith('S') for line in lines)
+
+    body = b''.join(pack(board).data for board in boards)
+    response = client.post('/draughts/analyse?depth=1', data=body, content_type='application/octet-stream')
+    assert len(response.data.decode().splitlines()) == 5
+    assert client.post('/draughts/analyse', data=b'xyz', content_type='application/octet-stream').status_code == 400
+    bad = bytearray(body)
+    bad[3] = 200
+    assert client.post('/draughts/analyse', data=bytes(bad), content_type='application/octet-stream').status_code == 400
+    assert client.post('/draughts/analyse', data='5').status_code == 400
+
+    monkeypatch.setattr(run_flask, 'MAX_BATCH_POSITIONS', 4)
+    assert client.post('/draughts/analyse', data=body, content_type='application/octet-stream').status_code == 413
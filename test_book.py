@@ -0,0 +1,39 @@
+from chess import ChessBoard
+from bitboard import BitboardChessBoard
+from draughts import DraughtsBoard
+from book import OpeningBook, build_book, read_games
+from minimax import best_move
+import json
+import random
+
+E4 = ((1, 4), (3, 4))
+D4 = ((1, 3), (3, 3))
+E5 = ((6, 4), (4, 4))
+C5 = ((6, 2), (4, 2))
+
+
+def test_build_and_probe(tmp_path):
+    """Moves should be weighted by how often they were played, and found for any board type with the same key."""
+    games = [[E4, E5], [E4, C5], [D4], [E4, E5, ((0, 6), (2, 5))]]
+    path = tmp_path / 'games.jsonl'
+    with open(path, 'w') as f:
+        f.write(json.dumps({'moves': games[0]}) + "\n")
+        for game in games[1:]:
+            f.write(json.dumps(game) + "\n")
+
+    book_path = tmp_path / 'chess.book'
+    assert build_book(read_games(path), ChessBoard, book_path, max_ply=2) == 4
+    book = OpeningBook(book_path)
+    assert len(book) == 4
+
+    for board in [ChessBoard(), BitboardChessBoard()]:
+        assert sorted(book.moves(board)) == [(D4, 1), (E4, 3)]
+        assert book.move(board) == E4
+        assert book.move(board, random.Random(0)) in (E4, D4)
+        assert best_move(board, 1, book=book) == E4
+        assert sorted(book.moves(board.make_move(E4))) == [(C5, 1), (E5, 2)]
+
+    # beyond max_ply, and other games, aren't in the book
+    assert book.move(ChessBoard().make_move(E4).make_move(E5)) is None
+    assert book.move(DraughtsBoard()) is None
+    assert OpeningBook.open(tmp_path / 'missing.book') is None
@@ -0,0 +1,43 @@
+from cache import ResultCache
+import json
+
+
+def test_lru_and_persistence(tmp_path):
+    """The cache should evict least recently used entries, and read back evicted entries from its database."""
+    cache = ResultCache(max_entries=2)
+    cache.put(['chess', 1, 10], [[1, 4], [3, 4]])
+    cache.put(['chess', 2, 10], [[1, 3], [3, 3]])
+    assert cache.get(['chess', 1, 10]) == [[1, 4], [3, 4]]
+    cache.put(['chess', 3, 10], [[0, 6], [2, 5]])
+    assert cache.get(['chess', 2, 10]) is None
+    assert cache.get(['chess', 1, 10]) is not None
+    assert cache.get(['chess', 1, 5]) is None
+    assert cache.stats()['evictions'] == 1
+    assert (cache.hits, cache.misses) == (2, 2)
+
+    cache = ResultCache(max_entries=100, max_bytes=100)
+    for i in range(10):
+        cache.put(['draughts', i, 10], [[2, 1], [3, 2]])
+    assert cache.bytes <= 100 and len(cache.entries) < 10
+
+    path = str(tmp_path / 'results.sqlite')
+    cache = ResultCache(max_entries=1, path=path)
+    cache.put(['chess', 1, 10], 'a')
+    cache.put(['chess', 2, 10], 'b')
+    assert cache.get(['chess', 1, 10]) == 'a'
+    restarted = ResultCache(path=path)
+    assert restarted.get(['chess', 2, 10]) == 'b'
+    assert restarted.stats()['disk_hits'] == 1
+
+
+def test_flask_uses_cache(monkeypatch):
+    """A repeated position should be answered from the cache, and the counts shown on /cache/stats."""
+    import run_flask
+    monkeypatch.setattr(run_flask, 'SEARCH_TIME_MS', 50)
+    run_flask.result_cache.clear()
+    client = run_flask.app.test_client()
+    position = client.get('/draughts/initial_position').data.decode()
+    first = client.get('/draughts/pos/' + position).data
+    assert client.get('/draughts/pos/' + position).data == first
+    stats = json.loads(client.get('/cache/stats').data)
+    assert (stats['hits'], stats['misses']) == (1, 1)
@@ -1,5 +1,7 @@
 from chess import ChessBoard, ChessPiece
+from bitboard import BitboardChessBoard
 from base import Player
+import random
 
 
 E = ChessPiece['E']
@@ -82,3 +84,149 @@ def test_promotion():
 
     nb2 = nb.make_move(((1, 6), (0, 6)))  # Rg1
     assert nb2.position[(0, 6)] == ChessPiece['BR'], "black piece moves to back rank"
+
+
+def test_key_is_incremental():
+    """The zobrist key updated by make_move should match the key computed from scratch, including castling."""
+    b = ChessBoard()
+    moves = [((1, 4), (3, 4)), ((6, 4), (4, 4)), ((0, 6), (2, 5)), ((7, 6), (5, 5)),
+             ((0, 5), (3, 2)), ((7, 5), (4, 2)), ((0, 4), (0, 6)), ((5, 5), (3, 4))]
+    keys = {b.key}
+    for move in moves:
+        b = b.make_move(move)
+        assert b.key == b._compute_key()
+        keys.add(b.key)
+    assert len(keys) == len(moves) + 1
+
+
+def test_bitboard_matches_dict_board():
+    """The bitboard board should agree with ChessBoard on legal moves, position and key along random games."""
+    rng = random.Random(0)
+    for game in range(5):
+        b = ChessBoard()
+        bb = BitboardChessBoard()
+        for ply in range(60):
+            legal_moves = sorted(b.legal_moves())
+            assert legal_moves == sorted(bb.legal_moves())
+            assert b.position == bb.position
+            assert b.key == bb.key
+            assert b.evaluation() == bb.evaluation()
+            if len(legal_moves) == 0:
+                break
+            move = rng.choice(legal_moves)
+            b = b.make_move(move)
+            bb = bb.make_move(move)
+
+
+def test_iter_moves_stages():
+    """iter_moves should yield the legal moves once each: the hint first, then captures, then quiet moves."""
+    rng = random.Random(2)
+    for board_type in (ChessBoard, BitboardChessBoard):
+        b = board_type()
+        for ply in range(60):
+            legal_moves = b.legal_moves()
+            if len(legal_moves) == 0:
+                break
+            hint = rng.choice(legal_moves)
+            moves = list(b.iter_moves(hint))
+            assert sorted(moves) == sorted(legal_moves)
+            assert moves[0] == hint
+            is_capture = [b.captured_piece(m) is not None for m in moves[1:]]
+            assert is_capture == sorted(is_capture, reverse=True)
+            assert next(b.iter_moves(((0, 0), (7, 7))), None) in legal_moves
+            b = b.make_move(rng.choice(legal_moves))
+
+
+def test_pawn_cannot_jump():
+    """A pawn on its starting square cannot move two squares if the square in front of it is occupied."""
+    b = ChessBoard()
+    b = b.make_move(((0, 6), (2, 5)))  # Nf3
+    b = b.make_move(((7, 6), (5, 5)))  # Nf6
+    for board in [b, BitboardChessBoard(**b.__dict__)]:
+        assert ((1, 5), (3, 5)) not in board.legal_moves()
+
+
+def test_legal_moves_match_full_check_test():
+    """
+    Deciding legality from pins and checks should agree with playing each move and looking for a king capture.
+    (Castling is left out as it is now also illegal out of or through check.)
+    """
+    rng = random.Random(1)
+    for game in range(5):
+        b = ChessBoard()
+        for ply in range(80):
+            moves = [m for m in b._moves(b.player_to_move) if abs(m[0][1] - m[1][1]) != 2 or b.position[m[0]].type != 'King']
+            expected = [m for m in moves if not b._puts_me_in_check(m)]
+            legal_moves = b.legal_moves()
+            assert set(expected) == set(m for m in legal_moves if m in moves)
+            if len(legal_moves) == 0:
+                break
+            b = b.make_move(rng.choice(legal_moves))
+
+
+def test_no_castling_through_check():
+    """The king cannot castle out of, or through, an attacked square."""
+    position = empty_position()
+    position[(0, 4)] = ChessPiece['WK']
+    position[(0, 7)] = ChessPiece['WR']
+    position[(0, 0)] = ChessPiece['WR']
+    position[(7, 4)] = ChessPiece['BK']
+    position[(7, 5)] = ChessPiece['BR']  # attacks f1
+    can_castle = {'WKS': True, 'WQS': True, 'BKS': False, 'BQS': False}
+    board = ChessBoard(position=position, can_castle=can_castle, player_to_move=Player['W'])
+
+    for b in [board, BitboardChessBoard(**board.__dict__)]:
+        assert b.square_attacked_by((0, 5), Player['B'])
+        assert not b.square_attacked_by((0, 3), Player['B'])
+        legal_moves = b.legal_moves()
+        assert ((0, 4), (0, 6)) not in legal_moves
+        assert ((0, 4), (0, 2)) in legal_moves
+
+
+def test_push_pop():
+    """push should give the same board as make_move, and pop should restore the original board."""
+    rng = random.Random(2)
+    for board_type in [ChessBoard, BitboardChessBoard]:
+        b = board_type()
+        history = []
+        for ply in range(40):
+            move = rng.choice(b.legal_moves())
+            expected = b.make_move(move)
+            history.append((b.position.copy(), b.key, b.can_castle))
+            b.push(move)
+            assert b.position == expected.position
+            assert b.key == expected.key
+            assert b.player_to_move == expected.player_to_move
+            assert b.can_castle == expected.can_castle
+        while history:
+            b.pop()
+            assert (b.position, b.key, b.can_castle) == history.pop()
+        assert b.player_to_move == Player['W']
+
+
+def test_perft():
+    """Move generation should match the published perft counts."""
+    from perft import perft, REFERENCE_POSITIONS
+    for name, board_type, counts in REFERENCE_POSITIONS:
+        if name.startswith('draughts'):
+            continue
+        depth = min(max(counts), 3)
+        assert perft(board_type(), depth) == counts[depth], name
+
+
+def test_material_is_incremental():
+    """Material and piece counts kept by make_move and push should match a count from scratch."""
+    rng = random.Random(3)
+    for board_type in [ChessBoard, BitboardChessBoard]:
+        b = board_type()
+        for ply in range(80):
+            legal_moves = b.legal_moves()
+            if len(legal_moves) == 0:
+                break
+            move = rng.choice(legal_moves)
+            if ply % 2:
+                b = b.make_move(move)
+            else:
+                b.push(move)
+            assert (b.material, b.piece_counts) == b._compute_material()
+        assert sum(b.piece_counts.values()) < 32
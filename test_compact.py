@@ -0,0 +1,56 @@
+from chess import ChessBoard
+from bitboard import BitboardChessBoard
+from draughts import DraughtsBoard
+from TTT import TTTBoard, TTTPiece
+from compact import pack, unpack, validate, square_index, square_tuple, PackedBoard
+import pytest
+import random
+import sys
+
+
+def test_pack_unpack():
+    """Unpacking a packed board should give back the same position, and the packed form should be much smaller."""
+    chess_moves = [((1, 4), (3, 4)), ((6, 4), (4, 4)), ((0, 4), (1, 4))]  # e4 e5 Ke2
+    draughts_moves = [((2, 1), (3, 2)), ((5, 4), (4, 3))]
+    boards = [ChessBoard(), BitboardChessBoard(), DraughtsBoard(), TTTBoard().make_move((4, TTTPiece['W']))]
+    for b in [ChessBoard(), BitboardChessBoard()]:
+        for move in chess_moves:
+            b = b.make_move(move)
+        boards.append(b)
+    b = DraughtsBoard()
+    for move in draughts_moves:
+        b = b.make_move(move)
+    boards.append(b)
+
+    for board in boards:
+        packed = pack(board)
+        new_board = unpack(packed)
+        assert type(new_board) is type(board)
+        assert new_board.position == board.position
+        assert new_board.key == board.key
+        assert new_board.legal_moves() == board.legal_moves()
+        validate(packed)
+        assert pack(new_board) == packed
+        assert hash(pack(new_board)) == hash(packed)
+        assert len(packed.data) == len(board.position) + 4
+        if len(board.position) == 64:
+            assert sys.getsizeof(packed) + sys.getsizeof(packed.data) < sys.getsizeof(board.position) / 10
+
+    assert unpack(pack(boards[-2])).can_castle == {'WQS': False, 'BQS': True, 'WKS': False, 'BKS': True}
+    assert pack(ChessBoard()) != pack(ChessBoard().make_move(((1, 4), (3, 4))))
+    assert all(square_index(square_tuple(i)) == i for i in range(64))
+
+    data = pack(ChessBoard()).data
+    for i, value in ((0, 99), (64, 2), (65, 16), (66, 64)):
+        with pytest.raises(ValueError):
+            validate(PackedBoard(ChessBoard, data[:i] + bytes([value]) + data[i + 1:]))
+
+
+def test_pack_shuffled_position():
+    """Packing shouldn't depend on the order of the squares in the position dict."""
+    board = ChessBoard().make_move(((1, 4), (3, 4)))
+    squares = list(board.position)
+    random.Random(0).shuffle(squares)
+    shuffled = ChessBoard(**dict(vars(board), position={square: board.position[square] for square in squares}))
+    assert pack(shuffled) == pack(board)
+    assert unpack(pack(shuffled)).position == board.position
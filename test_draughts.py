@@ -1,5 +1,7 @@
 from draughts import DraughtsBoard, DraughtsPiece
+from draughts_bitboard import BitboardDraughtsBoard
 from base import Player
+import random
 
 W = DraughtsPiece['W']
 B = DraughtsPiece['B']
@@ -80,3 +82,121 @@ def test_complex_multi_capture():
 
     lm = nb.legal_moves()
     assert [capture12] == lm
+
+
+def test_key_is_incremental():
+    """The zobrist key should match the key computed from scratch, including the multi capture state."""
+    position = empty_position()
+    position[(2, 2)] = W
+    position[(3, 3)] = B
+    position[(5, 5)] = B
+
+    b = DraughtsBoard(position=position, player_to_move=Player['W'])
+    nb = b.make_move(((2, 2), (4, 4)))
+    assert nb.key == nb._compute_key()
+    nb2 = nb.make_move(((4, 4), (6, 6)))
+    assert nb2.key == nb2._compute_key()
+    assert len({b.key, nb.key, nb2.key}) == 3
+
+
+def test_push_pop_multi_capture():
+    """push/pop should match make_move through a multi capture and restore the board afterwards."""
+    position = empty_position()
+    position[(2, 2)] = W
+    position[(3, 3)] = B
+    position[(5, 5)] = B
+
+    b = DraughtsBoard(position=position, player_to_move=Player['W'])
+    original = (b.position.copy(), b.key)
+    expected = b.make_move(((2, 2), (4, 4)))
+    b.push(((2, 2), (4, 4)))
+    assert (b.position, b.key, b.player_to_move) == (expected.position, expected.key, expected.player_to_move)
+    assert b.legal_moves() == [((4, 4), (6, 6))]
+    b.push(((4, 4), (6, 6)))
+    assert b.player_to_move == Player['B']
+    b.pop()
+    b.pop()
+    assert (b.position, b.key, b.player_to_move) == original + (Player['W'],)
+
+
+
+def test_push_default_board():
+    """Pushing on a board made with the default position shouldn't change the next default board."""
+    b = DraughtsBoard()
+    b.push(((2, 1), (3, 2)))
+    new = DraughtsBoard()
+    assert (new.position[(2, 1)], new.position[(3, 2)]) == (W, E)
+    assert new.key == DraughtsBoard().key and new.position is not DraughtsBoard().position
+
+
+def test_perft():
+    """Move generation should match the published checkers perft counts, with divide adding up to perft."""
+    from perft import perft, divide
+    b = DraughtsBoard()
+    assert perft(b, 5) == 7361
+    assert sum(divide(b, 5).values()) == 7361
+
+
+def test_material_is_incremental():
+    """Material and piece counts, used by evaluation and winner, should follow captures and promotions."""
+    position = empty_position()
+    position[(5, 5)] = W
+    position[(6, 6)] = B
+    position[(6, 4)] = B
+
+    b = DraughtsBoard(position=position, player_to_move=Player['W'])
+    assert b.evaluation() == -1
+    b = b.make_move(((5, 5), (7, 7)))  # capture and promote
+    assert b.evaluation() == 2 - 1
+    assert b.piece_counts == {Player['W']: 1, Player['B']: 1}
+    assert (b.material, b.piece_counts) == b._compute_material()
+    b.push(((6, 4), (5, 3)))
+    assert b.winner() is None
+    b.pop()
+    assert b.evaluation() == 1
+
+
+def test_bitboard_matches_dict_board():
+    """The bitboard board should agree with DraughtsBoard on legal moves, position, key and material along random games."""
+    rng = random.Random(0)
+    for game in range(20):
+        b = DraughtsBoard(position=DraughtsBoard().position.copy())
+        bb = BitboardDraughtsBoard()
+        for ply in range(150):
+            legal_moves = sorted(b.legal_moves())
+            assert legal_moves == sorted(bb.legal_moves())
+            assert b.position == bb.position
+            assert (b.key, b.player_to_move, b.material, b.piece_counts) == \
+                (bb.key, bb.player_to_move, bb.material, bb.piece_counts)
+            if len(legal_moves) == 0 or b.winner() is not None:
+                break
+            move = rng.choice(legal_moves)
+            b = b.make_move(move)
+            bb.push(move)
+
+
+def test_multi_jump_sequences():
+    """With multi_jump, a double capture should be one move, and perft should count the same as with single hops."""
+    position = empty_position()
+    position[(2, 1)] = W
+    position[(3, 2)] = B
+    position[(5, 4)] = B
+    position[(5, 2)] = B
+    position[(7, 6)] = B
+
+    b = BitboardDraughtsBoard(position=position, player_to_move=Player['W'], multi_jump=True)
+    moves = b.legal_moves()
+    assert sorted(moves) == [((2, 1), (4, 3), (6, 1)), ((2, 1), (4, 3), (6, 5))]
+
+    original = (b.key, b.material, b.piece_counts)
+    b.push(moves[0])
+    assert b.player_to_move == Player['B']
+    assert b.piece_counts == {Player['W']: 1, Player['B']: 2}
+    hops = BitboardDraughtsBoard(position=position, player_to_move=Player['W'])
+    hops = hops.make_move(((2, 1), (4, 3))).make_move(moves[0][1:])
+    assert (b.key, b.position) == (hops.key, hops.position)
+    b.pop()
+    assert (b.key, b.material, b.piece_counts) == original
+
+    from perft import perft
+    assert perft(BitboardDraughtsBoard(multi_jump=True), 6) == perft(BitboardDraughtsBoard(), 6) == 36768
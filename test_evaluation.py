@@ -0,0 +1,64 @@
+from chess import ChessBoard
+from bitboard import BitboardChessBoard
+from draughts import DraughtsBoard
+from evaluation import ChessEvaluator, DraughtsEvaluator, evaluate_batch
+from minimax import alphabeta, SearchStats
+from base import Player
+import numpy as np
+
+
+def _boards():
+    chess = ChessBoard().make_move(((1, 4), (3, 4))).make_move(((6, 3), (4, 3)))  # e4 d5
+    bitboard = BitboardChessBoard().make_move(((1, 4), (3, 4))).make_move(((6, 3), (4, 3)))
+    draughts = DraughtsBoard().make_move(((2, 1), (3, 2)))
+    return chess, bitboard, draughts
+
+
+def test_evaluate_batch():
+    """Batch scores should match single scores, be symmetric initially and reduce to material without the tables."""
+    for board in [ChessBoard(), BitboardChessBoard(), DraughtsBoard()]:
+        assert evaluate_batch([board])[0] == 0
+
+    chess, bitboard, draughts = _boards()
+    ev = ChessEvaluator(mobility_weight=0.1)
+    scores = evaluate_batch([chess, bitboard, ChessBoard()], ev)
+    assert scores.shape == (3,)
+    assert scores[0] == ev.evaluate(chess) == ev.evaluate(bitboard)
+    assert (ev.encode(chess) == ev.encode(bitboard)).all()
+    assert ev.encode(chess).dtype == np.int8
+
+    b = chess.make_move(((3, 4), (4, 3)))  # exd5
+    assert ChessEvaluator(pst_scale=0, shield_weight=0).evaluate(b) == b.evaluation()
+    assert DraughtsEvaluator(pst_scale=0).evaluate(draughts) == draughts.evaluation()
+    # an advanced man is worth more
+    assert DraughtsEvaluator().evaluate(draughts) > 0
+
+
+
+def test_evaluate_position_order():
+    """Scores shouldn't depend on the order of the squares in the position dict."""
+    chess, _, draughts = _boards()
+    for board, ev in ((chess, ChessEvaluator()), (draughts, DraughtsEvaluator())):
+        reversed_board = type(board)(**dict(vars(board), position=dict(reversed(board.position.items()))))
+        assert ev.evaluate(reversed_board) == ev.evaluate(board)
+        assert (ev.encode(reversed_board) == ev.encode(board)).all()
+
+
+def test_search_with_batch_leaf_scores():
+    """Scoring leaf children in a batch should give the same result as evaluating every leaf on its own."""
+    for board in _boards():
+        ev = ChessEvaluator() if board.position[(0, 4)].name == 'WK' else DraughtsEvaluator()
+        side = board.player_to_move.top_score
+
+        best, best_score = None, None
+        for move in board.legal_moves():
+            child = board.make_move(move)
+            scores = [ev.evaluate(child.make_move(reply)) for reply in child.legal_moves()]
+            score = max(scores) if child.player_to_move == Player['W'] else min(scores)
+            if best is None or score * side > best_score * side:
+                best, best_score = move, score
+
+        stats = SearchStats()
+        move, score = alphabeta(board, 1, stats, evaluator=ev)
+        assert move == best
+        assert np.isclose(score, best_score)
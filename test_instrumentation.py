@@ -0,0 +1,44 @@
+from minimax import alphabeta, iterative_deepening, SearchStats
+from draughts import DraughtsBoard
+from evaluation import DraughtsEvaluator
+from transposition import TranspositionTable
+import json
+
+
+def test_profiled_search():
+    """Profiling should record what the search did without changing its result or the caller's board."""
+    board = DraughtsBoard()
+    stats = SearchStats(profile=True)
+    result = alphabeta(board, 3, stats, TranspositionTable(1), evaluator=DraughtsEvaluator())
+    assert result == alphabeta(board, 3, tt=TranspositionTable(1), evaluator=DraughtsEvaluator())
+    assert type(board) is DraughtsBoard
+
+    profile = stats.profile
+    assert profile.searches == 1 and profile.nodes == stats.nodes
+    assert profile.movegen_calls > 0 and profile.make_move_calls > 0 and profile.leaf_evaluations > 0
+    assert profile.legal_moves_seconds > 0 and profile.evaluation_seconds > 0
+    assert profile.branching()[0] == len(board.legal_moves())
+    assert profile.tt_probes > 0
+    assert SearchStats().profile is None
+
+    stats = SearchStats(profile=True)
+    iterative_deepening(board, max_depth=3, stats=stats)
+    assert stats.profile.searches == 1 and stats.profile.nodes == stats.nodes
+
+
+def test_metrics_endpoint(monkeypatch):
+    """The engine should return its search counters with the move on request, and totals on /metrics."""
+    import run_flask
+    monkeypatch.setattr(run_flask, 'SEARCH_TIME_MS', 50)
+    monkeypatch.setattr(run_flask, 'INSTRUMENT_SEARCH', True)
+    run_flask.result_cache.clear()
+    client = run_flask.app.test_client()
+    position = client.get('/chess/initial_position').data.decode()
+    board = json.loads(client.get('/chess/pos/' + position + '?stats=1').data)
+    assert board['stats']['nodes'] > 0
+    assert board['stats']['profile']['movegen_calls'] > 0
+    assert board['stats']['profile']['searches'] == 1
+
+    text = client.get('/metrics').data.decode()
+    assert '# TYPE kchess_search_nodes_total counter' in text
+    assert 'kchess_branching_factor{ply="1"}' in text
@@ -0,0 +1,67 @@
+from jobs import JobQueue, JobQueueFull, DONE, CANCELLED, FAILED
+import json
+import threading
+import pytest
+
+
+def test_queue_limits_and_cancellation():
+    """Jobs should stop at their time limit or when cancelled, and a full queue should refuse new jobs."""
+    queue = JobQueue(workers=1, max_pending=2, max_time_ms=50)
+    release = threading.Event()
+
+    def wait_for_stop(stop, time_ms):
+        stop.wait()
+        return time_ms
+
+    def blocked(stop, time_ms):
+        release.wait()
+        return 'ran'
+
+    job = queue.submit(wait_for_stop, time_ms=1000)
+    assert job.wait(5)
+    assert (job.status, job.result) == (DONE, 50)
+
+    running = queue.submit(blocked)
+    queued = queue.submit(blocked)
+    with pytest.raises(JobQueueFull):
+        queue.submit(blocked)
+    queue.cancel(queued.id)
+    release.set()
+    assert running.wait(5) and queued.wait(5)
+    assert (running.status, running.result) == (DONE, 'ran')
+    assert (queued.status, queued.result) == (CANCELLED, None)
+
+    started = threading.Event()
+
+    def wait_for_cancel(stop, time_ms):
+        started.set()
+        stop.wait()
+        return 'stopped'
+
+    cancelled = queue.submit(wait_for_cancel, time_ms=5000)
+    assert started.wait(5)
+    queue.cancel(cancelled.id)
+    assert cancelled.wait(5)
+    assert (cancelled.status, cancelled.result) == (CANCELLED, None)
+
+    failing = queue.submit(lambda stop, time_ms: 1 / 0)
+    assert failing.wait(5) and failing.status == FAILED
+    assert queue.stats()['pending'] == 0
+    queue.shutdown()
+
+
+def test_flask_jobs():
+    """A submitted position should be searched in the background and its result collected by long polling."""
+    import run_flask
+    client = run_flask.app.test_client()
+    position = client.get('/draughts/initial_position').data.decode()
+
+    response = client.get('/draughts/submit/' + position + '?time_ms=50')
+    assert response.status_code == 202
+    job_id = json.loads(response.data)['id']
+    job = json.loads(client.get(f'/jobs/{job_id}?wait=10').data)
+    assert job['status'] == DONE
+    assert json.loads(job['result'])['player_to_move'] == 'B'
+
+    assert client.get('/jobs/nonexistent').status_code == 404
+    assert json.loads(client.get(f'/jobs/{job_id}/cancel').data)['status'] == DONE
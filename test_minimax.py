@@ -0,0 +1,154 @@
+from chess import ChessBoard
+from bitboard import BitboardChessBoard
+from draughts import DraughtsBoard
+from TTT import TTTBoard, TTTPiece
+from minimax import minimax, alphabeta, SearchStats, WIN_SCORE
+from transposition import TranspositionTable
+from base import Player
+import numpy as np
+
+
+def minimax_best(board, max_depth):
+    """Reference result: score every move with plain minimax."""
+    legal_moves = board.legal_moves()
+    scores = np.array([minimax(board, move, max_depth) for move in legal_moves])
+    index = scores.argmax() if board.player_to_move == Player['W'] else scores.argmin()
+    return legal_moves[index], scores[index]
+
+
+def test_alphabeta_matches_minimax():
+    """Alpha-beta should find the same move and score as minimax at equal depth, visiting fewer nodes."""
+    b = ChessBoard()
+    b = b.make_move(((1, 4), (3, 4)))  # e4
+    b = b.make_move(((6, 3), (4, 3)))  # d5
+
+    boards = [(b, 1), (DraughtsBoard(), 2)]
+    for board, depth in boards:
+        stats = SearchStats()
+        assert alphabeta(board, depth, stats) == minimax_best(board, depth)
+        assert stats.nodes > 0
+
+
+def test_alphabeta_solves_TTT():
+    """With no depth limit the search plays tic-tac-toe to the end."""
+    position = {i: TTTPiece['E'] for i in range(9)}
+    position[0] = TTTPiece['W']
+    position[4] = TTTPiece['W']
+    position[1] = TTTPiece['B']
+    position[2] = TTTPiece['B']
+    board = TTTBoard(position, Player['W'])
+
+    move, score = alphabeta(board)
+    assert score == WIN_SCORE
+    assert (move, score) == minimax_best(board, None)
+
+
+def test_transposition_table():
+    """Searching with a transposition table should give the same result with fewer nodes."""
+    board = DraughtsBoard()
+    stats = SearchStats()
+    tt_stats = SearchStats()
+    tt = TranspositionTable(size_mb=1)
+
+    assert alphabeta(board, 4, tt_stats, tt) == alphabeta(board, 4, stats)
+    assert tt.hits > 0
+    assert tt_stats.nodes < stats.nodes
+
+
+def test_iterative_deepening_budgets():
+    """Iterative deepening should stop at the node/time budget and return the result of a completed iteration."""
+    from minimax import iterative_deepening
+    import threading
+    board = DraughtsBoard()
+
+    stats = SearchStats()
+    move, score = iterative_deepening(board, max_depth=3, stats=stats)
+    assert stats.depth == 3
+    assert score == alphabeta(board, 3)[1]
+
+    stats = SearchStats()
+    move, score = iterative_deepening(board, max_nodes=500, stats=stats)
+    assert stats.nodes <= 500 + 64
+    assert move in board.legal_moves()
+
+    stats = SearchStats()
+    iterative_deepening(ChessBoard(), time_ms=50, tt=TranspositionTable(1), stats=stats)
+    assert stats.depth is not None and stats.depth < 20
+
+    stop = threading.Event()
+    stop.set()
+    stats = SearchStats()
+    move, score = iterative_deepening(board, stop=stop, stats=stats)
+    assert stats.depth == 0
+    assert move in board.legal_moves()
+
+
+def test_move_ordering():
+    """Ordering moves should not change the score, and should make cutoffs happen earlier with fewer nodes."""
+    from ordering import MoveOrderer
+    board = BitboardChessBoard()
+    board = board.make_move(((1, 4), (3, 4)))  # e4
+    board = board.make_move(((6, 3), (4, 3)))  # d5
+
+    stats = SearchStats()
+    ordered_stats = SearchStats()
+    orderer = MoveOrderer()
+
+    move, score = alphabeta(board, 2, stats)
+    assert alphabeta(board, 2, ordered_stats, orderer=orderer)[1] == score
+    assert ordered_stats.nodes < stats.nodes
+    assert ordered_stats.first_move_cutoff_rate() > stats.first_move_cutoff_rate()
+
+    # exd5 is the most valuable capture of the least valuable attacker
+    assert orderer.order(board, board.legal_moves(), 0)[0] == ((3, 4), (4, 3))
+
+
+def test_parallel_search():
+    """Searching root moves in worker processes should give the same move and score as a single process, every time."""
+    from minimax import parallel_search
+    board = DraughtsBoard()
+    stats = SearchStats()
+    assert parallel_search(board, 3, workers=2, stats=stats) == alphabeta(board, 3)
+    assert stats.nodes > 0
+    again = SearchStats()
+    parallel_search(board, 3, workers=2, stats=again)
+    assert again.nodes == stats.nodes
+
+
+def test_quiescence_chess():
+    """At depth 0 plain search grabs a defended pawn with the queen; quiescence search sees the recapture."""
+    from chess import blank_board, ChessPiece
+    position = blank_board()
+    position[(0, 0)] = ChessPiece['WK']
+    position[(0, 3)] = ChessPiece['WQ']
+    position[(7, 7)] = ChessPiece['BK']
+    position[(4, 3)] = ChessPiece['BP']  # d5
+    position[(5, 4)] = ChessPiece['BP']  # e6, defends d5
+    can_castle = {'WKS': False, 'WQS': False, 'BKS': False, 'BQS': False}
+    board = BitboardChessBoard(position=position, player_to_move=Player['W'], can_castle=can_castle)
+
+    queen_takes = ((0, 3), (4, 3))
+    assert alphabeta(board, 0) == (queen_takes, 8)
+
+    stats = SearchStats()
+    move, score = alphabeta(board, 0, stats, quiescence=True)
+    assert move != queen_takes
+    assert score == 7
+    assert stats.quiescence_nodes > 0
+
+
+def test_quiescence_draughts():
+    """A man that steps next to an enemy piece is captured; the forced capture extension sees this."""
+    from draughts import DraughtsPiece
+    position = {(i, j): DraughtsPiece['E'] for i in range(8) for j in range(8)}
+    position[(2, 2)] = DraughtsPiece['W']
+    position[(5, 1)] = DraughtsPiece['W']
+    position[(4, 4)] = DraughtsPiece['B']
+    position[(7, 7)] = DraughtsPiece['B']
+    board = DraughtsBoard(position, Player['W'])
+
+    blunder = ((2, 2), (3, 3))
+    assert alphabeta(board, 0) == (blunder, 0)
+    move, score = alphabeta(board, 0, quiescence=True)
+    assert move != blunder
+    assert score == 0
@@ -0,0 +1,84 @@
+from chess import ChessBoard, INITIAL_FEN
+from bitboard import BitboardChessBoard
+from notation import parse_san, read_epd, read_pgn, pgn_games, pgn_positions
+import pytest
+import random
+
+PGN = """[Event "Test"]
+[White "A"]
+[Black "B"]
+
+1. e4 e5 2. Nf3 {a comment
+[that looks like a tag]} Nc6 (2... d6 3. d4) 3. Bb5 a6 $1 4. Ba4 Nf6 5. O-O Be7
+6. Re1 b5 7. Bb3 d6 8. c3 O-O 9. h3 Nb8 10. d4 Nbd7 1/2-1/2
+
+[Event "Set up"]
+[FEN "4k3/P7/8/8/8/8/8/4K3 w - - 0 1"]
+
+1. a8=Q+ Kd7 2. Qb7+ Ke6 *
+
+[Event "Under-promotion"]
+[FEN "4k3/P7/8/8/8/8/8/4K3 w - - 0 1"]
+
+1. Kd2 Kd7 2. a8=N 1-0
+"""
+
+
+def test_fen_round_trip():
+    """Boards should survive conversion to FEN and back, for both board types, along random games."""
+    assert ChessBoard.from_fen(INITIAL_FEN).key == ChessBoard().key
+    assert BitboardChessBoard().to_fen() == INITIAL_FEN
+    rng = random.Random(0)
+    board = ChessBoard()
+    for ply in range(40):
+        board = board.make_move(rng.choice(board.legal_moves()))
+        for board_type in (ChessBoard, BitboardChessBoard):
+            copy = board_type.from_fen(board.to_fen())
+            assert copy.key == board.key
+            assert sorted(copy.legal_moves()) == sorted(board.legal_moves())
+            assert copy.to_fen() == board.to_fen()
+    with pytest.raises(ValueError):
+        ChessBoard.from_fen("rnbqkbnr/pppppppp/9/8/8/8/PPPPPPPP/RNBQKBNR w KQkq -")
+    with pytest.raises(ValueError):
+        ChessBoard.from_fen("4k3/8/8/8/8/8/8/8 w - -")
+    for board_type in (ChessBoard, BitboardChessBoard):
+        with pytest.raises(ValueError):
+            board_type.from_fen("4k3/8/8/8/8/8/4Q3/4K3 w - -")
+        assert board_type.from_fen("4k3/8/8/8/8/8/4Q3/4K3 b - -").legal_moves()
+
+
+def test_pgn_and_epd(tmp_path):
+    """PGN games and EPD positions should be read lazily, with moves the boards can play."""
+    pgn = tmp_path / 'games.pgn'
+    pgn.write_text(PGN)
+    games = list(read_pgn(str(pgn)))
+    assert [tags['Event'] for tags, _ in games] == ['Test', 'Set up', 'Under-promotion']
+    assert games[0][1][:4] == ['e4', 'e5', 'Nf3', 'Nc6'] and len(games[0][1]) == 20
+
+    (tags, moves), (setup_tags, setup_moves), (_, truncated) = pgn_games(str(pgn))
+    assert moves[8] == ((0, 4), (0, 6))  # O-O
+    assert moves[19] == ((7, 1), (6, 3))  # Nbd7
+    assert setup_moves[0] == ((6, 0), (7, 0)) and 'Truncated' not in setup_tags
+    assert len(truncated) == 2
+    assert sum(1 for _ in pgn_positions(str(pgn))) == 21 + 5 + 3
+
+    board = ChessBoard()
+    assert parse_san(board, 'Nf3') == ((0, 6), (2, 5))
+    with pytest.raises(ValueError):
+        parse_san(board, 'Nd4')
+
+    epd = tmp_path / 'suite.epd'
+    epd.write_text(INITIAL_FEN.rsplit(' ', 2)[0] + ' bm e4; id "start";\n'
+                   '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1 ;D1 14 ;D2 191\n')
+    (start, operations), (position_3, counts) = read_epd(str(epd))
+    assert operations == {'bm': 'e4', 'id': '"start"'}
+    assert start.key == ChessBoard().key
+    assert counts == {'D1': '14', 'D2': '191'}
+    assert len(position_3.legal_moves()) == 14
+
+    from perft import epd_positions, benchmark
+    results = benchmark(2, epd_positions(str(epd)))
+    assert [r['correct'] for r in results] == [True, True]
+
+    from book import read_games
+    assert list(read_games(str(pgn))) == [moves]
@@ -0,0 +1,50 @@
+from TTT import TTTBoard, TTTPiece, solve_table, encode_position, _initial_position
+from minimax import alphabeta, best_move, result_score
+from retrograde import RetrogradeTable, reachable
+from base import Player
+import random
+
+
+def test_tic_tac_toe_table():
+    """The retrograde table should solve every reachable position, agreeing with a full alpha-beta search."""
+    table = solve_table()
+    assert table.num_solved() == 5478
+    assert table.probe(encode_position(_initial_position())) == (None, 0, 0)
+
+    rng = random.Random(0)
+    boards = list(reachable(TTTBoard(position=_initial_position()), lambda b: encode_position(b.position)).values())
+    for board in rng.sample(boards, 50):
+        if board.winner() is not None or len(board.legal_moves()) == 0:
+            continue
+        winner, distance, square = table.probe(encode_position(board.position))
+        _, score = alphabeta(board)
+        assert score == result_score(winner)
+        # the table's move keeps the same result
+        child = board.make_move((square, TTTPiece[board.player_to_move.name]))
+        if child.winner() is not None:
+            assert child.winner() == winner
+        else:
+            assert alphabeta(child)[1] == score
+
+
+def test_table_save_load(tmp_path):
+    """A saved table should load, and memory map, with the same entries; best_move should use it."""
+    table = solve_table()
+    path = tmp_path / 'ttt.npy'
+    table.save(path)
+    for loaded in [RetrogradeTable.load(path), RetrogradeTable.load(path, mmap=True)]:
+        assert (loaded.entries == table.entries).all()
+
+    # white to move can win at once
+    position = _initial_position()
+    position.update({0: TTTPiece['W'], 1: TTTPiece['W'], 3: TTTPiece['B'], 4: TTTPiece['B']})
+    board = TTTBoard(position=position, player_to_move=Player['W'])
+    assert best_move(board) == (2, TTTPiece['W'])
+    assert board.evaluation() == 1
+
+
+def test_push_default_board():
+    """Pushing on a board made with the default position shouldn't change the next default board."""
+    b = TTTBoard()
+    b.push((0, TTTPiece['W']))
+    assert TTTBoard().position == _initial_position()
@@ -0,0 +1,84 @@
+from sessions import SessionStore, IllegalMove
+from draughts import DraughtsBoard, DraughtsPiece
+from base import Player
+import json
+import pytest
+
+
+def test_session_store():
+    """Sessions should apply legal moves only, and the least recently used should be closed when there are too many."""
+    store = SessionStore(max_sessions=2, tt_size_mb=1)
+    first = store.create('draughts', DraughtsBoard())
+    delta = first.play(((2, 1), (3, 2)))
+    assert delta['changes'] == {'S21': 'E', 'S32': 'W'}
+    assert delta['player_to_move'] == 'B' and not delta['game_over']
+    with pytest.raises(IllegalMove):
+        first.play(((2, 1), (3, 2)))
+    # it is the engine's turn
+    with pytest.raises(IllegalMove):
+        first.play(((5, 0), (4, 1)))
+
+    second = store.create('draughts', DraughtsBoard())
+    assert store.get(first.id) is first
+    store.create('draughts', DraughtsBoard())
+    assert store.get(second.id) is None
+    assert store.get(first.id) is first
+
+
+def test_flask_session(monkeypatch):
+    """A session game should be played by sending moves only, with the engine replying and deltas returned."""
+    import run_flask
+    monkeypatch.setattr(run_flask, 'SEARCH_TIME_MS', 50)
+    client = run_flask.app.test_client()
+    session_id = json.loads(client.get('/chess/session/new').data)['id']
+
+    deltas = json.loads(client.get(f'/session/{session_id}/move/S14_S34').data)
+    assert [delta['player_to_move'] for delta in deltas] == ['B', 'W']
+    assert deltas[0]['changes'] == {'S14': 'E', 'S34': 'WP'}
+    assert client.get(f'/session/{session_id}/move/S14_S34').status_code == 400
+
+    state = json.loads(client.get(f'/session/{session_id}').data)
+    assert state['history'][0] == 'S14_S34' and len(state['history']) == 2
+    assert state['board']['player_to_move'] == 'W'
+    assert json.loads(client.get(f'/session/{session_id}/close').data)['closed']
+    assert client.get(f'/session/{session_id}').status_code == 404
+
+    session_id = json.loads(client.get('/draughts/session/new?player=B').data)['id']
+    assert client.get(f'/session/{session_id}/move/S52_S43').status_code == 400
+    deltas = json.loads(client.get(f'/session/{session_id}/engine').data)
+    assert [delta['player_to_move'] for delta in deltas] == ['B']
+    assert client.get('/draughts/session/new?player=X').status_code == 400
+
+
+def draughts_board(white, black, player_to_move):
+    position = {(row, col): DraughtsPiece['E'] for row in range(8) for col in range(8)}
+    position.update({square: DraughtsPiece['W'] for square in white})
+    position.update({square: DraughtsPiece['B'] for square in black})
+    return DraughtsBoard(position=position, player_to_move=Player[player_to_move])
+
+
+def test_flask_session_multi_capture(monkeypatch):
+    """The turn should only pass between the client and the engine when a draughts multi-capture is complete."""
+    import run_flask
+    monkeypatch.setattr(run_flask, 'SEARCH_TIME_MS', 50)
+    client = run_flask.app.test_client()
+
+    # white, the client, can capture twice: S21_S43 then S43_S65
+    board = draughts_board([(2, 1), (0, 7)], [(3, 2), (5, 4), (7, 0)], 'W')
+    session_id = run_flask.sessions.create('draughts', board).id
+    deltas = json.loads(client.get(f'/session/{session_id}/move/S21_S43').data)
+    assert [delta['player_to_move'] for delta in deltas] == ['W']
+    assert client.get(f'/session/{session_id}/engine').status_code == 400
+    deltas = json.loads(client.get(f'/session/{session_id}/move/S43_S65').data)
+    assert deltas[0]['move'] == 'S43_S65'
+    assert deltas[-1]['player_to_move'] == 'W' or deltas[-1]['game_over']
+
+    # black, the engine, has to capture twice: S54_S32 then S32_S10
+    board = draughts_board([(4, 3), (2, 1), (0, 7)], [(5, 4), (7, 6)], 'B')
+    session = run_flask.sessions.create('draughts', board)
+    with pytest.raises(IllegalMove):
+        session.play(((5, 4), (3, 2)))
+    deltas = json.loads(client.get(f'/session/{session.id}/engine').data)
+    assert [delta['move'] for delta in deltas] == ['S54_S32', 'S32_S10']
+    assert [delta['player_to_move'] for delta in deltas] == ['B', 'W']
+    assert json.loads(client.get(f'/session/{session.id}').data)['player'] == 'W'
@@ -0,0 +1,54 @@
+from bitboard import BitboardChessBoard
+from chess import ChessBoard, ChessPiece, blank_board
+from tablebase import Tablebases, NO_CASTLING
+from minimax import alphabeta, WIN_SCORE
+from base import Player
+import pytest
+
+
+@pytest.fixture(scope='module')
+def tablebases(tmp_path_factory):
+    tablebases = Tablebases(tmp_path_factory.mktemp('tables'))
+    tablebases.generate('KRK')
+    return tablebases
+
+
+def krk(pieces, player_to_move, board_type=BitboardChessBoard):
+    position = blank_board()
+    for square, name in pieces.items():
+        position[square] = ChessPiece[name]
+    return board_type(position=position, player_to_move=player_to_move, can_castle=NO_CASTLING,
+                      previous_move="none")
+
+
+def test_krk_table(tablebases):
+    """The longest KRK mate is 16 moves, and the table should find mates and agree whichever colour has the rook."""
+    entries = tablebases.table('KRK').entries
+    assert entries['distance'].max() == 32
+
+    board = krk({(5, 4): 'WK', (7, 4): 'BK', (0, 0): 'WR'}, Player['W'])
+    assert tablebases.probe(board) == (Player['W'], 1, ((0, 0), (7, 0)))  # Ra8#
+    mated = board.make_move(((0, 0), (7, 0)))
+    assert mated.legal_moves() == [] and mated.no_moves_winner() == Player['W']
+    assert tablebases.probe(mated)[:2] == (Player['W'], 0)
+
+    # the same position with colours swapped and the board flipped
+    flipped = krk({(2, 4): 'BK', (0, 4): 'WK', (7, 0): 'BR'}, Player['B'], ChessBoard)
+    assert tablebases.probe(flipped) == (Player['B'], 1, ((7, 0), (0, 0)))
+
+    # black to move can take the undefended rook
+    board = krk({(0, 0): 'WK', (4, 4): 'BK', (4, 5): 'WR'}, Player['B'])
+    winner, distance, move = tablebases.probe(board)
+    assert winner is None and move == ((4, 4), (4, 5))
+
+
+def test_search_uses_tablebase(tablebases):
+    """In a tablebase position the search should return the tablebase result without searching to mate."""
+    board = krk({(0, 0): 'WK', (4, 4): 'BK', (3, 1): 'WR'}, Player['W'])
+    winner, distance, move = tablebases.probe(board)
+    assert winner == Player['W']
+
+    # the positions after each root move are looked up
+    move, score = alphabeta(board, 1, tablebases=tablebases)
+    assert score == WIN_SCORE - (distance - 1)
+    assert tablebases.probe(board.make_move(move))[1] == distance - 1
@@ -0,0 +1,34 @@
+from tournament import Engine, tournament, score_interval, elo
+from book import read_games
+import csv
+
+
+def test_tournament(tmp_path):
+    """Games should be played in worker processes and written as they finish; the deeper engine should win overall."""
+    engines = [Engine('d0', max_depth=0), Engine.parse('d2:max_depth=2,evaluator=pst,quiescence=1')]
+    path = str(tmp_path / 'games.jsonl')
+    results = tournament('draughts', engines, games_per_pair=4, workers=2, out=path, max_plies=80)
+
+    games = list(read_games(path))
+    assert len(games) == results.games() == 4
+    assert all(0 < len(moves) <= 80 for moves in games)
+    assert len(results.score('d2', 'd0')) == 4
+    assert 0 not in results.score('d2', 'd0') and sum(results.score('d2', 'd0')) > 2
+    throughput = results.throughput()
+    assert throughput['total']['nodes_per_s'] > 0
+    assert sum(t['games'] for worker, t in throughput.items() if worker != 'total') == 4
+
+    path = str(tmp_path / 'games.csv')
+    perfect = [Engine('a', max_depth=9), Engine('b', max_depth=9)]
+    tournament('TTT', perfect, games_per_pair=2, workers=1, out=path, opening_plies=0)
+    with open(path) as f:
+        rows = list(csv.DictReader(f))
+    # tic-tac-toe played perfectly from the start is a draw
+    assert [row['result'] for row in rows] == ['0.5', '0.5']
+
+
+def test_score_interval():
+    assert score_interval([1, 0, 0.5, 0.5])[0] == 0.5
+    score, low, high = score_interval([1] * 30 + [0] * 10)
+    assert low < score == 0.75 < high
+    assert round(elo(0.75)) == 191 and elo(0.5) == 0
@@ -0,0 +1,268 @@
+from bitboard import BitboardChessBoard
+from draughts_bitboard import BitboardDraughtsBoard
+from TTT import TTTBoard
+from evaluation import evaluator_for
+from minimax import alphabeta, iterative_deepening, SearchStats
+from ordering import MoveOrderer
+from transposition import TranspositionTable
+from base import Player
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections import defaultdict
+import argparse
+import csv
+import itertools
+import json
+import math
+import os
+import random
+import time
+
+board_types = {'chess': BitboardChessBoard, 'draughts': BitboardDraughtsBoard, 'TTT': TTTBoard}
+
+# 95% two sided normal quantile, for the confidence intervals
+Z = 1.96
+CSV_FIELDS = ['index', 'white', 'black', 'result', 'winner', 'plies', 'seconds', 'nodes', 'worker', 'moves']
+
+
+class Engine:
+    """
+    An engine configuration: how deep or long to search, with which evaluation and search features.
+    With time_ms or max_nodes set the search is iterative deepening to at most max_depth, otherwise a fixed depth
+    alpha-beta search. evaluator is 'material' (the boards' own evaluation) or 'pst' (evaluation.py).
+    """
+
+    def __init__(self, name, max_depth=2, time_ms=None, max_nodes=None, evaluator='material', quiescence=False,
+                 ordering=True, tt_size_mb=None):
+        assert(evaluator in ('material', 'pst'))
+        self.name = name
+        self.max_depth = max_depth
+        self.time_ms = time_ms
+        self.max_nodes = max_nodes
+        self.evaluator = evaluator
+        self.quiescence = quiescence
+        self.ordering = ordering
+        self.tt_size_mb = tt_size_mb
+
+    @classmethod
+    def parse(cls, spec):
+        """An engine from a spec such as "deep:max_depth=4,evaluator=pst,quiescence=1"."""
+        name, _, options = spec.partition(':')
+        kwargs = {}
+        for option in filter(None, options.split(',')):
+            key, value = option.split('=')
+            kwargs[key] = value if key == 'evaluator' else float(value) if key == 'tt_size_mb' else int(value)
+        for key in ('quiescence', 'ordering'):
+            if key in kwargs:
+                kwargs[key] = bool(kwargs[key])
+        return cls(name, **kwargs)
+
+    def player(self, board):
+        """A function that chooses this engine's moves in a game starting from board, keeping its tables between them."""
+        tt = TranspositionTable(self.tt_size_mb) if self.tt_size_mb else None
+        orderer = MoveOrderer() if self.ordering else None
+        evaluator = evaluator_for(board) if self.evaluator == 'pst' else None
+
+        def choose(board, stats):
+            if self.time_ms is None and self.max_nodes is None:
+                return alphabeta(board, self.max_depth, stats, tt, orderer, self.quiescence, evaluator)[0]
+            return iterative_deepening(board, self.time_ms, self.max_nodes, self.max_depth, stats, tt,
+                                       orderer=orderer, quiescence=self.quiescence, evaluator=evaluator)[0]
+        return choose
+
+    def __repr__(self):
+        return f"Engine({self.name!r})"
+
+
+def _record_move(move):
+    # chess and draughts moves are pairs of squares; tic-tac-toe moves are a square and a piece
+    return [getattr(part, 'name', part) for part in move]
+
+
+def play_game(game, white, black, index=0, opening_plies=0, max_plies=200, seed=None):
+    """
+    Plays a game between Engines white and black, after opening_plies random moves (chosen from seed, so that the
+    same seed gives the same opening) to vary the games. A game not over after max_plies is a draw.
+    Returns a record of the game: who played, the result for white (1, 0.5 or 0), the moves, and the nodes searched
+    and time taken by the worker process that played it.
+    """
+    start = time.perf_counter()
+    board = board_types[game]()
+    rng = random.Random(seed)
+    players = {Player['W']: white.player(board), Player['B']: black.player(board)}
+    stats = SearchStats()
+    moves = []
+    winner = None
+    while len(moves) < max_plies:
+        winner = board.winner()
+        if winner is not None:
+            break
+        legal_moves = board.legal_moves()
+        if not legal_moves:
+            winner = board.no_moves_winner()
+            break
+        if len(moves) < opening_plies:
+            move = rng.choice(legal_moves)
+        else:
+            move = players[board.player_to_move](board, stats)
+        board = board.make_move(move)
+        moves.append(_record_move(move))
+
+    result = 0.5 if winner is None else 1.0 if winner == Player['W'] else 0.0
+    return {'index': index, 'white': white.name, 'black': black.name, 'result': result,
+            'winner': winner.name if winner is not None else None, 'plies': len(moves),
+            'seconds': time.perf_counter() - start, 'nodes': stats.nodes, 'worker': os.getpid(), 'moves': moves}
+
+
+def schedule(engines, games_per_pair):
+    """(white, black) for each game: every pair of engines plays games_per_pair games, alternating colours."""
+    pairings = []
+    for first, second in itertools.combinations(engines, 2):
+        for i in range(games_per_pair):
+            pairings.append((first, second) if i % 2 == 0 else (second, first))
+    return pairings
+
+
+class Results:
+    """Running totals of a tournament: the score of each engine against each other, and each worker's throughput."""
+
+    def __init__(self):
+        # scores[(engine, opponent)] is a list of engine's results (1, 0.5, 0) against opponent
+        self.scores = defaultdict(list)
+        self.workers = defaultdict(lambda: {'games': 0, 'seconds': 0.0, 'nodes': 0})
+        self.start = time.perf_counter()
+
+    def add(self, record):
+        self.scores[(record['white'], record['black'])].append(record['result'])
+        self.scores[(record['black'], record['white'])].append(1 - record['result'])
+        worker = self.workers[record['worker']]
+        worker['games'] += 1
+        worker['seconds'] += record['seconds']
+        worker['nodes'] += record['nodes']
+
+    def score(self, engine, opponent=None):
+        """engine's results against opponent, or everyone."""
+        if opponent is not None:
+            return self.scores[(engine, opponent)]
+        return [r for (e, _), results in self.scores.items() if e == engine for r in results]
+
+    def games(self):
+        return sum(worker['games'] for worker in self.workers.values())
+
+    def table(self):
+        """A row for each pair of engines, with the first engine's score, Elo difference and their intervals."""
+        rows = []
+        for (engine, opponent), results in sorted(self.scores.items()):
+            score, low, high = score_interval(results)
+            rows.append({'engine': engine, 'opponent': opponent, 'games': len(results), 'score': score,
+                         'score_low': low, 'score_high': high,
+                         'elo': elo(score), 'elo_low': elo(low), 'elo_high': elo(high)})
+        return rows
+
+    def throughput(self):
+        """Games and nodes per second of each worker process (while it was playing) and overall (wall clock)."""
+        report = {worker: {'games': w['games'], 'games_per_s': w['games'] / w['seconds'] if w['seconds'] else 0.0,
+                           'nodes_per_s': w['nodes'] / w['seconds'] if w['seconds'] else 0.0}
+                  for worker, w in self.workers.items()}
+        elapsed = time.perf_counter() - self.start
+        report['total'] = {'games': self.games(), 'games_per_s': self.games() / elapsed,
+                           'nodes_per_s': sum(w['nodes'] for w in self.workers.values()) / elapsed}
+        return report
+
+
+def score_interval(results):
+    """The mean score and its 95% confidence interval (normal approximation), clipped to [0, 1]."""
+    n = len(results)
+    if n == 0:
+        return 0.5, 0.0, 1.0
+    mean = sum(results) / n
+    variance = sum((r - mean) ** 2 for r in results) / (n - 1) if n > 1 else 0.25
+    margin = Z * math.sqrt(variance / n)
+    return mean, max(0.0, mean - margin), min(1.0, mean + margin)
+
+
+def elo(score):
+    """The Elo rating difference expected to give score; infinite for a score of 0 or 1."""
+    if score <= 0:
+        return -math.inf
+    if score >= 1:
+        return math.inf
+    return -400 * math.log10(1 / score - 1)
+
+
+class _Writer:
+    """Writes game records as JSON lines, or CSV if the path ends in .csv, flushing each one."""
+
+    def __init__(self, path):
+        self.file = open(path, 'w', newline='')
+        self.csv = None
+        if path.endswith('.csv'):
+            self.csv = csv.DictWriter(self.file, CSV_FIELDS)
+            self.csv.writeheader()
+
+    def write(self, record):
+        if self.csv is not None:
+            self.csv.writerow(dict(record, moves=json.dumps(record['moves'])))
+        else:
+            self.file.write(json.dumps(record) + '\n')
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def tournament(game, engines, games_per_pair=2, workers=None, out=None, opening_plies=4, max_plies=200, seed=0,
+               executor=None):
+    """
+    Plays every pair of Engines against each other games_per_pair times, in a pool of workers processes (default
+    the number of CPUs; executor can be any concurrent.futures executor to use instead).
+    Each game is written to out (JSON lines, which book.read_games reads, or CSV) as soon as it finishes.
+    Returns the Results.
+    """
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+    results = Results()
+    writer = _Writer(out) if out is not None else None
+    try:
+        futures = [executor.submit(play_game, game, white, black, i, opening_plies, max_plies, seed * 1000003 + i)
+                   for i, (white, black) in enumerate(schedule(engines, games_per_pair))]
+        for future in as_completed(futures):
+            record = future.result()
+            results.add(record)
+            if writer is not None:
+                writer.write(record)
+    finally:
+        if writer is not None:
+            writer.close()
+        if own_executor:
+            executor.shutdown()
+    return results
+
+
+def report(results):
+    lines = []
+    for row in results.table():
+        lines.append(f"{row['engine']} v {row['opponent']}: {row['games']} games, score {row['score']:.3f} "
+                     f"[{row['score_low']:.3f}, {row['score_high']:.3f}], "
+                     f"Elo {row['elo']:+.0f} [{row['elo_low']:+.0f}, {row['elo_high']:+.0f}]")
+    for worker, t in results.throughput().items():
+        lines.append(f"{worker}: {t['games']} games, {t['games_per_s']:.2f} games/s, {t['nodes_per_s']:.0f} nodes/s")
+    return '\n'.join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play engine configurations against each other.")
+    parser.add_argument('game', choices=board_types)
+    parser.add_argument('engines', nargs='+', help='engine specs, e.g. "d3:max_depth=3,evaluator=pst"')
+    parser.add_argument('--games', type=int, default=100, help="games per pair of engines")
+    parser.add_argument('--workers', type=int, default=None, help="worker processes (default the number of CPUs)")
+    parser.add_argument('--out', default=None, help="file to write the games to (.jsonl or .csv)")
+    parser.add_argument('--opening-plies', type=int, default=4, help="random moves at the start of each game")
+    parser.add_argument('--max-plies', type=int, default=200, help="games longer than this are draws")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    engines = [Engine.parse(spec) for spec in args.engines]
+    results = tournament(args.game, engines, args.games, args.workers, args.out, args.opening_plies, args.max_plies,
+                         args.seed)
+    print(report(results))
@@ -0,0 +1,53 @@
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# Rough memory used by one stored entry: the tuple, the key and the score.
+# Moves are shared with the move lists so aren't counted.
+ENTRY_BYTES = 160
+
+
+class TranspositionTable:
+    """
+    Fixed size table of search results indexed by board.key.
+    Each key maps to a single slot, so the memory used is bounded by size_mb however many positions are stored.
+
+    replacement is either 'depth' (depth-preferred: an entry is only overwritten by a search at least as deep,
+    unless it was stored during an earlier search) or 'always' (the newest result always wins).
+    """
+
+    def __init__(self, size_mb=16, replacement='depth'):
+        assert(replacement in ('depth', 'always'))
+        self.size = max(1, int(size_mb * 2**20) // ENTRY_BYTES)
+        self.replacement = replacement
+        self.entries = [None] * self.size
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+
+    def new_search(self):
+        """Call at the start of each search so that entries from earlier searches can be replaced."""
+        self.generation += 1
+
+    def clear(self):
+        self.entries = [None] * self.size
+
+    def probe(self, key):
+        """Returns (depth, score, flag, move) stored for key, or None."""
+        self.probes += 1
+        entry = self.entries[key % self.size]
+        if entry is None or entry[0] != key:
+            return None
+        self.hits += 1
+        return entry[1:5]
+
+    def store(self, key, depth, score, flag, move):
+        index = key % self.size
+        old = self.entries[index]
+        if self.replacement == 'depth' and old is not None:
+            if old[0] != key and old[5] == self.generation and old[1] > depth:
+                return
+        self.entries[index] = (key, depth, score, flag, move, self.generation)
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0.0
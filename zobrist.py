@@ -0,0 +1,38 @@
+from functools import lru_cache
+import hashlib
+
+
+@lru_cache(maxsize=None)
+def zobrist_key(*token):
+    """
+    A random looking 64 bit number for token.
+    The number is derived from a hash of token rather than a random generator so that keys are the same in every
+    process, which lets keys be stored on disk or shared between workers.
+    """
+    digest = hashlib.blake2b(repr(token).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def piece_key(square, piece):
+    """Key for piece standing on square. Empty squares don't contribute to the hash."""
+    if piece.name == 'E':
+        return 0
+    return zobrist_key('piece', square, piece.name)
+
+
+def side_key(player):
+    """Key for the player to move. Only black to move contributes to the hash."""
+    return zobrist_key('side') if player.name == 'B' else 0
+
+
+def flag_key(name, value=True):
+    """Key for any other piece of state, for example castling rights."""
+    return zobrist_key('flag', name) if value else 0
+
+
+def position_key(position, player_to_move):
+    """Full (non incremental) key of a position dict and the player to move."""
+    key = side_key(player_to_move)
+    for square, piece in position.items():
+        key ^= piece_key(square, piece)
+    return key